@@ -37,7 +37,7 @@ class sdssGalaxies(InstanceCatalog,EBVmixin,PhotometryGalaxies):
                                                                  bandpassDir = bandpassDir)
 
         # actually calculate the magnitudes
-        return self._magnitudeGetter('bulge', self.sdssBandpassDict,
+        return self._quiescentMagnitudeGetter('bulge', self.sdssBandpassDict,
                                      self.get_sdss_bulge_mags._colnames)
 
 
@@ -58,7 +58,7 @@ class sdssGalaxies(InstanceCatalog,EBVmixin,PhotometryGalaxies):
                                                                  bandpassDir = bandpassDir)
 
         # actually calculate the magnitudes
-        return self._magnitudeGetter('disk', self.sdssBandpassDict,
+        return self._quiescentMagnitudeGetter('disk', self.sdssBandpassDict,
                                      self.get_sdss_disk_mags._colnames)
 
 
@@ -79,7 +79,7 @@ class sdssGalaxies(InstanceCatalog,EBVmixin,PhotometryGalaxies):
                                                                  bandpassDir = bandpassDir)
 
         # actually calculate the magnitudes
-        return self._magnitudeGetter('agn', self.sdssBandpassDict,
+        return self._quiescentMagnitudeGetter('agn', self.sdssBandpassDict,
                                      self.get_sdss_agn_mags._colnames)
 
 
@@ -114,7 +114,12 @@ class sdssGalaxies(InstanceCatalog,EBVmixin,PhotometryGalaxies):
 class sdssStars(InstanceCatalog,PhotometryStars):
 
     catalog_type = 'sdssStars'
-    column_outputs = ['id','sdss_u','sdss_g','sdss_r','sdss_i','sdss_z']
+    # Because the SDSS and LSST getters share each chunk's SedList,
+    # every SED is read in and dusted only once, no matter how many
+    # bandpass systems are requested.
+    column_outputs = ['id','sdss_u','sdss_g','sdss_r','sdss_i','sdss_z',
+                      'quiescent_lsst_u','quiescent_lsst_g','quiescent_lsst_r',
+                      'quiescent_lsst_i','quiescent_lsst_z','quiescent_lsst_y']
 
     @compound('sdss_u','sdss_g','sdss_r','sdss_i','sdss_z')
     def get_sdss_magnitudes(self):
@@ -133,7 +138,7 @@ class sdssStars(InstanceCatalog,PhotometryStars):
                                                                  bandpassDir = bandpassDir)
 
         # Actually calculate the magnitudes
-        return self._magnitudeGetter(self.sdssBandpassDict, self.get_sdss_magnitudes._colnames)
+        return self._quiescentMagnitudeGetter(self.sdssBandpassDict, self.get_sdss_magnitudes._colnames)
 
 
 if __name__ == "__main__":
@@ -136,6 +136,92 @@ class PhotometryBase(object):
         return numpy.array(output)
 
 
+    def _isCurrentSedList(self, sedListName):
+        """
+        Determine whether the SedList stored in the member variable sedListName
+        was loaded from the chunk of database rows currently being processed
+        by this InstanceCatalog.  If it was, getters for other bandpass systems
+        (e.g. SDSS magnitudes requested alongside LSST magnitudes) can integrate
+        over it without reading, dusting, and redshifting the Seds again.
+
+        @param [in] sedListName is the name of the member variable holding
+        the SedList (e.g. '_sedList' or '_bulgeSedList')
+
+        @param [out] True if the SedList can be reused; False otherwise
+        """
+
+        chunk = getattr(self, '_current_chunk', None)
+
+        if chunk is None or not hasattr(self, sedListName):
+            return False
+
+        if not hasattr(self, '_sedListChunk'):
+            return False
+
+        return self._sedListChunk.get(sedListName) is chunk
+
+
+    def _markCurrentSedList(self, sedListName):
+        """
+        Record that the SedList stored in the member variable sedListName
+        has just been loaded from the current chunk of database rows.  This
+        also discards any magnitudes cached for the previous contents of
+        that SedList.
+
+        @param [in] sedListName is the name of the member variable holding
+        the SedList
+        """
+
+        if not hasattr(self, '_sedListChunk'):
+            self._sedListChunk = {}
+            self._sedListMagCache = {}
+
+        self._sedListChunk[sedListName] = getattr(self, '_current_chunk', None)
+        self._sedListMagCache[sedListName] = {}
+
+
+    def _magListForCurrentSedList(self, sedListName, bandpassDict, indices=None):
+        """
+        Calculate the magnitudes of the Seds in a SedList through the bandpasses
+        of a BandpassDict.  The results are cached for as long as the SedList
+        corresponds to the current chunk of database rows, so that each Sed is
+        integrated through each bandpass system exactly once per chunk, no
+        matter how many getters ask for those magnitudes.
+
+        @param [in] sedListName is the name of the member variable holding
+        the SedList
+
+        @param [in] bandpassDict is the BandpassDict through which to
+        integrate the Seds
+
+        @param [in] indices is an optional list of the indices of the
+        bandpasses in bandpassDict that actually need to be calculated
+
+        @param [out] a 2-D numpy array of magnitudes in which rows correspond
+        to bandpasses and columns correspond to astronomical objects
+        """
+
+        if indices is None:
+            cache_key = (id(bandpassDict), None)
+        else:
+            cache_key = (id(bandpassDict), tuple(indices))
+
+        mag_cache = None
+        if self._isCurrentSedList(sedListName):
+            mag_cache = self._sedListMagCache[sedListName]
+            if cache_key in mag_cache:
+                # return a copy; getters add variability to the output in place
+                return numpy.copy(mag_cache[cache_key])
+
+        sedList = getattr(self, sedListName)
+        magnitudes = bandpassDict.magListForSedList(sedList, indices=indices).transpose()
+
+        if mag_cache is not None:
+            mag_cache[cache_key] = numpy.copy(magnitudes)
+
+        return magnitudes
+
+
     @compound('sigma_lsst_u','sigma_lsst_g','sigma_lsst_r','sigma_lsst_i',
               'sigma_lsst_z','sigma_lsst_y')
     def get_lsst_photometric_uncertainties(self):
@@ -434,31 +520,29 @@ class PhotometryGalaxies(PhotometryBase):
             indices = None
 
         if componentName == 'bulge':
-            self._loadBulgeSedList(bandpassDict.wavelenMatch)
-            if not hasattr(self, '_bulgeSedList'):
-                sedList = None
-            else:
-                sedList = self._bulgeSedList
+            sedListName = '_bulgeSedList'
+            loadSedList = self._loadBulgeSedList
         elif componentName == 'disk':
-            self._loadDiskSedList(bandpassDict.wavelenMatch)
-            if not hasattr(self, '_diskSedList'):
-                sedList = None
-            else:
-                sedList = self._diskSedList
+            sedListName = '_diskSedList'
+            loadSedList = self._loadDiskSedList
         elif componentName == 'agn':
-            self._loadAgnSedList(bandpassDict.wavelenMatch)
-            if not hasattr(self, '_agnSedList'):
-                sedList = None
-            else:
-                sedList = self._agnSedList
+            sedListName = '_agnSedList'
+            loadSedList = self._loadAgnSedList
         else:
             raise RuntimeError('_quiescentMagnitudeGetter does not understand component %s ' \
                                % componentName)
 
-        if sedList is None:
+        # If another bandpass system has already loaded this component's
+        # Seds for the current chunk, integrate over those Seds rather
+        # than reading, dusting, and redshifting them again.
+        if not self._isCurrentSedList(sedListName):
+            loadSedList(bandpassDict.wavelenMatch)
+            self._markCurrentSedList(sedListName)
+
+        if not hasattr(self, sedListName):
             magnitudes = numpy.ones((len(columnNameList), 0))
         else:
-            magnitudes = bandpassDict.magListForSedList(sedList, indices=indices).transpose()
+            magnitudes = self._magListForCurrentSedList(sedListName, bandpassDict, indices=indices)
 
         if self._hasCosmoDistMod():
             cosmoDistMod = self.column_by_name('cosmologicalDistanceModulus')
@@ -647,12 +731,17 @@ class PhotometryStars(PhotometryBase):
         if len(indices) == len(columnNameList):
             indices = None
 
-        self._loadSedList(bandpassDict.wavelenMatch)
+        # If another bandpass system has already loaded the Seds for the
+        # current chunk, integrate over those Seds rather than reading
+        # and dusting them again.
+        if not self._isCurrentSedList('_sedList'):
+            self._loadSedList(bandpassDict.wavelenMatch)
+            self._markCurrentSedList('_sedList')
 
         if not hasattr(self, '_sedList'):
             magnitudes = numpy.ones((len(columnNameList),0))
         else:
-            magnitudes = bandpassDict.magListForSedList(self._sedList, indices=indices).transpose()
+            magnitudes = self._magListForCurrentSedList('_sedList', bandpassDict, indices=indices)
 
         return magnitudes
 
@@ -18,11 +18,13 @@ import numpy as np
 
 from lsst.sims.catalogs.definitions import InstanceCatalog
 from lsst.sims.catalogs.decorators import compound
-from lsst.sims.photUtils import (BandpassDict, Bandpass)
+from lsst.sims.photUtils import (BandpassDict, Bandpass, Sed)
+from lsst.sims.photUtils import calcSNR_m5, calcMagError_m5
 from lsst.sims.catUtils.mixins import CosmologyMixin
 import lsst.sims.photUtils.PhotometricParameters as PhotometricParameters
-from lsst.sims.catUtils.supernovae import SNObject
+from lsst.sims.catUtils.supernovae import SNObject, salt2ModelComponents
 from lsst.sims.catUtils.supernovae import SNUniverse
+from lsst.sims.catUtils.supernovae import writeSNSedBundle
 from lsst.sims.catUtils.mixins import EBVmixin
 from lsst.sims.utils import _galacticFromEquatorial
 import astropy
@@ -46,6 +48,9 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
 
     # Write the location of SED file (for example for PhoSim)
     writeSedFile = False
+    # Write the SEDs of each chunk to a single bundle (see SNSedBundle)
+    # rather than one file per SN
+    writeSedBundle = False
     # prefix to use for SED File name
     sn_sedfile_prefix = ''
 
@@ -72,7 +77,10 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
     # 'mag_u', 'mag_g', 'mag_r', 'mag_i', 'mag_z', 'mag_y']
     cannot_be_null = ['x0', 'z', 't0']
 
-    _sn_object_cache = None
+    # If set to a SALT2BandFluxEngine, get_snbrightness will calculate the
+    # fluxes of all of the SN in the catalog at once from the engine's tables
+    # of bandpass-integrated SALT2 models, rather than one SNObject at a time
+    sn_flux_engine = None
 
     @astropy.utils.lazyproperty
     def mjdobs(self):
@@ -134,14 +142,20 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
         for each SED for phoSim and MagNorm which is also used. Note that aside
         from acting as a getter, this also writes spectra to 
         `self.sn_sedfile_prefix`snid_mjd_band.dat for each observation of
-        interest
+        interest if `self.writeSedFile` is True. If `self.writeSedBundle` is
+        also True, the spectra of all of the SN in the chunk are instead
+        written to the single file
+        `self.sn_sedfile_prefix`sedBundle_snid_mjd_band.npz (where snid is
+        that of the first SN in the bundle), which can be unpacked to the
+        individual files with `SNSedBundle.unpack`.
         """
         # construct the unique filename
         # method: snid_mjd(to 4 places of decimal)_bandpassname
         mjd = "_{:0.4f}_".format(self.mjdobs)
-        mjd += self.obs_metadata.bandpass + '.dat'
-        fnames = np.array([self.sn_sedfile_prefix + str(int(elem)) + mjd
-                          for elem in self.column_by_name('snid')], dtype='str')
+        mjd += self.obs_metadata.bandpass
+        snid = self.column_by_name('snid')
+        fnames = np.array([self.sn_sedfile_prefix + str(int(elem)) + mjd + '.dat'
+                          for elem in snid], dtype='str')
 
         c, x1, x0, t0, z = self.column_by_name('c'),\
             self.column_by_name('x1'),\
@@ -154,33 +168,58 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
 
         magNorms = np.zeros(len(fnames))
 
-        snobject = SNObject()
-        snobject.rectifySED = True
-        for i in range(len(self.column_by_name('snid'))):
-            # if t0 is nan, this was set by the catalog for dim SN, or SN
-            #   outside redshift range, We will not provide a SED file for these
-            if np.isnan(t0[i]):
-                magNorms[i] = np.nan
-                fnames[i] = None
-
+        # if t0 is nan, this was set by the catalog for dim SN, or SN
+        # outside redshift range. We will not provide a SED file for these,
+        # nor for SN observed outside of the temporal range of the model
+        source = SNObject().source
+        with np.errstate(invalid='ignore'):
+            phase = (self.mjdobs - t0) / (1. + z)
+            valid = np.logical_and(phase >= source.minphase(),
+                                   phase <= source.maxphase())
+        magNorms[np.logical_not(valid)] = np.nan
+        fnames[np.logical_not(valid)] = None
+        valid = np.where(valid)[0]
+        if len(valid) == 0:
+            return (fnames, magNorms)
+
+        # rest frame SEDs of all of the SN at once, at the native wavelengths
+        # of the SALT2 model (as SNObject.SNObjectSourceSED with
+        # rectifySED = True)
+        wave = source._wave
+        uniquePhase, phaseDex = np.unique(phase[valid], return_inverse=True)
+        m0, m1, colorlaw = salt2ModelComponents(source, uniquePhase, wave)
+        flambda = x0[valid, None] * (m0[phaseDex] + x1[valid, None] * m1[phaseDex]) * \
+            np.power(10., -0.4 * c[valid, None] * colorlaw[None, :])
+        # rectify the flux and convert per Ang to per nm
+        flambda = np.where(flambda > 0., flambda, 0.) * 10.0
+        wavelen = wave / 10.
+
+        # magNorm as Sed.calcMag would calculate it after resampling fnu onto
+        # the wavelengths of bp (which is only non-zero at a few of them)
+        if bp.phi is None:
+            bp.sbTophi()
+        inBand = np.where(bp.phi > 0.)[0]
+        physParams = Sed()._physParams
+        fnu = flambda * wavelen * wavelen * physParams.nm2m * \
+            physParams.ergsetc2jansky / physParams.lightspeed
+        ix = np.clip(np.searchsorted(wavelen, bp.wavelen[inBand], side='right') - 1,
+                     0, len(wavelen) - 2)
+        wx = (bp.wavelen[inBand] - wavelen[ix]) / (wavelen[ix + 1] - wavelen[ix])
+        fnuInBand = fnu[:, ix] * (1. - wx) + fnu[:, ix + 1] * wx
+        flux = (fnuInBand * bp.phi[inBand]).sum(axis=1) * (bp.wavelen[1] - bp.wavelen[0])
+        # SEDs with no flux in bp get the magNorm of a source that will not
+        # be seen
+        with np.errstate(divide='ignore', invalid='ignore'):
+            magNorms[valid] = np.where(flux > 1.0e-300, -2.5 * np.log10(flux / 3631.), 1000.)
+
+        if self.writeSedFile:
+            if self.writeSedBundle:
+                bundleName = self.sn_sedfile_prefix + 'sedBundle_' + \
+                    str(int(snid[valid[0]])) + mjd + '.npz'
+                writeSNSedBundle(bundleName, fnames[valid], wavelen, flambda)
             else:
-                snobject.set(c=c[i], x1=x1[i], x0=x0[i], t0=t0[i],
-                             z=z[i])
-                if snobject.modelOutSideTemporalRange == 'zero':
-                    if self.mjdobs > snobject.maxtime() or self.mjdobs < snobject.mintime():
-                        magNorms[i] = np.nan
-                        fnames[i] = None
-
-                # SED in rest frame
-                sed = snobject.SNObjectSourceSED(time=self.mjdobs)
-                try:
-                    magNorms[i] = sed.calcMag(bandpass=bp)
-                except:
-                    # sed.flambda = 1.0e-20
-                    magNorms[i] = 1000.  # sed.calcMag(bandpass=bp)
-
-                if self.writeSedFile:
-                    sed.writeSED(fnames[i])
+                for i, ff in zip(valid, flambda):
+                    Sed(wavelen=wavelen, flambda=ff).writeSED(fnames[i])
 
         return (fnames, magNorms)
 
@@ -198,27 +237,24 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
         the spatio-temporal range specified by obs_metadata
 
         """
-        c, x1, x0, t0, _z, ra, dec = self.column_by_name('c'),\
+        c, x1, x0, t0, _z = self.column_by_name('c'),\
             self.column_by_name('x1'),\
             self.column_by_name('x0'),\
             self.column_by_name('t0'),\
-            self.column_by_name('redshift'),\
-            self.column_by_name('raJ2000'),\
-            self.column_by_name('decJ2000')
+            self.column_by_name('redshift')
 
-        SNobject = SNObject()
+        # MW E(B-V) of the whole chunk from a single dust map lookup
+        ebv = self.column_by_name('EBV')
 
-        raDeg = np.degrees(ra)
-        decDeg = np.degrees(dec)
+        SNobject = SNObject()
 
         sedlist = []
         for i in range(self.numobjs):
             SNobject.set(z=_z[i], c=c[i], x1=x1[i], t0=t0[i], x0=x0[i])
-            SNobject.setCoords(ra=raDeg[i], dec=decDeg[i])
-            SNobject.mwEBVfromMaps()
+            SNobject.set_MWebv(ebv[i])
             sed = SNobject.SNObjectSED(time=self.mjdobs,
                                        bandpass=self.lsstBandpassDict,
-                                       applyExitinction=True)
+                                       applyExtinction=True)
             sedlist.append(sed)
 
         return sedlist
@@ -237,27 +273,30 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
         bandname = self.obs_metadata.bandpass
         return np.repeat(bandname, self.numobjs)
 
+    def _aduPerMaggie(self, bandpass):
+        """
+        return the number of ADU per maggie of flux in bandpass.  ADU and
+        flux are both linear in fnu, so their ratio can be found from any SED
+        """
+        flatSed = Sed()
+        flatSed.setFlatSED(wavelen_min=bandpass.wavelen[0],
+                           wavelen_max=bandpass.wavelen[-1],
+                           wavelen_step=bandpass.wavelen[1] - bandpass.wavelen[0])
+        return flatSed.calcADU(bandpass, photParams=self.photometricparameters) / \
+            (flatSed.calcFlux(bandpass) / 3631.0)
+
     @compound('flux', 'mag', 'flux_err', 'mag_err', 'adu')
     def get_snbrightness(self):
         """
         getters for brightness related parameters of sn
         """
-        if self._sn_object_cache is None or len(self._sn_object_cache) > 1000000:
-            self._sn_object_cache = {}
-
-        c, x1, x0, t0, _z, ra, dec = self.column_by_name('c'),\
+        c, x1, x0, t0, _z = self.column_by_name('c'),\
             self.column_by_name('x1'),\
             self.column_by_name('x0'),\
             self.column_by_name('t0'),\
-            self.column_by_name('redshift'),\
-            self.column_by_name('raJ2000'),\
-            self.column_by_name('decJ2000')
-
-        raDeg = np.degrees(ra)
-        decDeg = np.degrees(dec)
+            self.column_by_name('redshift')
 
         ebv = self.column_by_name('EBV')
-        id_list = self.column_by_name('snid')
 
         bandname = self.obs_metadata.bandpass
         if isinstance(bandname, list):
@@ -270,17 +309,47 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
                         [np.nan]*len(t0), [np.inf]*len(t0),
                         [0.0]*len(t0)]).transpose()
 
-        for i in np.where(np.logical_and(np.isfinite(t0),
-                                         np.abs(self.mjdobs - t0) < self.maxTimeSNVisible))[0]:
+        active = np.where(np.logical_and(np.isfinite(t0),
+                                         np.abs(self.mjdobs - t0) < self.maxTimeSNVisible))[0]
+
+        if self.sn_flux_engine is not None:
+            phase = (self.mjdobs - t0[active]) / (1.0 + _z[active])
+            active = active[np.where(np.logical_and(phase >= self.sn_flux_engine.source.minphase(),
+                                                    phase <= self.sn_flux_engine.source.maxphase()))]
+            if len(active) == 0:
+                return (vals[:, 0], vals[:, 1], vals[:, 2], vals[:, 3], vals[:, 4])
+
+            m5 = self.obs_metadata.m5[bandname]
+            fluxinMaggies = self.sn_flux_engine.bandFlux(bandname, self.mjdobs, t0[active],
+                                                         x0[active], x1[active], c[active],
+                                                         _z[active], ebv[active])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mag = -2.5 * np.log10(fluxinMaggies)
+
+            # as in SNObject.catsimBandFluxError, a flux <= 0. is given the
+            # uncertainty of a 200th magnitude source
+            magNoNan = np.where(fluxinMaggies > 0., mag, 200.0)
+            snr, gamma = calcSNR_m5(magnitude=magNoNan, bandpass=bandpass, m5=m5,
+                                    photParams=self.photometricparameters)
+            flux_err = np.power(10.0, -0.4 * magNoNan) / snr
+            mag_err = calcMagError_m5(magnitude=mag, bandpass=bandpass, m5=m5,
+                                      photParams=self.photometricparameters)[0]
+
+            vals[active, 0] = fluxinMaggies
+            vals[active, 1] = mag
+            vals[active, 2] = flux_err
+            vals[active, 3] = mag_err
+            vals[active, 4] = fluxinMaggies * self._aduPerMaggie(bandpass)
+            return (vals[:, 0], vals[:, 1], vals[:, 2], vals[:, 3], vals[:, 4])
+
+        # The parameters of every SN are columns of the catalog, so a single
+        # SNObject (each of which carries its own copy of the SALT2 model)
+        # is reset for each of them rather than keeping one per SN
+        SNobject = SNObject()
+        for i in active:
 
-            if id_list[i] in self._sn_object_cache:
-                SNobject = self._sn_object_cache[id_list[i]]
-            else:
-                SNobject = SNObject()
-                SNobject.set(z=_z[i], c=c[i], x1=x1[i], t0=t0[i], x0=x0[i])
-                SNobject.setCoords(ra=raDeg[i], dec=decDeg[i])
-                SNobject.set_MWebv(ebv[i])
-                self._sn_object_cache[id_list[i]] = SNobject
+            SNobject.set(z=_z[i], c=c[i], x1=x1[i], t0=t0[i], x0=x0[i])
+            SNobject.set_MWebv(ebv[i])
 
             if self.mjdobs <= SNobject.maxtime() and self.mjdobs >= SNobject.mintime():
 
@@ -321,37 +390,49 @@ class SNFunctionality(InstanceCatalog, EBVmixin, CosmologyMixin, SNUniverse):
               'adu_u', 'adu_g', 'adu_r', 'adu_i', 'adu_z', 'adu_y', 'mwebv')
     def get_snfluxes(self):
 
-        c, x1, x0, t0, _z, ra, dec = self.column_by_name('c'),\
+        c, x1, x0, t0, _z = self.column_by_name('c'),\
             self.column_by_name('x1'),\
             self.column_by_name('x0'),\
             self.column_by_name('t0'),\
-            self.column_by_name('redshift'),\
-            self.column_by_name('raJ2000'),\
-            self.column_by_name('decJ2000')
+            self.column_by_name('redshift')
 
-        raDeg = np.degrees(ra)
-        decDeg = np.degrees(dec)
+        # MW E(B-V) of the whole chunk from a single dust map lookup
+        ebv = self.column_by_name('EBV')
 
-        snobject = SNObject()
         # Initialize return array
         vals = np.zeros(shape=(self.numobjs, 19))
-        for i, _ in enumerate(vals):
-            snobject.set(z=_z[i], c=c[i], x1=x1[i], t0=t0[i], x0=x0[i])
-            snobject.setCoords(ra=raDeg[i], dec=decDeg[i])
-            snobject.mwEBVfromMaps()
-            # Calculate fluxes
-            vals[i, :6] = snobject.catsimManyBandFluxes(time=self.mjdobs,
-                                                        bandpassDict=self.lsstBandpassDict,
-                                                        observedBandPassInd=None)
-            # Calculate magnitudes
-            vals[i, 6:12] = snobject.catsimManyBandMags(time=self.mjdobs,
-                                                        bandpassDict=self.lsstBandpassDict,
-                                                        observedBandPassInd=None)
-
-            vals[i, 12:18] = snobject.catsimManyBandADUs(time=self.mjdobs,
-                                                         bandpassDict=self.lsstBandpassDict,
-                                                         photParams=self.photometricparameters)
-            vals[i, 18] = snobject.ebvofMW
+        vals[:, 18] = ebv
+
+        if self.sn_flux_engine is not None:
+            active = np.where(np.isfinite(t0))[0]
+            vals[np.logical_not(np.isfinite(t0)), :18] = np.nan
+            if len(active) > 0:
+                for i, bandname in enumerate(self.lsstBandpassDict.keys()):
+                    fluxinMaggies = self.sn_flux_engine.bandFlux(bandname, self.mjdobs,
+                                                                 t0[active], x0[active],
+                                                                 x1[active], c[active],
+                                                                 _z[active], ebv[active])
+                    with np.errstate(divide='ignore'):
+                        vals[active, 6 + i] = -2.5 * np.log10(fluxinMaggies)
+                    vals[active, i] = fluxinMaggies
+                    vals[active, 12 + i] = fluxinMaggies * \
+                        self._aduPerMaggie(self.lsstBandpassDict[bandname])
+        else:
+            snobject = SNObject()
+            for i, _ in enumerate(vals):
+                snobject.set(z=_z[i], c=c[i], x1=x1[i], t0=t0[i], x0=x0[i])
+                snobject.set_MWebv(ebv[i])
+                # Calculate fluxes
+                vals[i, :6] = snobject.catsimManyBandFluxes(time=self.mjdobs,
+                                                            bandpassDict=self.lsstBandpassDict,
+                                                            observedBandPassInd=None)
+                # Calculate magnitudes (as catsimManyBandMags, without
+                # evaluating the SED again)
+                vals[i, 6:12] = -2.5 * np.log10(vals[i, :6])
+
+                vals[i, 12:18] = snobject.catsimManyBandADUs(time=self.mjdobs,
+                                                             bandpassDict=self.lsstBandpassDict,
+                                                             photParams=self.photometricparameters)
         return (vals[:, 0], vals[:, 1], vals[:, 2], vals[:, 3],
                 vals[:, 4], vals[:, 5], vals[:, 6], vals[:, 7],
                 vals[:, 8], vals[:, 9], vals[:, 10], vals[:, 11],
@@ -1,3 +1,5 @@
 from .snObject import *
 from .snUniversalRules import *
 from .utils import *
+from .snBandFluxEngine import *
+from .snSedBundle import *
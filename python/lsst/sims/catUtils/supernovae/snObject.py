@@ -21,13 +21,67 @@ from lsst.sims.photUtils.PhotometricParameters import PhotometricParameters
 
 import sncosmo
 
-__all__ = ['SNObject']
+__all__ = ['SNObject', 'salt2ModelComponents']
 
 
 _sn_ax_cache = None
 _sn_bx_cache = None
 _sn_ax_bx_wavelen = None
 
+def salt2ModelComponents(source, phase, wave):
+    """
+    return the components M0 and M1 and the color law CL of a SALT2 model,
+    obtained through the public interface of `sncosmo.SALT2Source`, so that
+    the flux density of a supernova is x0 (M0 + x1 M1) 10**(-0.4 c CL).
+
+    Parameters
+    ----------
+    source : `sncosmo.SALT2Source`, mandatory
+        the SALT2 model, e.g. `SNObject.source`. Its parameters are restored
+        before returning.
+    phase : `np.ndarray`, mandatory
+        rest frame phases in days
+    wave : `np.ndarray`, mandatory
+        rest frame wavelengths in Ang, within the range of the model
+
+    Returns
+    -------
+    m0, m1 : `np.ndarray` of shape (len(phase), len(wave))
+    colorlaw : `np.ndarray` of length len(wave)
+    """
+    parameters = np.copy(source.parameters)
+    try:
+        source.set(x0=1.0, x1=0.0, c=0.0)
+        m0 = source.flux(phase, wave)
+        source.set(x1=1.0)
+        m1 = source.flux(phase, wave) - m0
+    finally:
+        source.parameters = parameters
+    return m0, m1, source.colorlaw(wave)
+
+
+def _getCCMab(wavelen):
+    """
+    return the CCM extinction coefficients a(x) and b(x) at wavelen (in nm),
+    which are cached for the most recent wavelength grid
+    """
+    global _sn_ax_cache
+    global _sn_bx_cache
+    global _sn_ax_bx_wavelen
+    if _sn_ax_bx_wavelen is None \
+    or len(wavelen)!=len(_sn_ax_bx_wavelen) \
+    or (wavelen!=_sn_ax_bx_wavelen).any():
+
+        ax, bx = Sed().setupCCMab(wavelen=wavelen)
+        _sn_ax_cache = ax
+        _sn_bx_cache = bx
+        _sn_ax_bx_wavelen = np.copy(wavelen)
+    else:
+        ax = _sn_ax_cache
+        bx = _sn_bx_cache
+    return ax, bx
+
+
 class SNObject(sncosmo.Model):
 
     """
@@ -566,20 +620,7 @@ class SNObject(sncosmo.Model):
             return SEDfromSNcosmo
 
         # Apply LSST extinction
-        global _sn_ax_cache
-        global _sn_bx_cache
-        global _sn_ax_bx_wavelen
-        if _sn_ax_bx_wavelen is None \
-        or len(wavelen)!=len(_sn_ax_bx_wavelen) \
-        or (wavelen!=_sn_ax_bx_wavelen).any():
-
-            ax, bx = SEDfromSNcosmo.setupCCMab()
-            _sn_ax_cache = ax
-            _sn_bx_cache = bx
-            _sn_ax_bx_wavelen = np.copy(wavelen)
-        else:
-            ax = _sn_ax_cache
-            bx = _sn_bx_cache
+        ax, bx = _getCCMab(wavelen)
 
         if self.ebvofMW is None:
             raise ValueError('ebvofMW attribute cannot be None Type and must'
@@ -590,6 +631,92 @@ class SNObject(sncosmo.Model):
         SEDfromSNcosmo.addCCMDust(a_x=ax, b_x=bx, ebv=self.ebvofMW)
         return SEDfromSNcosmo
 
+    def SNObjectSEDArray(self, times, wavelen=None, bandpass=None,
+                         applyExtinction=True):
+        """
+        return the SEDs of the SN at many times of observation at once,
+        as a 2-D array of flux densities with one row per time. Each row is
+        the flambda of the `lsst.sims.photUtils.Sed` SNObjectSED would return
+        at that time, but the model is evaluated with a single call to
+        `self.flux` and the MW extinction is applied to all of the rows
+        at once.
+
+        Parameters
+        ----------
+        times : `np.ndarray` of floats, mandatory
+            MJDs of the observations
+        wavelen : `np.ndarray` of floats, optional, defaults to None
+            array containing wavelengths in nm
+        bandpass : `lsst.sims.photUtils.Bandpass` object or
+            `lsst.sims.photUtils.BandpassDict`, optional, defaults to `None`.
+            if provided, overrides wavelen, as in SNObjectSED
+        applyExtinction : Bool, optional, defaults to True
+            if True, apply the MW extinction given by self.ebvofMW
+
+        Returns
+        -------
+        wavelen : `np.ndarray` of wavelengths in nm
+        flambda : `np.ndarray` of shape (len(times), len(wavelen)) in units
+            of ergs/cm^2/sec/nm
+
+        Examples
+        --------
+        >>> wavelen, flambda = SN.SNObjectSEDArray(times=np.arange(571181., 571200.),
+        ...                                        bandpass=LSST_BandPass['r'])
+        """
+        if wavelen is None and bandpass is None:
+            raise ValueError('A non None input to either wavelen or\
+                              bandpassobject must be provided')
+
+        if bandpass is not None:
+            if isinstance(bandpass, BandpassDict):
+                firstfilter = bandpass.keys()[0]
+                bp = bandpass[firstfilter]
+            else:
+                bp = bandpass
+            # remember this is in nm
+            wavelen = bp.wavelen
+
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        flambda = np.zeros((len(times), len(wavelen)))
+
+        # Outside of the temporal range of the model, the flux density is 0.
+        # (see SNObjectSED)
+        inRange = np.where(np.logical_and(times >= self.mintime(),
+                                          times <= self.maxtime()))[0]
+        if len(inRange) < len(times) and self.modelOutSideTemporalRange != 'zero':
+            raise NotImplementedError('Model not implemented, change to zero\n')
+
+        if len(inRange) > 0:
+            # np.nan beyond the wavelength range of the model, as in
+            # SNObjectSED
+            wave = wavelen * 10.0
+            mask = np.logical_and(wave >= self.minwave(), wave <= self.maxwave())
+            inRangeFlambda = np.nan * np.ones((len(inRange), len(wavelen)))
+            # flux density dE/dlambda returned from SNCosmo in
+            # ergs/cm^2/sec/Ang, convert to ergs/cm^2/sec/nm
+            inRangeFlambda[:, mask] = np.atleast_2d(self.flux(time=times[inRange],
+                                                              wave=wave[mask])) * 10.0
+            flambda[inRange] = inRangeFlambda
+
+        if self.rectifySED:
+            # Note that this converts nans into 0.
+            flambda = np.where(flambda > 0., flambda, 0.)
+
+        if not applyExtinction:
+            return wavelen, flambda
+
+        if self.ebvofMW is None:
+            raise ValueError('ebvofMW attribute cannot be None Type and must'
+                             ' be set by hand using set_MWebv before this'
+                             'stage, or by using setcoords followed by'
+                             'mwEBVfromMaps\n')
+
+        # as Sed.addCCMDust with R_v = 3.1
+        ax, bx = _getCCMab(wavelen)
+        dust = np.power(10.0, -0.4 * self.ebvofMW * (3.1 * ax + bx))
+        return wavelen, flambda * dust
+
     def SNObjectSourceSED(self, time, wavelen=None):
         """
         Return the rest Frame SED of SNObject at the phase corresponding to
@@ -713,6 +840,75 @@ class SNObject(sncosmo.Model):
                                           bandpass=bandpassobject)
         return SEDfromSNcosmo.calcFlux(bandpass=bandpassobject) / 3631.0
  
+    def catsimBandFluxes(self, times, bandpassobject):
+        """
+        return the fluxes in the bandpass in units of maggies at many times
+        of observation, as catsimBandFlux would return at each of them, from
+        the SEDs of SNObjectSEDArray
+
+        Parameters
+        ----------
+        times : `np.ndarray` of floats, mandatory
+            MJDs at which band fluxes are evaluated
+        bandpassobject : mandatory, `lsst.sims.photUtils.BandPass` object
+
+        Returns
+        -------
+        `np.ndarray` of band fluxes in maggies, of the same length as times
+
+        Examples
+        --------
+        >>> SN.catsimBandFluxes(bandpassobject=LSST_BandPass['r'],
+        ...                     times=np.array([571190., 571195.]))
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        fluxes = np.zeros(len(times))
+
+        # Speedup for cases outside temporal range of model
+        inRange = np.where(np.logical_and(times > self.mintime(),
+                                          times < self.maxtime()))[0]
+        if len(inRange) == 0:
+            return fluxes
+
+        wavelen, flambda = self.SNObjectSEDArray(times=times[inRange],
+                                                 bandpass=bandpassobject)
+        if bandpassobject.phi is None:
+            bandpassobject.sbTophi()
+
+        # as Sed.flambdaTofnu and Sed.calcFlux
+        physParams = Sed()._physParams
+        fnu = flambda * wavelen * wavelen * physParams.nm2m * \
+            physParams.ergsetc2jansky / physParams.lightspeed
+        fluxes[inRange] = (fnu * bandpassobject.phi).sum(axis=1) * \
+            (wavelen[1] - wavelen[0]) / 3631.0
+        return fluxes
+
+    def catsimBandMags(self, times, bandpassobject, noNan=False):
+        """
+        return the magnitudes in the bandpass in the AB magnitude system at
+        many times of observation (see catsimBandFluxes)
+
+        Parameters
+        ----------
+        times : `np.ndarray` of floats, mandatory
+            MJDs at which band magnitudes are evaluated
+        bandpassobject : mandatory, `lsst.sims.photUtils.BandPass` object
+        noNan : Bool, defaults to False
+            If True, an AB magnitude of 200.0 rather than nan values is
+            associated with a flux of 0.
+
+        Returns
+        -------
+        `np.ndarray` of AB magnitudes, of the same length as times
+        """
+        fluxes = self.catsimBandFluxes(times=times,
+                                       bandpassobject=bandpassobject)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mags = -2.5 * np.log10(fluxes)
+        if noNan:
+            mags = np.where(fluxes > 0., mags, 200.0)
+        return mags
+
     def catsimBandMag(self, bandpassobject, time, fluxinMaggies=None,
                       noNan=False):
         """
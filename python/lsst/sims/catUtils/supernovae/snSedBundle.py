@@ -0,0 +1,99 @@
+"""
+Indexed binary bundles of supernova SEDs. An instance catalog of supernovae
+for PhoSim refers to one SED file per supernova per visit; rather than
+creating thousands of small ASCII files, the SEDs of many supernovae sharing
+a wavelength grid can be written to a single bundle with writeSNSedBundle, and
+unpacked to the individual files (e.g. on the node running PhoSim) with
+`SNSedBundle.unpack`.
+"""
+from builtins import object
+import os
+import numpy as np
+
+from lsst.sims.photUtils.Sed import Sed
+
+__all__ = ['writeSNSedBundle', 'SNSedBundle']
+
+
+def writeSNSedBundle(filename, names, wavelen, flambda):
+    """
+    Write the SEDs of many supernovae to a single uncompressed .npz file.
+
+    Parameters
+    ----------
+    filename : string, mandatory
+        name of the bundle to write. '.npz' is appended if it is not there
+    names : sequence of strings, mandatory
+        the names of the SED files the bundle stands in for, one per SED
+    wavelen : `np.ndarray`, mandatory
+        wavelengths in nm, shared by all of the SEDs
+    flambda : `np.ndarray` of shape (len(names), len(wavelen)), mandatory
+        flux densities in ergs/cm^2/sec/nm
+
+    Returns
+    -------
+    None
+    """
+    flambda = np.atleast_2d(flambda)
+    if flambda.shape != (len(names), len(wavelen)):
+        raise ValueError('flambda must have shape (%d, %d), not %s'
+                         % (len(names), len(wavelen), str(flambda.shape)))
+    np.savez(filename, names=np.array(names, dtype=str),
+             wavelen=np.asarray(wavelen, dtype=float),
+             flambda=np.asarray(flambda, dtype=float))
+
+
+class SNSedBundle(object):
+    """
+    Read a bundle of supernova SEDs written by writeSNSedBundle.
+
+    Parameters
+    ----------
+    filename : string, mandatory
+        name of the bundle
+
+    Examples
+    --------
+    >>> bundle = SNSedBundle('sedBundle_1234_59580.1234_r.npz')
+    >>> sed = bundle.getSed(bundle.names[0])
+    >>> bundle.unpack('/scratch/phosim_seds')
+    """
+
+    def __init__(self, filename):
+        with np.load(filename) as data:
+            self.names = data['names']
+            self.wavelen = data['wavelen']
+            self.flambda = data['flambda']
+        self._index = dict((name, i) for i, name in enumerate(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+    def getSed(self, name):
+        """
+        return the `lsst.sims.photUtils.Sed` stored under name
+        """
+        return Sed(wavelen=self.wavelen, flambda=self.flambda[self._index[name]])
+
+    def unpack(self, outDir=None):
+        """
+        write each SED in the bundle to its own file with
+        `lsst.sims.photUtils.Sed.writeSED`, as `SNFunctionality.get_phosimVars`
+        does when not bundling SEDs
+
+        Parameters
+        ----------
+        outDir : string, optional, defaults to None
+            directory in which to write the files. If None, the names in
+            the bundle are used as they are.
+
+        Returns
+        -------
+        list of the names of the files written
+        """
+        fileList = []
+        for name, flambda in zip(self.names, self.flambda):
+            fname = str(name) if outDir is None else os.path.join(outDir, str(name))
+            Sed(wavelen=self.wavelen, flambda=flambda).writeSED(fname)
+            fileList.append(fname)
+        return fileList
@@ -1,9 +1,164 @@
 from __future__ import absolute_import
 from builtins import object
+from builtins import range
 import numpy as np
 
 __all__ = ['SNUniverse']
 
+
+_mask32 = np.uint64(0xffffffff)
+
+
+def _mt19937Words(seeds, nWords):
+    """
+    Return the first nWords 32 bit integers that np.random.RandomState(seed)
+    generates for each of seeds, as an array of shape (nWords, len(seeds)),
+    by running the Mersenne Twister initialization and first state update
+    for all of the seeds at once. nWords may be at most 227 (= 624 - 397),
+    the number of words that depend only on the initial state.
+    """
+    if nWords > 227:
+        raise ValueError('Can only generate 227 words from the initial '
+                         'Mersenne Twister state')
+    key = np.asarray(seeds).astype(np.uint64) & _mask32
+    state = np.empty((397 + nWords + 1, len(key)), dtype=np.uint64)
+    state[0] = key
+    for pos in range(1, len(state)):
+        prev = state[pos - 1]
+        state[pos] = (np.uint64(1812433253) * (prev ^ (prev >> np.uint64(30))) +
+                      np.uint64(pos)) & _mask32
+
+    y = (state[:nWords] & np.uint64(0x80000000)) | (state[1:nWords + 1] & np.uint64(0x7fffffff))
+    words = state[397:397 + nWords] ^ (y >> np.uint64(1)) ^ \
+        ((y & np.uint64(1)) * np.uint64(0x9908b0df))
+
+    # tempering
+    words ^= words >> np.uint64(11)
+    words ^= (words << np.uint64(7)) & np.uint64(0x9d2c5680)
+    words ^= (words << np.uint64(15)) & np.uint64(0xefc60000)
+    words ^= words >> np.uint64(18)
+    return words
+
+
+class _HostRandomStreams(object):
+    """
+    The random streams of np.random.RandomState(seed) for an array of seeds,
+    drawn from all at once. random_sample(), uniform(), and normal() return
+    one value per seed, identical to what calling the same methods of each
+    RandomState in turn would return.
+
+    Only the first nWords 32 bit words of each stream are generated. Streams
+    which would need more than that (because the rejection sampling of
+    normal() was unlucky) are flagged in self.exhausted, and their values
+    should not be used.
+    """
+
+    def __init__(self, seeds, nWords=64, skipWords=0):
+        self.nWords = nWords
+        self._words = _mt19937Words(seeds, nWords)
+        self._cols = np.arange(len(self._words[0]))
+        self.pos = np.zeros(len(self._cols), dtype=int) + skipWords
+        self.exhausted = np.zeros(len(self._cols), dtype=bool)
+        self._hasGauss = np.zeros(len(self._cols), dtype=bool)
+        self._gauss = np.zeros(len(self._cols))
+
+    def random_sample(self, use=None):
+        """
+        Draw a double in [0, 1) from each stream (or only from the streams
+        where the boolean array use is True; the others are not advanced)
+        """
+        if use is None:
+            use = np.ones(len(self._cols), dtype=bool)
+        self.exhausted |= np.logical_and(use, self.pos + 2 > self.nWords)
+        pos = np.where(np.logical_and(use, self.pos + 2 <= self.nWords), self.pos, 0)
+        aa = self._words[pos, self._cols] >> np.uint64(5)
+        bb = self._words[pos + 1, self._cols] >> np.uint64(6)
+        self.pos = np.where(use, self.pos + 2, self.pos)
+        return (aa * 67108864.0 + bb) / 9007199254740992.0
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random_sample()
+
+    def _standardNormal(self):
+        # the polar method, as in RandomState.normal(); each accepted
+        # pair yields two values, the second of which is kept for
+        # the next call
+        values = np.where(self._hasGauss, self._gauss, 0.0)
+        pending = np.logical_not(self._hasGauss)
+        self._hasGauss = pending.copy()
+        while pending.any():
+            xx1 = 2.0 * self.random_sample(use=pending) - 1.0
+            xx2 = 2.0 * self.random_sample(use=pending) - 1.0
+            r2 = xx1 * xx1 + xx2 * xx2
+            accept = np.logical_and(pending, np.logical_and(r2 < 1.0, r2 != 0.0))
+            ff = np.sqrt(-2.0 * np.log(np.where(accept, r2, 0.5)) / np.where(accept, r2, 0.5))
+            values = np.where(accept, ff * xx2, values)
+            self._gauss = np.where(accept, ff * xx1, self._gauss)
+            pending = np.logical_and(pending, np.logical_not(accept))
+            pending = np.logical_and(pending, np.logical_not(self.exhausted))
+        return values
+
+    def normal(self, loc, scale):
+        return loc + scale * self._standardNormal()
+
+
+# BessellB AB peak magnitudes of the SALT2 model with x0 = 1 on a grid of
+# x1 and c (see _bessellBReferenceMag)
+_bessellB_x1_grid = np.arange(-5.0, 5.01, 0.5)
+_bessellB_c_grid = np.arange(-0.6, 0.61, 0.1)
+_bessellB_mag_table = None
+
+
+def _exactBessellBReferenceMag(x1val, cval):
+    from . import snObject
+    sn = snObject.SNObject()
+    sn.set(x1=x1val, c=cval, x0=1.0)
+    return sn.source.peakmag('bessellb', 'ab')
+
+
+def _bessellBReferenceMag(x1val, cval):
+    """
+    Return the rest frame BessellB AB peak magnitude of the SALT2 model with
+    x0 = 1. and the given x1 and c (which may be arrays), interpolated from a
+    table which is calculated the first time this is called. Values outside
+    of the table are calculated directly.
+    """
+    global _bessellB_mag_table
+    if _bessellB_mag_table is None:
+        table = np.zeros((len(_bessellB_x1_grid), len(_bessellB_c_grid)))
+        for ix, xx in enumerate(_bessellB_x1_grid):
+            for ic, cc in enumerate(_bessellB_c_grid):
+                table[ix, ic] = _exactBessellBReferenceMag(xx, cc)
+        _bessellB_mag_table = table
+
+    x1val, cval = np.broadcast_arrays(np.asarray(x1val, dtype=float),
+                                      np.asarray(cval, dtype=float))
+    shape = x1val.shape
+    x1val = x1val.ravel()
+    cval = cval.ravel()
+
+    ix = np.clip(np.searchsorted(_bessellB_x1_grid, x1val, side='right') - 1,
+                 0, len(_bessellB_x1_grid) - 2)
+    ic = np.clip(np.searchsorted(_bessellB_c_grid, cval, side='right') - 1,
+                 0, len(_bessellB_c_grid) - 2)
+    wx = (x1val - _bessellB_x1_grid[ix]) / (_bessellB_x1_grid[ix + 1] - _bessellB_x1_grid[ix])
+    wc = (cval - _bessellB_c_grid[ic]) / (_bessellB_c_grid[ic + 1] - _bessellB_c_grid[ic])
+
+    mag = _bessellB_mag_table[ix, ic] * (1.0 - wx) * (1.0 - wc) + \
+        _bessellB_mag_table[ix + 1, ic] * wx * (1.0 - wc) + \
+        _bessellB_mag_table[ix, ic + 1] * (1.0 - wx) * wc + \
+        _bessellB_mag_table[ix + 1, ic + 1] * wx * wc
+
+    outside = np.where(np.logical_or(np.logical_or(x1val < _bessellB_x1_grid[0],
+                                                   x1val > _bessellB_x1_grid[-1]),
+                                     np.logical_or(cval < _bessellB_c_grid[0],
+                                                   cval > _bessellB_c_grid[-1])))[0]
+    for dex in outside:
+        mag[dex] = _exactBessellBReferenceMag(x1val[dex], cval[dex])
+
+    return mag.reshape(shape)
+
+
 class SNUniverse(object):
     """
     Mixin Class for `lsst.sims.catalogs.measures.instances.InstanceCatalog` 
@@ -124,11 +279,117 @@ class SNUniverse(object):
         hostmu : float, mandatory
             distance modulus of host in 'magnitudes'
         """
-        vals = np.zeros(shape=(self.numobjs, 4))
+        if not self._defaultDraws:
+            vals = np.zeros(shape=(len(hostid), 4))
+            for i, v in enumerate(vals):
+                vals[i, :] = self.drawSNParams(hostid[i], hostmu[i])
+            return vals
+
+        return self._drawSNParamsForHosts(np.asarray(hostid), np.asarray(hostmu, dtype=float))
+
+    @property
+    def _defaultDraws(self):
+        """
+        True if none of the methods drawing SN parameters from the random
+        state of a host have been overridden, in which case the parameters of
+        many hosts can be drawn at once by _drawSNParamsForHosts
+        """
+        for name in ('drawSNParams', 'drawFromT0Dist', 'drawFromcDist',
+                     'drawFromx1Dist', 'drawFromX0Dist', 'getSN_rng'):
+            method = getattr(type(self), name)
+            if getattr(method, '__func__', method) is not SNUniverse.__dict__[name]:
+                return False
+        return True
+
+    def _snSeeds(self, hostid):
+        return np.asarray(hostid).astype(np.int64) % 4294967295
+
+    def SNt0DistFromHost(self, hostid):
+        """
+        Draw the time of peak t0 of the SN in each of an array of hosts, as
+        drawFromT0Dist(getSN_rng(hostid)) would, but for all of the hosts at
+        once. This only needs the first value in the random state of each host,
+        so it is a cheap way of finding which hosts have a SN during a given
+        time range before drawing any other parameters.
+
+        Parameters
+        ----------
+        hostid : `np.ndarray` of ints, mandatory
+            IDs of the hosts
+
+        Returns
+        -------
+        `np.ndarray` of t0 values (self.badvalues where self.suppressDimSN
+        removes the SN)
+        """
+        hostid = np.asarray(hostid)
+        if not self._defaultDraws:
+            return np.array([self.drawFromT0Dist(self.getSN_rng(hh)) for hh in hostid])
+
+        t0val, bad = self._drawT0ForHosts(hostid)
+        if bad.any():
+            t0val[bad] = self.badvalues
+        return t0val
+
+    def _drawT0ForHosts(self, hostid):
+        """
+        Return t0 for each of hostid and a boolean array which is True
+        where t0 is removed by self.suppressDimSN
+        """
+        t0Streams = _HostRandomStreams(self._snSeeds(hostid), nWords=2)
+        hundredyear = 1.0 / self.snFrequency
+        t0val = t0Streams.uniform(-hundredyear / 2.0 + self.midSurveyTime,
+                                  hundredyear / 2.0 + self.midSurveyTime)
+        if self.suppressDimSN:
+            bad = np.abs(t0val - self.mjdobs) > self.maxTimeSNVisible
+        else:
+            bad = np.zeros(len(t0val), dtype=bool)
+        return t0val, bad
+
+    def _drawSNParamsForHosts(self, hostid, hostmu):
+        """
+        Draw the SALT2 parameters c, x1, x0, t0 for the SN in an array of
+        hosts at once. This gives the same values as calling drawSNParams for
+        each host (the random state of each host is reproduced by
+        _HostRandomStreams, rather than instantiating a RandomState per host),
+        except that x0 is interpolated by _bessellBReferenceMag.
+
+        Parameters
+        ----------
+        hostid : `np.ndarray` of ints, mandatory
+        hostmu : `np.ndarray` of floats, mandatory
 
-        for i, v in enumerate(vals):
+        Returns
+        -------
+        `np.ndarray` of shape (len(hostid), 4)
+        """
+        vals = np.zeros(shape=(len(hostid), 4))
+        if len(hostid) == 0:
+            return vals
+
+        t0val, bad = self._drawT0ForHosts(hostid)
+
+        if bad.any():
+            vals[bad, :] = self.badvalues
+        good = np.where(np.logical_not(bad))[0]
+        if len(good) == 0:
+            return vals
+
+        streams = _HostRandomStreams(self._snSeeds(hostid)[good], skipWords=2)
+        cval = streams.normal(0., 0.1)
+        x1val = streams.normal(0., 1.0)
+        mabs = streams.normal(-19.3, 0.3)
+        x0val = self.x0FromBessellBMag(mabs + hostmu[good], x1val, cval)
+
+        vals[good, 0] = cval
+        vals[good, 1] = x1val
+        vals[good, 2] = x0val
+        vals[good, 3] = t0val[good]
+
+        # the few hosts whose random state was not generated far enough
+        for i in good[streams.exhausted]:
             vals[i, :] = self.drawSNParams(hostid[i], hostmu[i])
-        
+
         return vals
 
     def getSN_rng(self, hostid):
@@ -176,20 +437,36 @@ class SNUniverse(object):
     def drawFromX0Dist(self, rng, x1val, cval, hostmu, **hostParams):
         """
         rng is an instantiation of np.random.RandomState
-        """
-        from . import snObject
 
+        x0 is found with x0FromBessellBMag, i.e. the peak magnitude at
+        x0 = 1. is interpolated in (x1, c), so x0 differs slightly (a
+        relative error of up to ~5e-4) from the value computed directly
+        from the SALT2 model.
+        """
         # First draw an absolute BessellB magnitude for SN
         mabs = rng.normal(-19.3, 0.3)
         mag = mabs + hostmu
 
-        sn = snObject.SNObject()
-        sn.set(x1=x1val, c=cval)
-        sn.source.set_peakmag(mag, band='bessellb', magsys='ab')
-        x0val = sn.get('x0')
-        
+        x0val = float(self.x0FromBessellBMag(mag, x1val, cval))
+
         return x0val
 
+    def x0FromBessellBMag(self, mag, x1val, cval):
+        """
+        return the SALT2 parameter x0 for which the rest frame BessellB AB
+        peak magnitude of a SN with parameters x1val and cval is mag. The
+        arguments may be arrays. The peak magnitude at x0 = 1. is interpolated
+        from a table over (x1, c), rather than computed for each SN.
+
+        Parameters
+        ----------
+        mag : float or `np.ndarray`, mandatory
+            BessellB AB peak magnitude
+        x1val : float or `np.ndarray`, mandatory
+        cval : float or `np.ndarray`, mandatory
+        """
+        return np.power(10.0, -0.4 * (mag - _bessellBReferenceMag(x1val, cval)))
+
     def drawFromT0Dist(self, rng, **hostParams):
         '''
         Distribution function of the time of peak of SN
@@ -0,0 +1,113 @@
+from builtins import object
+import threading
+import queue
+import time
+
+__all__ = ["ChunkPrefetcher"]
+
+
+class ChunkPrefetcher(object):
+    """
+    This class wraps an iterator over chunks of database rows (e.g. the
+    ChunkIterator returned by CatalogDBObject.query_columns()) and reads
+    ahead from it in a background thread, so that fetching the next chunk
+    from the database overlaps with whatever is done with the current one.
+
+    Iterate over the ChunkPrefetcher exactly as you would over the wrapped
+    iterator.  If you stop before reaching the end, call close() so that the
+    background thread exits (the ChunkPrefetcher can also be used as a
+    context manager, which does this for you).  Exceptions raised by the
+    wrapped iterator are re-raised in the consuming thread.
+
+    Note: the database driver must allow the connection to be read from a
+    thread other than the one that created it.  The default sqlite driver
+    does not.
+
+    Input parameters:
+    -----------------
+    iterator is the iterator over chunks
+
+    depth (optional; default 2) is the maximum number of chunks to hold
+    in memory ahead of the consumer
+    """
+
+    # sentinel placed on the queue when the wrapped iterator is exhausted
+    _exhausted = object()
+
+    def __init__(self, iterator, depth=2):
+        if depth < 1:
+            raise RuntimeError("ChunkPrefetcher needs depth >= 1; you gave %s" % str(depth))
+
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._finished = False
+
+        # the total time (in seconds) the consumer has spent waiting for chunks
+        self.wait_time = 0.0
+
+        self._thread = threading.Thread(target=self._fetch, args=(iter(iterator),))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        """
+        Put item on the queue, giving up if close() is called while
+        the queue is full.  Returns True if the item was queued.
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch(self, iterator):
+        """
+        Read chunks from iterator onto the queue (run in the background thread).
+        """
+        try:
+            for chunk in iterator:
+                if not self._put((chunk, None)):
+                    return
+        except Exception as ee:
+            self._put((None, ee))
+            return
+
+        self._put((self._exhausted, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+
+        t_start = time.time()
+        chunk, error = self._queue.get()
+        self.wait_time += time.time() - t_start
+
+        if error is not None:
+            self.close()
+            raise error
+
+        if chunk is self._exhausted:
+            self.close()
+            raise StopIteration
+
+        return chunk
+
+    def close(self):
+        """
+        Stop reading ahead and wait for the background thread to exit.
+        It is safe to call close() more than once.
+        """
+        self._finished = True
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,235 @@
+from builtins import zip
+from builtins import object
+import numpy as np
+
+__all__ = ["LightCurveAccumulator"]
+
+
+class LightCurveAccumulator(object):
+    """
+    This class stores light curve measurements in columnar form: one
+    growable numpy array each for uniqueId, bandpass, MJD, brightness
+    (magnitude or flux), and brightness uncertainty.  Measurements are
+    appended in whatever order they are generated.  Once all of them have
+    been appended, finalize() sorts the columns once (by uniqueId, then
+    bandpass, then MJD) and records where each object's light curve
+    begins and ends, so that light curves can be returned as views into
+    the sorted columns without copying.
+
+    Input parameters:
+    -----------------
+    initial_size (optional; default 10000) is the number of measurements
+    for which space is allocated up front.  The buffers double in size
+    whenever they fill up.
+    """
+
+    def __init__(self, initial_size=10000):
+        self._capacity = max(int(initial_size), 1)
+        self._size = 0
+        self._unique_id = np.empty(self._capacity, dtype=np.int64)
+        self._band = np.empty(self._capacity, dtype=np.int8)
+        self._mjd = np.empty(self._capacity, dtype=float)
+        self._brightness = np.empty(self._capacity, dtype=float)
+        self._sigma = np.empty(self._capacity, dtype=float)
+
+        # the names of the bandpasses represented by the integer
+        # codes stored in self._band
+        self._band_names = []
+        self._band_codes = {}
+
+        # self._groups will be a dict keyed on uniqueId.  Each value
+        # is a list of (bandpass name, start, end) tuples denoting
+        # the slice of the sorted columns containing that light curve.
+        self._groups = None
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, n_needed):
+        """
+        Make sure the buffers can hold at least n_needed measurements.
+        """
+        if n_needed <= self._capacity:
+            return
+
+        new_capacity = self._capacity
+        while new_capacity < n_needed:
+            new_capacity *= 2
+
+        for name in ('_unique_id', '_band', '_mjd', '_brightness', '_sigma'):
+            old = getattr(self, name)
+            new = np.empty(new_capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+        self._capacity = new_capacity
+
+    def _band_code(self, bandpass):
+        """
+        Return the integer code corresponding to a bandpass name.
+        """
+        if bandpass not in self._band_codes:
+            self._band_codes[bandpass] = len(self._band_names)
+            self._band_names.append(bandpass)
+        return self._band_codes[bandpass]
+
+    def append(self, unique_id, bandpass, mjd, brightness, sigma):
+        """
+        Add measurements to the accumulator.
+
+        Parameters
+        ----------
+        unique_id is a numpy array of the uniqueIds of the measured objects
+
+        bandpass is either a str (if all of the measurements were made in the
+        same bandpass) or a numpy array of bandpass names
+
+        mjd is either a float (if all of the measurements were made at the
+        same time) or a numpy array of MJDs
+
+        brightness is a numpy array of magnitudes (or fluxes)
+
+        sigma is a numpy array of the uncertainties in brightness
+        """
+        unique_id = np.atleast_1d(unique_id)
+        n_new = len(unique_id)
+        if n_new == 0:
+            return
+
+        self._grow(self._size + n_new)
+        new_slice = slice(self._size, self._size + n_new)
+
+        if isinstance(bandpass, str):
+            self._band[new_slice] = self._band_code(bandpass)
+        else:
+            bandpass = np.asarray(bandpass)
+            band_list, band_dexes = np.unique(bandpass, return_inverse=True)
+            code_list = np.array([self._band_code(str(bb)) for bb in band_list], dtype=np.int8)
+            self._band[new_slice] = code_list[band_dexes]
+
+        self._unique_id[new_slice] = unique_id
+        self._mjd[new_slice] = mjd
+        self._brightness[new_slice] = brightness
+        self._sigma[new_slice] = sigma
+        self._size += n_new
+        self._groups = None
+
+    def extend(self, other):
+        """
+        Append all of the measurements stored in another LightCurveAccumulator
+        (e.g. one filled by a different process) to this one.
+
+        Parameters
+        ----------
+        other is the LightCurveAccumulator whose measurements are to be added
+        """
+        n_new = len(other)
+        if n_new == 0:
+            return
+
+        self._grow(self._size + n_new)
+        new_slice = slice(self._size, self._size + n_new)
+
+        code_list = np.array([self._band_code(bb) for bb in other._band_names], dtype=np.int8)
+        self._band[new_slice] = code_list[other._band[:n_new]]
+        self._unique_id[new_slice] = other._unique_id[:n_new]
+        self._mjd[new_slice] = other._mjd[:n_new]
+        self._brightness[new_slice] = other._brightness[:n_new]
+        self._sigma[new_slice] = other._sigma[:n_new]
+        self._size += n_new
+        self._groups = None
+
+    def finalize(self):
+        """
+        Sort the measurements by uniqueId, bandpass, and MJD and find the
+        boundaries of each light curve.  This must be called before any
+        light curves are read out.  It is safe to call finalize() more
+        than once, and to append more measurements afterwards (in which
+        case finalize() must be called again).
+        """
+        if self._groups is not None:
+            return
+
+        n = self._size
+        if n == 0:
+            self._groups = {}
+            return
+
+        # np.lexsort is stable, so measurements with identical
+        # (uniqueId, bandpass, MJD) keep the order in which they arrived
+        sorted_dexes = np.lexsort((self._mjd[:n], self._band[:n], self._unique_id[:n]))
+
+        for name in ('_unique_id', '_band', '_mjd', '_brightness', '_sigma'):
+            setattr(self, name, getattr(self, name)[:n][sorted_dexes])
+
+        self._capacity = n
+
+        boundaries = np.logical_or(self._unique_id[1:] != self._unique_id[:-1],
+                                   self._band[1:] != self._band[:-1])
+
+        starts = np.concatenate(([0], np.flatnonzero(boundaries) + 1))
+        ends = np.concatenate((starts[1:], [n]))
+
+        self._groups = {}
+        for start, end in zip(starts, ends):
+            unique_id = int(self._unique_id[start])
+            if unique_id not in self._groups:
+                self._groups[unique_id] = []
+            self._groups[unique_id].append((self._band_names[self._band[start]], start, end))
+
+    @property
+    def unique_ids(self):
+        """
+        A sorted numpy array of the uniqueIds of all of the objects
+        with at least one measurement.
+        """
+        self.finalize()
+        return np.array(sorted(self._groups.keys()), dtype=np.int64)
+
+    @property
+    def columns(self):
+        """
+        A dict of the sorted columns, keyed on 'uniqueId', 'bandpass',
+        'mjd', 'brightness', and 'error'.
+        """
+        self.finalize()
+        return {'uniqueId': self._unique_id[:self._size],
+                'bandpass': np.array(self._band_names, dtype=str)[self._band[:self._size]]
+                            if self._size > 0 else np.array([], dtype=str),
+                'mjd': self._mjd[:self._size],
+                'brightness': self._brightness[:self._size],
+                'error': self._sigma[:self._size]}
+
+    def light_curve(self, unique_id, brightness_name='mag'):
+        """
+        Return the light curve of a single object as a dict keyed on bandpass.
+        Each bandpass yields a dict keyed on 'mjd', brightness_name, and 'error'
+        containing views into the sorted columns (i.e. no data is copied).
+        """
+        self.finalize()
+        output = {}
+        for bp, start, end in self._groups[int(unique_id)]:
+            output[bp] = {'mjd': self._mjd[start:end],
+                          brightness_name: self._brightness[start:end],
+                          'error': self._sigma[start:end]}
+        return output
+
+    def to_dict(self, brightness_name='mag'):
+        """
+        Return all of the light curves in the format returned by
+        LightCurveGenerator.light_curves_from_pointings(), i.e.
+
+        output[111]['u']['mjd'] is a numpy array of the MJDs of observations
+        of object 111 in the u band
+
+        output[111]['u'][brightness_name] is a numpy array of the magnitudes
+        (or fluxes) of object 111 in the u band
+
+        output[111]['u']['error'] is a numpy array of the uncertainties on
+        those magnitudes (or fluxes)
+
+        All of the numpy arrays are views into the sorted columns.
+        """
+        self.finalize()
+        return dict([(unique_id, self.light_curve(unique_id, brightness_name=brightness_name))
+                     for unique_id in self._groups])
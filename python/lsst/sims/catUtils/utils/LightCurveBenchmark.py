@@ -0,0 +1,273 @@
+"""
+This file defines the tools for benchmarking the LightCurveGenerators on
+synthetic, local sqlite databases, so that their throughput can be tracked
+without access to the CatSim database or a real OpSim run.
+"""
+
+from builtins import range
+import os
+import copy
+import json
+import time
+import sqlite3
+import multiprocessing
+import numpy as np
+
+from lsst.utils import getPackageDir
+from lsst.sims.catUtils.utils import makeStarDatabase, makeGalaxyDatabase
+from lsst.sims.catUtils.utils import testStarsDBObj, testGalaxyAgnDBObj
+from lsst.sims.catUtils.utils import JsonLinesMetrics, peak_rss_mb
+from lsst.sims.catUtils.utils import StellarLightCurveGenerator, FastStellarLightCurveGenerator
+from lsst.sims.catUtils.utils import AgnLightCurveGenerator, FastAgnLightCurveGenerator
+
+__all__ = ["makeOpSimSummaryDatabase", "makeVariableStarDatabase",
+           "benchmarkStarsDBObj", "runLightCurveBenchmark"]
+
+
+def makeOpSimSummaryDatabase(filename='OpSimSummary.db', n_visits=1000, n_fields=4, seedVal=32,
+                             radius=0.5, pointingRA=50.0, pointingDec=-10.0):
+    """
+    Write a synthetic OpSim database containing a Summary table with
+    the columns the ObservationMetaDataGenerator needs.
+
+    filename is the name of the sqlite file to write
+
+    n_visits is the number of visits to write
+
+    n_fields is the number of distinct field centers; they are placed at random
+    within radius degrees of (pointingRA, pointingDec) and the visits are
+    divided among them as evenly as possible
+
+    The visits are randomly distributed among the six LSST filters and over
+    ten years of MJD.
+    """
+
+    rng = np.random.RandomState(seedVal)
+
+    rr = rng.random_sample(n_fields)*radius
+    theta = rng.random_sample(n_fields)*2.0*np.pi
+    field_ra = np.radians(pointingRA + rr*np.cos(theta))
+    field_dec = np.radians(pointingDec + rr*np.sin(theta))
+
+    field_id = np.arange(n_visits) % n_fields
+    mjd = np.sort(rng.random_sample(n_visits)*3650.0 + 59580.0)
+    bands = np.array(['u', 'g', 'r', 'i', 'z', 'y'])
+    filter_name = bands[rng.randint(0, 6, n_visits)]
+    m5 = rng.random_sample(n_visits)*2.0 + 23.0
+    sky_brightness = rng.random_sample(n_visits)*2.0 + 19.0
+    seeing = rng.random_sample(n_visits)*0.5 + 0.6
+    rot_sky_pos = rng.random_sample(n_visits)*2.0*np.pi
+
+    conn = sqlite3.connect(filename)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE Summary (obsHistID int, expMJD real, fieldRA real, fieldDec real,
+                 filter text, fieldID int, night int, fiveSigmaDepth real,
+                 filtSkyBrightness real, FWHMeff real, rotSkyPos real)''')
+
+    c.executemany('''INSERT INTO Summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  [(ii, mjd[ii], field_ra[field_id[ii]], field_dec[field_id[ii]],
+                    str(filter_name[ii]), int(field_id[ii]), int(mjd[ii]-59580.0),
+                    m5[ii], sky_brightness[ii], seeing[ii], rot_sky_pos[ii])
+                   for ii in range(n_visits)])
+
+    conn.commit()
+    conn.close()
+
+
+def makeVariableStarDatabase(filename='VariableStarDB.db', size=1000, seedVal=32,
+                             radius=1.0, pointingRA=50.0, pointingDec=-10.0):
+    """
+    Write a database of stars with makeStarDatabase() and give each of them
+    an RR Lyrae light curve, stored in the column varParamStr (which is
+    what the StellarLightCurveGenerator queries on).
+
+    The input parameters are as in makeStarDatabase().
+    """
+    makeStarDatabase(filename=filename, size=size, seedVal=seedVal,
+                     radius=radius, pointingRA=pointingRA, pointingDec=pointingDec)
+
+    rng = np.random.RandomState(seedVal)
+    lc_dir = os.path.join(getPackageDir('sims_sed_library'), 'rrly_lc', 'RRab')
+    list_of_lc = sorted(['rrly_lc/RRab/%s' % ww for ww in os.listdir(lc_dir) if 'per.txt' in ww])
+    lc_dex = rng.randint(0, len(list_of_lc), size)
+    mjd0 = rng.random_sample(size)*10000.0 + 40000.0
+
+    conn = sqlite3.connect(filename)
+    c = conn.cursor()
+    c.execute('''ALTER TABLE StarAllForceseek ADD COLUMN varParamStr text''')
+    c.execute('''CREATE INDEX star_id ON StarAllForceseek (simobjid)''')
+    c.executemany('''UPDATE StarAllForceseek SET varParamStr = ? WHERE simobjid = ?''',
+                  [(json.dumps({'varMethodName': 'applyRRly',
+                                'pars': {'tStartMjd': mjd0[ii],
+                                         'filename': list_of_lc[lc_dex[ii]]}}), ii)
+                   for ii in range(size)])
+    conn.commit()
+    conn.close()
+
+
+class benchmarkStarsDBObj(testStarsDBObj):
+    """
+    A CatalogDBObject for the databases written by makeVariableStarDatabase()
+    """
+    objid = 'benchmarkStarDBObj'
+    objectTypeId = 92
+
+    # testStarsDBObj drops galacticAv because StarObj calculates it with
+    # a function sqlite does not have
+    columns = copy.deepcopy(testStarsDBObj.columns)
+    columns.append(('galacticAv', 'ebv*3.1'))
+
+
+# the generators that can be benchmarked, and the kind of database each reads
+_benchmark_generators = {'StellarLightCurveGenerator': (StellarLightCurveGenerator, 'stars'),
+                         'FastStellarLightCurveGenerator': (FastStellarLightCurveGenerator, 'stars'),
+                         'AgnLightCurveGenerator': (AgnLightCurveGenerator, 'galaxies'),
+                         'FastAgnLightCurveGenerator': (FastAgnLightCurveGenerator, 'galaxies')}
+
+_benchmark_db_classes = {'stars': benchmarkStarsDBObj,
+                         'galaxies': testGalaxyAgnDBObj}
+
+
+def _run_one_benchmark(generator_name, db_name, opsim_name, chunk_size):
+    """
+    Generate light curves for every pointing in opsim_name with the generator
+    named generator_name, and return a dict describing how long it took.
+    This is run in a separate process so that peak_rss_mb reflects only
+    this benchmark.
+    """
+    generator_class, db_type = _benchmark_generators[generator_name]
+    db_obj = _benchmark_db_classes[db_type](database=db_name, driver='sqlite')
+    lc_gen = generator_class(db_obj, opsim_name)
+
+    t_start = time.time()
+    pointings = lc_gen.get_pointings((0.0, 360.0), (-90.0, 90.0))
+    pointing_time = time.time() - t_start
+
+    t_start = time.time()
+    light_curves, truth = lc_gen.light_curves_from_pointings(pointings, chunk_size=chunk_size)
+    lc_time = time.time() - t_start
+
+    n_measurements = len(lc_gen._accumulator)
+
+    return {'generator': generator_name,
+            'n_fields': len(pointings),
+            'n_light_curves': len(light_curves),
+            'n_measurements': n_measurements,
+            'pointing_time': pointing_time,
+            'time': lc_time,
+            'object_visits_per_second': n_measurements/lc_time if lc_time > 0.0 else None,
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def runLightCurveBenchmark(scratch_dir, n_objects_list=(1000, 10000), n_visits_list=(100, 1000),
+                           generator_names=('StellarLightCurveGenerator',
+                                            'FastStellarLightCurveGenerator',
+                                            'AgnLightCurveGenerator',
+                                            'FastAgnLightCurveGenerator'),
+                           n_fields=4, chunk_size=10000, output=None, seedVal=32):
+    """
+    Benchmark LightCurveGenerators on synthetic databases of every combination
+    of n_objects_list and n_visits_list.  Everything is read from sqlite files
+    written to scratch_dir (which are deleted afterwards), so no network
+    access is needed.
+
+    Input parameters:
+    -----------------
+    scratch_dir is the directory in which to write the databases
+
+    n_objects_list is a list of the numbers of stars and galaxies to put in
+    the catalog databases (see makeVariableStarDatabase() and makeGalaxyDatabase())
+
+    n_visits_list is a list of the numbers of visits to put in the OpSim
+    database (see makeOpSimSummaryDatabase())
+
+    generator_names is a list of the names of the LightCurveGenerator
+    classes to benchmark (StellarLightCurveGenerator,
+    FastStellarLightCurveGenerator, AgnLightCurveGenerator, and/or
+    FastAgnLightCurveGenerator)
+
+    n_fields is the number of distinct fields among which the visits are
+    divided.  Every field covers all of the objects.
+
+    chunk_size is passed to light_curves_from_pointings()
+
+    output (optional) is the name of a file to which each result will be
+    appended as a line of JSON (see JsonLinesMetrics)
+
+    seedVal is the seed of the random number generators used to make
+    the databases
+
+    Output
+    ------
+    A list of dicts, one per benchmark, containing the generator name,
+    n_objects, n_visits, n_fields, n_light_curves, n_measurements (the number
+    of object-visit pairs photometered), the time spent in get_pointings()
+    and light_curves_from_pointings() in seconds, object_visits_per_second
+    (n_measurements over the time spent in light_curves_from_pointings()),
+    and the peak resident memory of the process that ran the benchmark in
+    megabytes.
+    """
+
+    for name in generator_names:
+        if name not in _benchmark_generators:
+            raise RuntimeError("Cannot benchmark %s; the options are %s"
+                               % (name, str(sorted(_benchmark_generators.keys()))))
+
+    if output is not None:
+        metrics = JsonLinesMetrics(output)
+
+    context = multiprocessing.get_context('fork')
+
+    results = []
+    file_list = []
+    try:
+        db_dict = {}
+        for n_objects in n_objects_list:
+            db_dict[n_objects] = {}
+            for db_type in ('stars', 'galaxies'):
+                if not any(_benchmark_generators[name][1] == db_type for name in generator_names):
+                    continue
+                db_name = os.path.join(scratch_dir, 'lc_benchmark_%s_%d.db' % (db_type, n_objects))
+                if os.path.exists(db_name):
+                    os.unlink(db_name)
+                file_list.append(db_name)
+                if db_type == 'stars':
+                    makeVariableStarDatabase(filename=db_name, size=n_objects, seedVal=seedVal)
+                else:
+                    makeGalaxyDatabase(filename=db_name, size=n_objects, seedVal=seedVal)
+                db_dict[n_objects][db_type] = db_name
+
+        opsim_dict = {}
+        for n_visits in n_visits_list:
+            opsim_name = os.path.join(scratch_dir, 'lc_benchmark_opsim_%d.db' % n_visits)
+            if os.path.exists(opsim_name):
+                os.unlink(opsim_name)
+            file_list.append(opsim_name)
+            makeOpSimSummaryDatabase(filename=opsim_name, n_visits=n_visits,
+                                     n_fields=n_fields, seedVal=seedVal)
+            opsim_dict[n_visits] = opsim_name
+
+        for n_objects in n_objects_list:
+            for n_visits in n_visits_list:
+                for name in generator_names:
+                    db_name = db_dict[n_objects][_benchmark_generators[name][1]]
+                    pool = context.Pool(processes=1)
+                    try:
+                        result = pool.apply(_run_one_benchmark,
+                                            (name, db_name, opsim_dict[n_visits], chunk_size))
+                        pool.close()
+                    finally:
+                        pool.terminate()
+                        pool.join()
+
+                    result['n_objects'] = n_objects
+                    result['n_visits'] = n_visits
+                    results.append(result)
+                    if output is not None:
+                        metrics.record('benchmark', **result)
+    finally:
+        for file_name in file_list:
+            if os.path.exists(file_name):
+                os.unlink(file_name)
+
+    return results
@@ -1,18 +1,27 @@
 from __future__ import print_function
 from builtins import zip
 from builtins import str
+from builtins import range
 from builtins import object
 import numpy as np
 import copy
-from collections import OrderedDict
 
 from lsst.sims.catUtils.utils import ObservationMetaDataGenerator
+from lsst.sims.catUtils.utils import LightCurveAccumulator
+from lsst.sims.catUtils.utils import LightCurveWriter, LightCurveReader
+from lsst.sims.catUtils.utils import ChunkPrefetcher
+from lsst.sims.catUtils.utils import LightCurveMetrics, JsonLinesMetrics
+from lsst.sims.catUtils.utils import StageTimer, peak_rss_mb
 from lsst.sims.catUtils.mixins import PhotometryStars, VariabilityStars
 from lsst.sims.catUtils.mixins import PhotometryGalaxies, VariabilityGalaxies
 from lsst.sims.catalogs.definitions import InstanceCatalog
 from lsst.sims.catalogs.decorators import compound, cached
-from lsst.sims.utils import haversine
+from lsst.sims.photUtils import calcGamma, calcMagError_m5
+from lsst.sims.utils import ObservationMetaData, haversine
 
+import multiprocessing
+import traceback
+import hashlib
 import time
 
 __all__ = ["StellarLightCurveGenerator",
@@ -26,6 +35,152 @@ __all__ = ["StellarLightCurveGenerator",
 # a global cache to store SedLists loaded by the light curve catalogs
 _sed_cache = {}
 
+# the state of a worker process forked by LightCurveGenerator._field_results()
+_worker_state = {}
+
+
+def _reconnect_in_worker(catalogdb):
+    """
+    Give a forked worker process a database connection of its own.
+
+    The worker inherits the parent's SQLAlchemy engine, whose pool (and the
+    session of catalogdb, which keeps the connection of its last query
+    checked out) hold the parent's open DBAPI connections.  Those must not
+    be used from two processes, so the worker forgets the inherited session
+    and disposes of the inherited pool; its next query opens a new
+    connection.  The inherited objects are kept referenced for the life of
+    the worker, so that the parent's connections are never closed or rolled
+    back from the worker.
+
+    An in-memory SQLite database (e.g. one built by fileDBObject) only exists
+    inside the connection that created it, so the worker keeps using its
+    copy of that connection, which fork() made private to the worker.
+    """
+    connection = catalogdb.connection
+    if connection.driver == 'sqlite' and connection.database in (None, ':memory:'):
+        return
+
+    _worker_state['inherited_session'] = connection.session()
+    connection.session.registry.clear()
+    try:
+        connection.engine.dispose(close=False)
+    except TypeError:
+        # SQLAlchemy older than 1.4.33 has no close argument
+        connection.engine.dispose()
+
+
+def _light_curve_worker_init(generator, pointings, field_ids, chunk_size, lc_per_field,
+                             constraint, max_retries, abandoned):
+    """
+    Initialize a worker process used to generate light curves in parallel.
+    The arguments are inherited from the parent process when the worker is
+    forked, so they do not need to be picklable.  abandoned is the
+    multiprocessing.Event set by the parent when it no longer wants the
+    results of the remaining groups.
+    """
+    _reconnect_in_worker(generator._catalogdb)
+    _worker_state['abandoned'] = abandoned
+    _worker_state['generator'] = generator
+    _worker_state['pointings'] = pointings
+    _worker_state['field_ids'] = field_ids
+    _worker_state['cat_dict'] = generator._build_catalogs(pointings)
+    _worker_state['kwargs'] = {'lc_per_field': lc_per_field,
+                               'constraint': constraint,
+                               'max_retries': max_retries}
+    _worker_state['chunk_size'] = chunk_size
+
+
+def _light_curve_worker(i_grp):
+    """
+    Generate the light curves for the i_grp-th group of pointings in a
+    worker process.  Returns the output of
+    LightCurveGenerator._light_curves_from_field(), or None if the parent
+    has abandoned the remaining groups.
+    """
+    if _worker_state['abandoned'].is_set():
+        return None
+    generator = _worker_state['generator']
+    return generator._light_curves_from_field(_worker_state['cat_dict'],
+                                              _worker_state['pointings'][i_grp],
+                                              _worker_state['chunk_size'],
+                                              field_id=_worker_state['field_ids'][i_grp],
+                                              **_worker_state['kwargs'])
+
+
+class _SkyTile(list):
+    """
+    A list of ObservationMetaData, sorted by MJD, whose circular footprints
+    overlap the tile of sky ra_min <= RA < ra_max, dec_min <= Dec < dec_max
+    (all in radians).  These are produced by LightCurveGenerator.tile_pointings()
+    and can be used wherever a group of pointings from get_pointings() can be.
+
+    The objects in the tile are queried with self.query_obs, a box slightly
+    larger than the tile.  Only the objects inside the tile (see owns()) are
+    kept, so that each object belongs to exactly one tile, and each of those
+    objects is only photometered in the visits whose footprints actually
+    contain it (see pointing_coverage()).
+    """
+
+    def __init__(self, obs_list, ra_min, ra_max, dec_min, dec_max):
+        super(_SkyTile, self).__init__(obs_list)
+        self.ra_min = ra_min
+        self.ra_max = ra_max
+        self.dec_min = dec_min
+        self.dec_max = dec_max
+
+        # the distinct footprints of the visits in the tile;
+        # self.visit_pointing[ix] is the index of the footprint of self[ix]
+        pointing_dex = {}
+        pointing_ra = []
+        pointing_dec = []
+        pointing_radius = []
+        visit_pointing = []
+        for obs in obs_list:
+            key = (obs._pointingRA, obs._pointingDec, obs.boundLength)
+            if key not in pointing_dex:
+                pointing_dex[key] = len(pointing_ra)
+                pointing_ra.append(obs._pointingRA)
+                pointing_dec.append(obs._pointingDec)
+                pointing_radius.append(np.radians(obs.boundLength))
+            visit_pointing.append(pointing_dex[key])
+
+        self.pointing_ra = np.array(pointing_ra)
+        self.pointing_dec = np.array(pointing_dec)
+        self.pointing_radius = np.array(pointing_radius)
+        self.visit_pointing = np.array(visit_pointing, dtype=int)
+
+        # pad the query by an arcsecond so that objects on the edges
+        # of the tile are not lost to round-off
+        pad = 1.0/3600.0
+        self.query_obs = ObservationMetaData(pointingRA=np.degrees(0.5*(ra_min+ra_max)),
+                                             pointingDec=np.degrees(0.5*(dec_min+dec_max)),
+                                             boundType='box',
+                                             boundLength=np.array([np.degrees(0.5*(ra_max-ra_min))+pad,
+                                                                   np.degrees(0.5*(dec_max-dec_min))+pad]),
+                                             mjd=obs_list[0].mjd.TAI,
+                                             bandpassName=obs_list[0].bandpass)
+
+    def owns(self, ra, dec):
+        """
+        Return a boolean numpy array indicating which of the objects at
+        (ra, dec) (numpy arrays in radians) fall inside this tile.
+        """
+        ra = ra % (2.0*np.pi)
+        in_ra = np.logical_and(ra >= self.ra_min, ra < self.ra_max)
+        in_dec = np.logical_and(dec >= self.dec_min,
+                                np.logical_or(dec < self.dec_max, self.dec_max >= 0.5*np.pi))
+        return np.logical_and(in_ra, in_dec)
+
+    def pointing_coverage(self, ra, dec):
+        """
+        Return a 2-D boolean numpy array whose [i, j] element indicates
+        whether the i-th footprint in this tile contains the object at
+        (ra[j], dec[j]) (in radians).  The coverage of visit self[ix]
+        is the row self.visit_pointing[ix].
+        """
+        return haversine(ra[None, :], dec[None, :],
+                         self.pointing_ra[:, None], self.pointing_dec[:, None]) <= self.pointing_radius[:, None]
+
 
 class _baseLightCurveCatalog(InstanceCatalog):
     """
@@ -119,8 +274,10 @@ class _stellarLightCurveCatalog(_baseLightCurveCatalog, VariabilityStars, Photom
 
         object_names = self.column_by_name("uniqueId")
 
+        # key the cache on the full list of objects; when generating light curves
+        # for a _SkyTile, different visits may cover different subsets of a chunk
         if len(object_names) > 0:
-            cache_name = "stellar_%s_%s" % (object_names[0], object_names[-1])
+            cache_name = "stellar_%s" % hashlib.md5(np.ascontiguousarray(object_names)).hexdigest()
         else:
             cache_name = None
 
@@ -173,8 +330,10 @@ class _agnLightCurveCatalog(_baseLightCurveCatalog, VariabilityGalaxies, Photome
 
         object_names = self.column_by_name("uniqueId")
 
+        # key the cache on the full list of objects; when generating light curves
+        # for a _SkyTile, different visits may cover different subsets of a chunk
         if len(object_names) > 0:
-            cache_name = "agn_%s_%s" % (object_names[0], object_names[-1])
+            cache_name = "agn_%s" % hashlib.md5(np.ascontiguousarray(object_names)).hexdigest()
         else:
             cache_name = None
 
@@ -223,16 +382,46 @@ class LightCurveGenerator(object):
 
     opsimdriver (optional; default 'sqlite') indicates the database driver to
     be used when connecting to opsimdb.
+
+    prefetch_depth (optional; default 0) is the number of chunks of catalog
+    rows to read ahead in a background thread while the current chunk is
+    being processed (see ChunkPrefetcher).  0 means no prefetching.  This
+    requires a database driver that can be read from more than one thread
+    (i.e. not sqlite).
+
+    query_cache (optional) is a QueryResultCache in which to keep the results
+    of the catalog queries, so that regenerating light curves for the same
+    fields does not have to query catalogdb again.  None means no caching.
+
+    metrics (optional) is a LightCurveMetrics hook which records the time
+    spent on each field, chunk, and stage of the light curve generation.
+    If a string is passed, the metrics are appended to the file of that name
+    as JSON lines (see JsonLinesMetrics).  None means no metrics are recorded.
     """
 
     _lightCurveCatalogClass = None
     _brightness_name = 'mag'
 
-    def __init__(self, catalogdb, opsimdb, opsimdriver="sqlite"):
+    def __init__(self, catalogdb, opsimdb, opsimdriver="sqlite", prefetch_depth=0,
+                 query_cache=None, metrics=None):
         self._generator = ObservationMetaDataGenerator(database=opsimdb,
                                                        driver=opsimdriver)
 
         self._catalogdb = catalogdb
+        self.prefetch_depth = prefetch_depth
+        self.query_cache = query_cache
+
+        if metrics is None:
+            self.metrics = LightCurveMetrics()
+        elif isinstance(metrics, str):
+            self.metrics = JsonLinesMetrics(metrics)
+        else:
+            self.metrics = metrics
+
+        # the index of the field being generated and the number of
+        # database rows read for it (reported to self.metrics)
+        self._field_id = None
+        self._field_rows = 0
 
         # optional constraint on query to catalog database
         # (usually 'varParamStr IS NOT NULL')
@@ -242,6 +431,127 @@ class LightCurveGenerator(object):
     def _filter_chunk(self, chunk):
         return chunk
 
+    def _restrict_to_tile(self, cat, chunk, grp):
+        """
+        If grp is a _SkyTile, remove the objects that do not belong to the
+        tile from chunk, and find which visits in grp cover each remaining
+        object.
+
+        Input parameters:
+        -----------------
+        cat is an InstanceCatalog from which the object coordinates can be
+        calculated
+
+        chunk is a chunk of database rows
+
+        grp is a group of pointings (either a list or a _SkyTile)
+
+        Output
+        ------
+        The (possibly) restricted chunk
+
+        A 2-D boolean numpy array (see _SkyTile.pointing_coverage()) or None
+        if grp is not a _SkyTile (in which case every visit covers every object)
+        """
+        if chunk is None or not isinstance(grp, _SkyTile):
+            return chunk, None
+
+        cat._set_current_chunk(chunk)
+        ra = cat.column_by_name('raJ2000')
+        dec = cat.column_by_name('decJ2000')
+        owned = grp.owns(ra, dec)
+        return chunk[owned], grp.pointing_coverage(ra[owned], dec[owned])
+
+    def tile_pointings(self, pointings, tile_size=1.0):
+        """
+        Rearrange the output of get_pointings() so that objects covered
+        by more than one field are only queried and photometered once.
+
+        The sky under the pointings is divided into tiles of roughly
+        tile_size by tile_size degrees (the width in RA grows towards the
+        poles so that the tiles keep about the same area).  Each tile yields
+        a group of all of the visits whose footprints overlap it.  Each
+        object is assigned to exactly one tile and, within that tile, is only
+        photometered in the visits whose footprints contain it, so no work
+        is duplicated where neighboring fields overlap.
+
+        Input parameters:
+        -----------------
+        pointings is a 2-D list of ObservationMetaData as returned by
+        get_pointings()
+
+        tile_size (optional; default 1.0) is the side of each tile in degrees
+
+        Output
+        ------
+        A list of groups of ObservationMetaData (each sorted by MJD) that can be
+        passed to light_curves_from_pointings() or write_light_curves() in place
+        of pointings.  The light curves will be the same.  lc_per_field cannot be
+        used with tiles, since the objects it selects would not be the same.
+        """
+        obs_list = [obs for grp in pointings for obs in grp]
+        if len(obs_list) == 0:
+            return []
+
+        mjd_arr = np.array([obs.mjd.TAI for obs in obs_list])
+        ptg_ra = np.array([obs._pointingRA for obs in obs_list])
+        ptg_dec = np.array([obs._pointingDec for obs in obs_list])
+        ptg_radius = np.radians(np.array([obs.boundLength for obs in obs_list]))
+
+        # only the distinct footprints are needed to decide which tiles to keep;
+        # ptg_dex maps each visit onto its footprint
+        footprint_dex = {}
+        ptg_dex = np.zeros(len(obs_list), dtype=int)
+        for ix, key in enumerate(zip(ptg_ra, ptg_dec, ptg_radius)):
+            if key not in footprint_dex:
+                footprint_dex[key] = len(footprint_dex)
+            ptg_dex[ix] = footprint_dex[key]
+
+        unique_ptg = np.zeros((len(footprint_dex), 3), dtype=float)
+        for key in footprint_dex:
+            unique_ptg[footprint_dex[key]] = key
+        unique_ra = unique_ptg[:, 0]
+        unique_dec = unique_ptg[:, 1]
+        unique_radius = unique_ptg[:, 2]
+
+        tile_rad = np.radians(tile_size)
+        dec_lo = max(-0.5*np.pi, (unique_dec - unique_radius).min())
+        dec_hi = min(0.5*np.pi, (unique_dec + unique_radius).max())
+        n_dec = max(1, int(np.ceil((dec_hi - dec_lo)/tile_rad)))
+        dec_edges = np.linspace(dec_lo, dec_hi, n_dec+1)
+
+        tile_list = []
+        for dec_min, dec_max in zip(dec_edges[:-1], dec_edges[1:]):
+            # the widest part of the band sets the number of tiles in RA
+            if dec_min <= 0.0 and dec_max >= 0.0:
+                cos_dec = 1.0
+            else:
+                cos_dec = np.cos(min(np.abs(dec_min), np.abs(dec_max)))
+            n_ra = max(1, int(np.ceil(2.0*np.pi*cos_dec/tile_rad)))
+            ra_edges = np.linspace(0.0, 2.0*np.pi, n_ra+1)
+            ra_min = ra_edges[:-1]
+            ra_max = ra_edges[1:]
+            ra_center = 0.5*(ra_min + ra_max)
+            dec_center = 0.5*(dec_min + dec_max)
+
+            # the largest distance from the center of each tile to its corners
+            circumradius = np.max([haversine(ra_center, dec_center, ra_corner, dec_corner)
+                                   for ra_corner in (ra_min, ra_max)
+                                   for dec_corner in (dec_min, dec_max)], axis=0)
+
+            # a tile is kept if any footprint comes within circumradius of its center
+            overlap = haversine(ra_center[:, None], dec_center,
+                                unique_ra[None, :], unique_dec[None, :]) <= \
+                unique_radius[None, :] + circumradius[:, None]
+
+            for i_ra in np.where(overlap.any(axis=1))[0]:
+                visit_dexes = np.where(overlap[i_ra][ptg_dex])[0]
+                visit_dexes = visit_dexes[np.argsort(mjd_arr[visit_dexes], kind='mergesort')]
+                tile_list.append(_SkyTile([obs_list[ix] for ix in visit_dexes],
+                                          ra_min[i_ra], ra_max[i_ra], dec_min, dec_max))
+
+        return tile_list
+
     def get_pointings(self, ra, dec,
                       bandpass=('u', 'g', 'r', 'i', 'z', 'y'),
                       expMJD=None,
@@ -272,7 +582,7 @@ class LightCurveGenerator(object):
         Pointings will not be sorted or grouped by filter.
         """
 
-        print('parameters', ra, dec, bandpass, expMJD)
+        t_start = time.time()
         if isinstance(bandpass, str):
             obs_list = self._generator.getObservationMetaData(fieldRA=ra,
                                                               fieldDec=dec,
@@ -303,41 +613,43 @@ class LightCurveGenerator(object):
         # point in the sky are in a list together (this will allow us to generate the
         # light curves one pointing at a time without having to query the database for
         # the same results more than once.
+        #
+        # Pointings are grouped on their (RA, Dec) quantized to tol radians.
+        # Sorting those integer keys puts all of the members of a group next to
+        # each other, so the whole grouping is done with numpy sorts rather than
+        # by comparing every pointing against every existing group.
         tol = 1.0e-12
 
-        obs_groups = []  # a list of list of the indices of the ObservationMetaDatas
-                         # in obs_list.  All of the ObservationMetaData in
-                         # obs_list[i] will point to the same point on the sky.
+        n_obs = len(obs_list)
+        ra_key = np.round(np.array([obs._pointingRA for obs in obs_list])/tol).astype(np.int64)
+        dec_key = np.round(np.array([obs._pointingDec for obs in obs_list])/tol).astype(np.int64)
+        mjd_arr = np.array([obs.mjd.TAI for obs in obs_list])
 
-        mjd_groups = []  # a list of lists of the MJDs of the ObservationMetaDatas
-                         # so that they can be sorted into chronological order before
-                         # light curves are calculated
+        key_dexes = np.lexsort((dec_key, ra_key))
+        is_new_group = np.ones(n_obs, dtype=bool)
+        is_new_group[1:] = np.logical_or(ra_key[key_dexes][1:] != ra_key[key_dexes][:-1],
+                                         dec_key[key_dexes][1:] != dec_key[key_dexes][:-1])
 
-        for iobs, obs in enumerate(obs_list):
-            group_dex = -1
+        group_dex = np.empty(n_obs, dtype=int)
+        group_dex[key_dexes] = np.cumsum(is_new_group) - 1
+        n_groups = group_dex.max() + 1
 
-            for ix, obs_g in enumerate(obs_groups):
-                dd = haversine(obs._pointingRA, obs._pointingDec,
-                               obs_list[obs_g[0]]._pointingRA, obs_list[obs_g[0]]._pointingDec)
-                if dd < tol:
-                    group_dex = ix
-                    break
+        # number the groups in the order in which they first appear in obs_list
+        first_appearance = np.zeros(n_groups, dtype=int) + n_obs
+        np.minimum.at(first_appearance, group_dex, np.arange(n_obs))
+        group_rank = np.empty(n_groups, dtype=int)
+        group_rank[np.argsort(first_appearance)] = np.arange(n_groups)
+        group_dex = group_rank[group_dex]
 
-            if group_dex == -1:
-                obs_groups.append([iobs])
-                mjd_groups.append([obs_list[iobs].mjd.TAI])
-            else:
-                obs_groups[group_dex].append(iobs)
-                mjd_groups[group_dex].append(obs_list[iobs].mjd.TAI)
-
-        # rearrange each group of ObservationMetaDatas so that they
-        # appear in chronological order by MJD
-        obs_groups_out = []
-        for ix, (grp, mjd) in enumerate(zip(obs_groups, mjd_groups)):
-            oo = np.array(grp)
-            mm = np.array(mjd)
-            dexes = np.argsort(mm)
-            obs_groups_out.append([obs_list[ii] for ii in oo[dexes]])
+        # sort by group and, within each group, chronologically by MJD
+        sorted_dexes = np.lexsort((mjd_arr, group_dex))
+        group_bounds = np.cumsum(np.bincount(group_dex, minlength=n_groups))[:-1]
+
+        obs_groups_out = [[obs_list[ii] for ii in grp]
+                          for grp in np.split(sorted_dexes, group_bounds)]
+
+        self.metrics.record('pointings', n_visits=n_obs, n_groups=n_groups,
+                            time=time.time()-t_start)
 
         return obs_groups_out
 
@@ -370,15 +682,26 @@ class LightCurveGenerator(object):
         else:
             master_constraint = None
 
-        cat = self._lightCurveCatalogClass(self._catalogdb, obs_metadata=grp[0])
+        if isinstance(grp, _SkyTile):
+            cat = self._lightCurveCatalogClass(self._catalogdb, obs_metadata=grp.query_obs)
+        else:
+            cat = self._lightCurveCatalogClass(self._catalogdb, obs_metadata=grp[0])
 
         cat.db_required_columns()
 
-        query_result = cat.db_obj.query_columns(colnames=cat._active_columns,
-                                                obs_metadata=cat.obs_metadata,
-                                                constraint=master_constraint,
-                                                limit=lc_per_field,
-                                                chunk_size=chunk_size)
+        if self.query_cache is not None:
+            query_result = self.query_cache.query_columns(cat.db_obj,
+                                                          colnames=cat._active_columns,
+                                                          obs_metadata=cat.obs_metadata,
+                                                          constraint=master_constraint,
+                                                          limit=lc_per_field,
+                                                          chunk_size=chunk_size)
+        else:
+            query_result = cat.db_obj.query_columns(colnames=cat._active_columns,
+                                                    obs_metadata=cat.obs_metadata,
+                                                    constraint=master_constraint,
+                                                    limit=lc_per_field,
+                                                    chunk_size=chunk_size)
 
         return query_result
 
@@ -410,8 +733,8 @@ class LightCurveGenerator(object):
         Output
         ------
         This method does not output anything.  It adds light curves to the
-        instance member variables self.mjd_dict, self.bright_dict, self.sig_dict,
-        and self.truth_dict.
+        LightCurveAccumulator self._accumulator and truth information to the
+        instance member variable self.truth_dict.
         """
 
         global _sed_cache
@@ -423,8 +746,12 @@ class LightCurveGenerator(object):
 
         row_ct = 0
 
+        timer = StageTimer()
         for raw_chunk in query_result:
+            timer.lap('fetch')
             chunk = self._filter_chunk(raw_chunk)
+            chunk, coverage = self._restrict_to_tile(cat_dict[grp[0].bandpass], chunk, grp)
+            timer.lap('filter')
             if lc_per_field is not None:
 
                 if row_ct >= lc_per_field:
@@ -432,12 +759,31 @@ class LightCurveGenerator(object):
 
                 if row_ct + len(chunk) > lc_per_field:
                     chunk = chunk[:lc_per_field-row_ct]
+                    if coverage is not None:
+                        coverage = coverage[:, :lc_per_field-row_ct]
                     row_ct += len(chunk)
                 else:
                     row_ct += len(chunk)
 
             if chunk is not None:
+                # the objects covered by each footprint in a _SkyTile; visits that
+                # share a footprint share the same array, so the photometry mixins
+                # can reuse its SedList
+                footprint_chunks = {}
+
                 for ix, obs in enumerate(grp):
+
+                    # only photometer the objects this visit actually covers
+                    if coverage is None:
+                        visit_chunk = chunk
+                    else:
+                        i_footprint = grp.visit_pointing[ix]
+                        if i_footprint not in footprint_chunks:
+                            footprint_chunks[i_footprint] = chunk[coverage[i_footprint]]
+                        visit_chunk = footprint_chunks[i_footprint]
+                        if len(visit_chunk) == 0:
+                            continue
+
                     cat = cat_dict[obs.bandpass]
                     cat.obs_metadata = obs
                     if ix in local_gamma_cache:
@@ -445,36 +791,353 @@ class LightCurveGenerator(object):
                     else:
                         cat._gamma_cache = {}
 
+                    id_list = []
+                    bright_list = []
+                    sig_list = []
                     for star_obj in \
-                        cat.iter_catalog(query_cache=[chunk]):
+                        cat.iter_catalog(query_cache=[visit_chunk]):
 
-                        if not np.isnan(star_obj[3]) and not np.isinf(star_obj[3]):
+                        if np.isfinite(star_obj[3]):
 
                             if star_obj[0] not in self.truth_dict:
                                 self.truth_dict[star_obj[0]] = star_obj[5]
 
-                            if star_obj[0] not in self.mjd_dict:
-                                self.mjd_dict[star_obj[0]] = {}
-                                self.bright_dict[star_obj[0]] = {}
-                                self.sig_dict[star_obj[0]] = {}
+                            id_list.append(star_obj[0])
+                            bright_list.append(star_obj[3])
+                            sig_list.append(star_obj[4])
 
-                            bp = cat.obs_metadata.bandpass
-                            if bp not in self.mjd_dict[star_obj[0]]:
-                                self.mjd_dict[star_obj[0]][bp] = []
-                                self.bright_dict[star_obj[0]][bp] = []
-                                self.sig_dict[star_obj[0]][bp] = []
+                    # iter_catalog() calculates the variability, photometry,
+                    # and uncertainties together
+                    timer.lap('catalog')
 
-                            self.mjd_dict[star_obj[0]][bp].append(cat.obs_metadata.mjd.TAI)
-                            self.bright_dict[star_obj[0]][bp].append(star_obj[3])
-                            self.sig_dict[star_obj[0]][bp].append(star_obj[4])
+                    self._accumulator.append(np.array(id_list, dtype=np.int64),
+                                             cat.obs_metadata.bandpass,
+                                             cat.obs_metadata.mjd.TAI,
+                                             np.array(bright_list),
+                                             np.array(sig_list))
 
                     if ix not in local_gamma_cache:
                         local_gamma_cache[ix] = cat._gamma_cache
 
+                    timer.lap('accumulation')
+
             _sed_cache = {}  # before moving on to the next chunk of objects
 
+            self._record_chunk(chunk, timer)
+
+    def _record_chunk(self, chunk, timer):
+        """
+        Report the number of rows in chunk and the time spent on it (as
+        accumulated by the StageTimer timer, which is then reset) to
+        self.metrics.
+        """
+        n_rows = 0 if chunk is None else len(chunk)
+        self._field_rows += n_rows
+        self.metrics.record('chunk', field=self._field_id, rows=n_rows, **timer.split())
+
+    def _build_catalogs(self, pointings):
+        """
+        Return a dict of InstanceCatalogs keyed on bandpass name, one
+        for each bandpass represented in pointings (a 2-D list of
+        ObservationMetaData).
+        """
+        cat_dict = {}
+        for grp in pointings:
+            for obs in grp:
+                if obs.bandpass not in cat_dict:
+                    cat_dict[obs.bandpass] = self._lightCurveCatalogClass(self._catalogdb, obs_metadata=obs)
+        return cat_dict
+
+    def _light_curves_from_group(self, cat_dict, grp, chunk_size, lc_per_field=None, constraint=None):
+        """
+        Query the database for the objects in one field and add their light curves
+        to self._accumulator and their truth information to self.truth_dict.
+
+        Input parameters:
+        -----------------
+        cat_dict is a dict of InstanceCatalogs keyed on bandpass name (see
+        _light_curves_from_query())
+
+        grp is a list of ObservationMetaData that all point to the same field
+        on the sky, sorted by MJD.
+
+        chunk_size, lc_per_field, and constraint are passed through from
+        light_curves_from_pointings().
+        """
+        self._mjd_min = grp[0].mjd.TAI
+        self._mjd_max = grp[-1].mjd.TAI
+
+        t_before_query = time.time()
+        query_result = self._get_query_from_group(grp, chunk_size, lc_per_field=lc_per_field,
+                                                  constraint=constraint)
+
+        self.metrics.record('query', field=self._field_id, latency=time.time()-t_before_query)
+
+        if self.prefetch_depth > 0:
+            query_result = ChunkPrefetcher(query_result, depth=self.prefetch_depth)
+
+        try:
+            self._light_curves_from_query(cat_dict, query_result, grp, lc_per_field=lc_per_field)
+        finally:
+            # stop reading ahead if _light_curves_from_query returned early
+            # (e.g. because lc_per_field was reached) or raised
+            if self.prefetch_depth > 0:
+                query_result.close()
+
+    def _light_curves_from_field(self, cat_dict, grp, chunk_size, lc_per_field=None,
+                                 constraint=None, max_retries=0, field_id=None):
+        """
+        Generate the light curves for one field, retrying the whole field if
+        it fails.
+
+        Input parameters:
+        -----------------
+        cat_dict, grp, chunk_size, lc_per_field, and constraint are as in
+        _light_curves_from_group()
+
+        max_retries is the number of times to retry the field after an
+        exception is raised.
+
+        field_id is the index of the field, used to label the events
+        reported to self.metrics.
+
+        Output
+        ------
+        A LightCurveAccumulator containing the field's light curves (or None
+        if every attempt failed)
+
+        A dict of truth information for the objects in the field (or, if
+        every attempt failed, the formatted traceback of the last failure)
+
+        The time in seconds spent on the field
+
+        The number of attempts made
+        """
+        t_start = time.time()
+        self._field_id = field_id
+        n_attempts = 0
+        while True:
+            n_attempts += 1
+
+            # each attempt starts from scratch so that a failure partway
+            # through the field does not leave partial light curves behind
+            self._accumulator = LightCurveAccumulator()
+            self.truth_dict = {}
+            self._field_rows = 0
+            try:
+                self._light_curves_from_group(cat_dict, grp, chunk_size,
+                                              lc_per_field=lc_per_field,
+                                              constraint=constraint)
+                break
+            except Exception:
+                if n_attempts > max_retries:
+                    self._record_field(grp, time.time()-t_start, n_attempts, False)
+                    return None, traceback.format_exc(), time.time()-t_start, n_attempts
+
+        self._record_field(grp, time.time()-t_start, n_attempts, True)
+        return self._accumulator, self.truth_dict, time.time()-t_start, n_attempts
+
+    def _record_field(self, grp, field_time, n_attempts, succeeded):
+        """
+        Report a finished field to self.metrics
+        """
+        self.metrics.record('field', field=self._field_id, n_visits=len(grp),
+                            rows=self._field_rows, time=field_time, attempts=n_attempts,
+                            succeeded=succeeded, peak_rss_mb=peak_rss_mb())
+
+    def _field_results(self, pointings, chunk_size, lc_per_field, constraint,
+                       n_workers, max_retries, field_ids=None):
+        """
+        Iterate over the output of _light_curves_from_field() for each group of
+        pointings, in the order in which the groups appear in pointings.
+
+        field_ids is a list of the indices used to label each group of pointings
+        in self.metrics (defaults to its position in pointings).
+
+        If n_workers > 1, the fields are distributed over a pool of n_workers
+        processes.  The processes are forked from this one, so each worker
+        gets its own copy of this LightCurveGenerator and builds its own set
+        of InstanceCatalogs.  The copy of the catalog database's connection
+        inherited from this process is replaced by a new connection before
+        the worker queries anything (see _reconnect_in_worker()).
+        """
+        if field_ids is None:
+            field_ids = list(range(len(pointings)))
+
+        if n_workers == 1 or len(pointings) < 2:
+            cat_dict = self._build_catalogs(pointings)
+            for field_id, grp in zip(field_ids, pointings):
+                yield self._light_curves_from_field(cat_dict, grp, chunk_size,
+                                                    lc_per_field=lc_per_field,
+                                                    constraint=constraint,
+                                                    max_retries=max_retries,
+                                                    field_id=field_id)
+            return
+
+        context = multiprocessing.get_context('fork')
+        abandoned = context.Event()
+        pool = context.Pool(processes=min(n_workers, len(pointings)),
+                            initializer=_light_curve_worker_init,
+                            initargs=(self, pointings, field_ids, chunk_size, lc_per_field,
+                                      constraint, max_retries, abandoned))
+        try:
+            # imap returns the results in the order of the groups, no matter
+            # which worker finishes first, so the merge is deterministic
+            for result in pool.imap(_light_curve_worker, range(len(pointings))):
+                yield result
+        finally:
+            # If the caller stopped early (e.g. because a group failed), the
+            # workers skip the groups they have not started.  The pool is not
+            # terminate()d: killing a worker while it holds the lock on the
+            # result queue deadlocks the pool's task handler.
+            abandoned.set()
+            pool.close()
+            pool.join()
+
+    def _check_lc_per_field(self, pointings, lc_per_field):
+        """
+        Raise a RuntimeError if lc_per_field is set and pointings contains
+        sky tiles (see tile_pointings()).  The limit would apply to each tile
+        rather than to each field of view, so the light curves would silently
+        differ from those generated from the untiled pointings.
+        """
+        if lc_per_field is not None and any(isinstance(grp, _SkyTile) for grp in pointings):
+            raise RuntimeError("lc_per_field cannot be used with the output of "
+                               "tile_pointings(); pass the untiled pointings instead")
+
+    def _completed_fields(self, pointings, chunk_size, lc_per_field, constraint,
+                          n_workers, max_retries, skip=()):
+        """
+        Iterate over (group index, LightCurveAccumulator, truth dict) for each
+        group of pointings, in the order in which the groups appear in pointings.
+        The time spent on each group and the number of attempts it took are
+        recorded in self.field_times and self.field_attempts.  A RuntimeError
+        is raised if any group fails after max_retries retries.
+
+        skip is a collection of the indices of groups that have already been
+        completed and should not be generated again (their field_times and
+        field_attempts are left as zero).
+        """
+        self.field_times = np.zeros(len(pointings), dtype=float)
+        self.field_attempts = np.zeros(len(pointings), dtype=int)
+
+        todo = [i_grp for i_grp in range(len(pointings)) if i_grp not in skip]
+
+        for i_todo, (field_accumulator, field_truth, field_time, n_attempts) in \
+            enumerate(self._field_results([pointings[i_grp] for i_grp in todo],
+                                          chunk_size, lc_per_field, constraint,
+                                          n_workers, max_retries, field_ids=todo)):
+
+            i_grp = todo[i_todo]
+
+            self.field_times[i_grp] = field_time
+            self.field_attempts[i_grp] = n_attempts
+
+            if field_accumulator is None:
+                raise RuntimeError("Generating light curves for pointing group %d "
+                                   "failed after %d attempts:\n%s" % (i_grp, n_attempts, field_truth))
+
+            yield i_grp, field_accumulator, field_truth
+
+    def write_light_curves(self, pointings, dirname, chunk_size=100000,
+                           lc_per_field=None, constraint=None,
+                           n_workers=1, max_retries=0):
+        """
+        Generate light curves for all of the objects in a particular region
+        of sky and write them to disk one group of pointings at a time, so
+        that only one field's worth of light curves is held in memory.
+
+        Input parameters:
+        -----------------
+        pointings, chunk_size, lc_per_field, constraint, n_workers, and
+        max_retries are as in light_curves_from_pointings()
+
+        dirname is the directory to which the light curves will be written
+        (see LightCurveWriter).  Each group of pointings is recorded in dirname
+        as soon as it is finished, so dirname doubles as a checkpoint: if this
+        method is called again with the same arguments (e.g. after the first
+        call crashed or was preempted), the groups already in dirname are
+        skipped and only the remaining groups are generated.  A RuntimeError
+        is raised if dirname contains light curves from a different run.
+
+        Output:
+        -------
+        A LightCurveReader for the light curves written to dirname.  The
+        light curves it returns are identical to those in the output_dict
+        returned by light_curves_from_pointings(); reader.truth(uniqueId)
+        returns the truth information.
+
+        The time spent writing each group to dirname is stored in the numpy
+        array self.checkpoint_times.
+        """
+        self._check_lc_per_field(pointings, lc_per_field)
+
+        t_start = time.time()
+
+        writer = LightCurveWriter(dirname, brightness_name=self._brightness_name,
+                                  run_info=self._run_info(pointings, lc_per_field, constraint))
+
+        completed = set(writer.batches)
+        self.metrics.record('checkpoint', dirname=dirname, n_completed=len(completed),
+                            n_fields=len(pointings))
+
+        self.checkpoint_times = np.zeros(len(pointings), dtype=float)
+
+        for i_grp, field_accumulator, field_truth in \
+            self._completed_fields(pointings, chunk_size, lc_per_field, constraint,
+                                   n_workers, max_retries, skip=completed):
+
+            t_before_write = time.time()
+            writer.write_batch(field_accumulator, field_truth, batch_id=i_grp)
+            self.checkpoint_times[i_grp] = time.time() - t_before_write
+            self.metrics.record('write', field=i_grp, time=self.checkpoint_times[i_grp])
+
+        self.metrics.record('run', method='write_light_curves', n_fields=len(pointings),
+                            time=time.time()-t_start, peak_rss_mb=peak_rss_mb())
+        return LightCurveReader(dirname)
+
+    def _run_info(self, pointings, lc_per_field, constraint):
+        """
+        Return a dict identifying a light curve run (the generator and its
+        settings, the catalog database, the pointings and their m5, and the
+        constraints on the query) so that a directory written by
+        write_light_curves() is only ever resumed by the same run.
+        """
+        pointing_hash = hashlib.md5()
+        m5_hash = hashlib.md5()
+        for grp in pointings:
+            for obs in grp:
+                pointing_hash.update(('%s %.10f %.12f %.12f;' %
+                                      (obs.bandpass, obs.mjd.TAI,
+                                       obs._pointingRA, obs._pointingDec)).encode('utf-8'))
+                m5_hash.update(('%.6f;' % obs.m5[obs.bandpass]).encode('utf-8'))
+            pointing_hash.update(b'|')
+            m5_hash.update(b'|')
+
+        catalogdb_info = dict((attr, str(getattr(self._catalogdb, attr, None)))
+                              for attr in ('driver', 'host', 'port', 'database', 'tableid'))
+        catalogdb_info['class'] = self._catalogdb.__class__.__name__
+
+        return {'generator': self.__class__.__name__,
+                'settings': self._run_settings(),
+                'catalogdb': catalogdb_info,
+                'pointings': pointing_hash.hexdigest(),
+                'm5': m5_hash.hexdigest(),
+                'lc_per_field': lc_per_field,
+                'constraint': constraint,
+                'default_constraint': self._constraint}
+
+    def _run_settings(self):
+        """
+        Return a json-serializable dict of the settings of this generator
+        which change the light curves it produces (see _run_info()).
+        Subclasses with such settings override this.
+        """
+        return {}
+
     def light_curves_from_pointings(self, pointings, chunk_size=100000,
-                                    lc_per_field=None, constraint=None):
+                                    lc_per_field=None, constraint=None,
+                                    n_workers=1, max_retries=0, checkpoint_dir=None):
         """
         Generate light curves for all of the objects in a particular region
         of sky in a particular bandpass.
@@ -494,12 +1157,30 @@ class LightCurveGenerator(object):
 
         lc_per_field (optional; default None) is an int specifying the maximum
         number of light curves to return per field of view (None implies no
-        constraint).
+        constraint).  It cannot be used with the output of tile_pointings().
 
         constraint is a string containing a SQL constraint to be applied to
         all database queries associated with generating these light curves
         (optional).
 
+        n_workers (optional; default 1) is the number of processes over which
+        to distribute the groups of pointings.  Each group is processed
+        independently and the results are merged in the order of pointings,
+        so the output does not depend on n_workers.
+
+        max_retries (optional; default 0) is the number of times a group
+        of pointings will be retried if generating its light curves raises
+        an exception.  If a group still fails, a RuntimeError is raised.
+        The time spent on each group and the number of attempts it took
+        are stored in the numpy arrays self.field_times and self.field_attempts.
+
+        checkpoint_dir (optional; default None) is a directory in which each
+        group of pointings is recorded as soon as it is finished (see
+        write_light_curves()).  If this method is interrupted, calling it again
+        with the same arguments will skip the groups recorded in checkpoint_dir.
+        Note: truth information read back from checkpoint_dir has been through
+        json, so tuples become lists and numpy scalars become python scalars.
+
         Output:
         -------
         A dict of light curves.  The dict is keyed on the object's uniqueId.
@@ -526,55 +1207,42 @@ class LightCurveGenerator(object):
         # First get the list of ObservationMetaData objects corresponding
         # to the OpSim pointings in the region and bandpass of interest
 
-        t_start = time.time()
+        self._check_lc_per_field(pointings, lc_per_field)
 
-        self.mjd_dict = {}
-        self.bright_dict = {}
-        self.sig_dict = {}
-        self.band_dict = {}
-        self.truth_dict = {}
+        t_start = time.time()
 
-        cat_dict = {}
-        for grp in pointings:
-            for obs in grp:
-                if obs.bandpass not in cat_dict:
-                    cat_dict[obs.bandpass] = self._lightCurveCatalogClass(self._catalogdb, obs_metadata=obs)
+        accumulator = LightCurveAccumulator()
+        truth_dict = {}
 
         # Loop over the list of groups ObservationMetaData objects,
         # querying the database and generating light curves.
-        for grp in pointings:
-
-            self._mjd_min = grp[0].mjd.TAI
-            self._mjd_max = grp[-1].mjd.TAI
-
-            print('starting query')
-
-            t_before_query = time.time()
-            query_result = self._get_query_from_group(grp, chunk_size, lc_per_field=lc_per_field,
-                                                      constraint=constraint)
-
-            print('query took ', time.time()-t_before_query)
-
-            self._light_curves_from_query(cat_dict, query_result, grp, lc_per_field=lc_per_field)
+        if checkpoint_dir is None:
+            field_iterator = self._completed_fields(pointings, chunk_size, lc_per_field, constraint,
+                                                    n_workers, max_retries)
+        else:
+            reader = self.write_light_curves(pointings, checkpoint_dir, chunk_size=chunk_size,
+                                             lc_per_field=lc_per_field, constraint=constraint,
+                                             n_workers=n_workers, max_retries=max_retries)
+            field_iterator = ((i_grp,) + reader.read_batch(i_grp) for i_grp in range(len(pointings)))
 
-        output_dict = {}
-        for unique_id in self.mjd_dict:
-            output_dict[unique_id] = {}
-            for bp in self.mjd_dict[unique_id]:
+        for i_grp, field_accumulator, field_truth in field_iterator:
 
-                output_dict[unique_id][bp] = {}
+            accumulator.extend(field_accumulator)
+            for unique_id in field_truth:
+                if unique_id not in truth_dict:
+                    truth_dict[unique_id] = field_truth[unique_id]
 
-                # we must sort the MJDs because, if an object appears in multiple
-                # spatial pointings, its observations will be concatenated out of order
-                mjd_arr = np.array(self.mjd_dict[unique_id][bp])
-                mjd_dexes = np.argsort(mjd_arr)
+        self._accumulator = accumulator
+        self.truth_dict = truth_dict
 
-                output_dict[unique_id][bp]['mjd'] = mjd_arr[mjd_dexes]
-                output_dict[unique_id][bp][self._brightness_name] = \
-                    np.array(self.bright_dict[unique_id][bp])[mjd_dexes]
-                output_dict[unique_id][bp]['error'] = np.array(self.sig_dict[unique_id][bp])[mjd_dexes]
+        # The accumulator sorts all of the measurements by (uniqueId, bandpass, MJD)
+        # in one pass.  This is necessary because, if an object appears in multiple
+        # spatial pointings, its observations will have been appended out of order.
+        # The light curves in output_dict are views into the sorted columns.
+        output_dict = self._accumulator.to_dict(brightness_name=self._brightness_name)
 
-        print('light curves took %e seconds to generate' % (time.time()-t_start))
+        self.metrics.record('run', method='light_curves_from_pointings', n_fields=len(pointings),
+                            time=time.time()-t_start, peak_rss_mb=peak_rss_mb())
         return output_dict, self.truth_dict
 
 
@@ -588,9 +1256,40 @@ class FastLightCurveGenerator(LightCurveGenerator):
     where quiescent_mag does not change as a function of time.
 
     It will re-implement the _light_curves_from_query() method so that quiescent_mag
-    is only calculated once, and delta_mag(t) is calculated in a vectorized fashion.
+    is only calculated once, delta_mag(t) is calculated for all epochs in one call,
+    and the photometric uncertainties are calculated as one (visits x objects) array.
+    When the field is a sky tile (see tile_pointings()), there is one such array per
+    footprint, holding only that footprint's visits and the objects it covers.
     """
 
+    def _uncertainty_grid(self, cat, bp, mag_grid, m5_arr, gamma_arr):
+        """
+        Calculate the photometric uncertainties on a grid of magnitudes.
+
+        Input parameters:
+        -----------------
+        cat is the InstanceCatalog associated with the bandpass bp
+
+        bp is the name of the bandpass (i.e. 'u', 'g', 'r', etc.)
+
+        mag_grid is a 2-D numpy array of magnitudes in which rows correspond
+        to visits and columns correspond to astronomical objects
+
+        m5_arr is a numpy array of the five sigma limiting magnitudes of the visits
+
+        gamma_arr is a numpy array of the photometric gamma values of the visits
+        (see equation 5 of the LSST overview paper arXiv:0805.2366)
+
+        Output
+        ------
+        A 2-D numpy array of magnitude uncertainties with the same shape
+        as mag_grid.
+        """
+        sigma_grid, gamma = calcMagError_m5(mag_grid, cat.lsstBandpassDict[bp],
+                                            m5_arr[:, None], cat.photParams,
+                                            gamma=gamma_arr[:, None])
+        return sigma_grid
+
     def _light_curves_from_query(self, cat_dict, query_result, grp, lc_per_field=None):
         """
         Read in an iterator over database rows and return light curves for
@@ -619,19 +1318,12 @@ class FastLightCurveGenerator(LightCurveGenerator):
         Output
         ------
         This method does not output anything.  It adds light curves to the
-        instance member variables self.mjd_dict, self.bright_dict, self.sig_dict,
-        and self.truth_dict.
+        LightCurveAccumulator self._accumulator and truth information to the
+        instance member variable self.truth_dict.
         """
 
-        print('using fast light curve generator')
-
         global _sed_cache
 
-        # local_gamma_cache will cache the InstanceCatalog._gamma_cache
-        # values used by the photometry mixins to efficiently calculate
-        # photometric uncertainties in each catalog.
-        local_gamma_cache = {}
-
         row_ct = 0
 
         # assemble dicts needed for data precalculation
@@ -640,28 +1332,40 @@ class FastLightCurveGenerator(LightCurveGenerator):
         #
         # mjd_arr_dict is a dict of all of the mjd values needed per bandpass
         #
-        # time_lookup_dict is a dict of dicts; for each bandpass it will
-        # provide a dict that allows you to convert mjd to index in the
-        # mjd_arr_dict[bp] array.
+        # m5_arr_dict is a dict of the m5 values of those same visits
+        #
+        # gamma_arr_dict will be a dict of the photometric gamma values of
+        # those visits (it is filled in once we have a catalog with a
+        # BandpassDict loaded)
+        #
+        # visit_dex_dict is a dict of the indices in grp of those visits
         quiescent_obs_dict = {}
         mjd_arr_dict = {}
-        time_lookup_dict = {}
-        for obs in grp:
+        m5_arr_dict = {}
+        gamma_arr_dict = {}
+        visit_dex_dict = {}
+        for ix, obs in enumerate(grp):
             bp = obs.bandpass
             if bp not in quiescent_obs_dict:
                 quiescent_obs_dict[bp] = obs
-            if bp not in mjd_arr_dict:
                 mjd_arr_dict[bp] = []
+                m5_arr_dict[bp] = []
+                visit_dex_dict[bp] = []
             mjd_arr_dict[bp].append(obs.mjd.TAI)
-            if bp not in time_lookup_dict:
-                time_lookup_dict[bp] = {}
-            time_lookup_dict[bp][obs.mjd.TAI] = len(mjd_arr_dict[obs.bandpass])-1
+            m5_arr_dict[bp].append(obs.m5[bp])
+            visit_dex_dict[bp].append(ix)
 
         for bp in mjd_arr_dict:
             mjd_arr_dict[bp] = np.array(mjd_arr_dict[bp])
+            m5_arr_dict[bp] = np.array(m5_arr_dict[bp])
+            visit_dex_dict[bp] = np.array(visit_dex_dict[bp], dtype=int)
 
+        timer = StageTimer()
         for raw_chunk in query_result:
+            timer.lap('fetch')
             chunk = self._filter_chunk(raw_chunk)
+            chunk, coverage = self._restrict_to_tile(cat_dict[grp[0].bandpass], chunk, grp)
+            timer.lap('filter')
             if lc_per_field is not None:
 
                 if row_ct >= lc_per_field:
@@ -669,98 +1373,79 @@ class FastLightCurveGenerator(LightCurveGenerator):
 
                 if row_ct + len(chunk) > lc_per_field:
                     chunk = chunk[:lc_per_field-row_ct]
+                    if coverage is not None:
+                        coverage = coverage[:, :lc_per_field-row_ct]
                     row_ct += len(chunk)
                 else:
                     row_ct += len(chunk)
 
             if chunk is not None:
-                quiescent_mags = {}
-                d_mags = {}
-                # pre-calculate quiescent magnitudes
-                # and delta magnitude arrays
                 for bp in quiescent_obs_dict:
                     cat = cat_dict[bp]
                     cat.obs_metadata = quiescent_obs_dict[bp]
-                    local_quiescent_mags = []
-                    for star_obj in cat.iter_catalog(query_cache=[chunk]):
-                        local_quiescent_mags.append(star_obj[6])
-                    quiescent_mags[bp] = np.array(local_quiescent_mags)
                     if self.delta_name_mapper(bp) not in cat._actually_calculated_columns:
                         cat._actually_calculated_columns.append(self.delta_name_mapper(bp))
-                    varparamstr = cat.column_by_name('varParamStr')
-                    temp_d_mags = cat.applyVariability(varparamstr, mjd_arr_dict[bp])
-                    d_mags[bp] = temp_d_mags[{'u':0, 'g':1, 'r':2, 'i':3, 'z':4, 'y':5}[bp]].transpose()
 
-                for ix, obs in enumerate(grp):
-                    bp = obs.bandpass
-                    cat = cat_dict[bp]
-                    cat.obs_metadata = obs
-                    time_dex = time_lookup_dict[bp][obs.mjd.TAI]
-
-                    # build up a column_cache of the pre-calculated
-                    # magnitudes from above that can be passed into
-                    # our catalog iterators so that the catalogs will
-                    # not spend time computing things that have already
-                    # been calculated
-                    local_column_cache = {}
-                    delta_name = self.delta_name_mapper(bp)
-                    total_name = self.total_name_mapper(bp)
-
-                    if delta_name in cat._compound_column_names:
-                        compound_key = None
-                        for key in cat._column_cache:
-                            if isinstance(cat._column_cache[key], OrderedDict):
-                                if delta_name in cat._column_cache[key]:
-                                    compound_key = key
-                                    break
-                        local_column_cache[compound_key] = OrderedDict([(delta_name, d_mags[bp][time_dex])])
-                    else:
-                        local_column_cache[delta_name] = d_mags[bp][time_dex]
-
-                    if total_name in cat._compound_column_names:
-                        compound_key = None
-                        for key in cat._column_cache:
-                            if isinstance(cat._column_cache[key], OrderedDict):
-                                if total_name in cat._column_cache[key]:
-                                    compound_key = key
-                                    break
-                        local_column_cache[compound_key] = OrderedDict([(total_name, quiescent_mags[bp]+d_mags[bp][time_dex])])
-                    else:
-                        local_column_cache[total_name] = quiescent_mags[bp] + d_mags[bp][time_dex]
+                    if bp not in gamma_arr_dict:
+                        gamma_arr_dict[bp] = np.array([calcGamma(cat.lsstBandpassDict[bp], m5,
+                                                                 photParams=cat.photParams)
+                                                       for m5 in m5_arr_dict[bp]])
 
-                    if ix in local_gamma_cache:
-                        cat._gamma_cache = local_gamma_cache[ix]
+                    # in a _SkyTile, only evaluate each footprint's visits
+                    # on the objects that footprint actually covers
+                    if coverage is None:
+                        visit_groups = [(np.ones(len(mjd_arr_dict[bp]), dtype=bool), chunk)]
                     else:
-                        cat._gamma_cache = {}
+                        bp_footprints = grp.visit_pointing[visit_dex_dict[bp]]
+                        visit_groups = [(bp_footprints == i_footprint, chunk[coverage[i_footprint]])
+                                        for i_footprint in np.unique(bp_footprints)]
 
-                    for star_obj in \
-                        cat.iter_catalog(query_cache=[chunk], column_cache=local_column_cache):
+                    for visit_mask, visit_chunk in visit_groups:
+                        if len(visit_chunk) == 0:
+                            continue
 
-                        if not np.isnan(star_obj[3]) and not np.isinf(star_obj[3]):
+                        mjd_arr = mjd_arr_dict[bp][visit_mask]
 
-                            if star_obj[0] not in self.truth_dict:
-                                self.truth_dict[star_obj[0]] = star_obj[5]
+                        # calculate the quiescent magnitudes once per footprint
+                        cat._set_current_chunk(visit_chunk)
+                        id_arr = cat.column_by_name('uniqueId')
+                        truth_arr = cat.column_by_name('truthInfo')
+                        quiescent_mags = cat.column_by_name('quiescent_lightCurveMag')
+                        timer.lap('photometry')
 
-                            if star_obj[0] not in self.mjd_dict:
-                                self.mjd_dict[star_obj[0]] = {}
-                                self.bright_dict[star_obj[0]] = {}
-                                self.sig_dict[star_obj[0]] = {}
+                        # calculate the delta magnitudes for all of its epochs at once
+                        varparamstr = cat.column_by_name('varParamStr')
+                        temp_d_mags = cat.applyVariability(varparamstr, mjd_arr)
+                        d_mags = temp_d_mags[{'u':0, 'g':1, 'r':2, 'i':3, 'z':4, 'y':5}[bp]].transpose()
 
-                            bp = cat.obs_metadata.bandpass
-                            if bp not in self.mjd_dict[star_obj[0]]:
-                                self.mjd_dict[star_obj[0]][bp] = []
-                                self.bright_dict[star_obj[0]][bp] = []
-                                self.sig_dict[star_obj[0]][bp] = []
+                        # rows are visits; columns are objects
+                        mag_grid = quiescent_mags + d_mags
+                        timer.lap('variability')
 
-                            self.mjd_dict[star_obj[0]][bp].append(cat.obs_metadata.mjd.TAI)
-                            self.bright_dict[star_obj[0]][bp].append(star_obj[3])
-                            self.sig_dict[star_obj[0]][bp].append(star_obj[4])
+                        sigma_grid = self._uncertainty_grid(cat, bp, mag_grid,
+                                                            m5_arr_dict[bp][visit_mask],
+                                                            gamma_arr_dict[bp][visit_mask])
+                        timer.lap('uncertainty')
 
-                    if ix not in local_gamma_cache:
-                        local_gamma_cache[ix] = cat._gamma_cache
+                        valid = np.isfinite(mag_grid)
+
+                        self._accumulator.append(np.broadcast_to(id_arr, mag_grid.shape)[valid],
+                                                 bp,
+                                                 np.broadcast_to(mjd_arr[:, None],
+                                                                 mag_grid.shape)[valid],
+                                                 mag_grid[valid],
+                                                 sigma_grid[valid])
+
+                        for ix in np.where(valid.any(axis=0))[0]:
+                            if id_arr[ix] not in self.truth_dict:
+                                self.truth_dict[id_arr[ix]] = truth_arr[ix]
+
+                        timer.lap('accumulation')
 
             _sed_cache = {}  # before moving on to the next chunk of objects
 
+            self._record_chunk(chunk, timer)
+
 
 class StellarLightCurveGenerator(LightCurveGenerator):
     """
@@ -777,6 +1462,21 @@ class StellarLightCurveGenerator(LightCurveGenerator):
 
     opsimdriver (optional; default 'sqlite') indicates the database driver to
     be used when connecting to opsimdb.
+
+    prefetch_depth (optional; default 0) is the number of chunks of catalog
+    rows to read ahead in a background thread while the current chunk is
+    being processed (see ChunkPrefetcher).  0 means no prefetching.  This
+    requires a database driver that can be read from more than one thread
+    (i.e. not sqlite).
+
+    query_cache (optional) is a QueryResultCache in which to keep the results
+    of the catalog queries, so that regenerating light curves for the same
+    fields does not have to query catalogdb again.  None means no caching.
+
+    metrics (optional) is a LightCurveMetrics hook which records the time
+    spent on each field, chunk, and stage of the light curve generation.
+    If a string is passed, the metrics are appended to the file of that name
+    as JSON lines (see JsonLinesMetrics).  None means no metrics are recorded.
     """
 
     def __init__(self, *args, **kwargs):
@@ -810,6 +1510,21 @@ class AgnLightCurveGenerator(LightCurveGenerator):
 
     opsimdriver (optional; default 'sqlite') indicates the database driver to
     be used when connecting to opsimdb.
+
+    prefetch_depth (optional; default 0) is the number of chunks of catalog
+    rows to read ahead in a background thread while the current chunk is
+    being processed (see ChunkPrefetcher).  0 means no prefetching.  This
+    requires a database driver that can be read from more than one thread
+    (i.e. not sqlite).
+
+    query_cache (optional) is a QueryResultCache in which to keep the results
+    of the catalog queries, so that regenerating light curves for the same
+    fields does not have to query catalogdb again.  None means no caching.
+
+    metrics (optional) is a LightCurveMetrics hook which records the time
+    spent on each field, chunk, and stage of the light curve generation.
+    If a string is passed, the metrics are appended to the file of that name
+    as JSON lines (see JsonLinesMetrics).  None means no metrics are recorded.
     """
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,139 @@
+from builtins import object
+import os
+import sys
+import json
+import time
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = ["LightCurveMetrics", "JsonLinesMetrics", "StageTimer", "peak_rss_mb"]
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident memory of this process in megabytes
+    (None if it cannot be determined on this platform).
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X and kilobytes on Linux
+    if sys.platform == 'darwin':
+        return max_rss/1024.0**2
+    return max_rss/1024.0
+
+
+class StageTimer(object):
+    """
+    Accumulates the wall time spent in the named stages of a piece of work.
+
+    Call lap(stage) at the end of each stage; the time since the previous
+    call to lap() (or since the timer was started or split) is added to that
+    stage.  split() returns the accumulated times and starts again.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self._t_start = time.time()
+        self._t_lap = self._t_start
+
+    def lap(self, stage):
+        now = time.time()
+        self.times[stage] = self.times.get(stage, 0.0) + now - self._t_lap
+        self._t_lap = now
+
+    def split(self):
+        """
+        Return a dict of the time spent in each stage, plus 'wall_time',
+        the total time since the timer was started or last split, and
+        reset the timer.
+        """
+        now = time.time()
+        output = dict(self.times)
+        output['wall_time'] = now - self._t_start
+        self.times = {}
+        self._t_start = now
+        self._t_lap = now
+        return output
+
+
+class LightCurveMetrics(object):
+    """
+    The base class for the metrics hooks of the LightCurveGenerator.  As the
+    generator runs, it calls record() with the name of an event and its
+    measurements as keyword arguments.  This class discards them; sub-classes
+    override record() to send them somewhere.
+
+    The events recorded by the LightCurveGenerator are
+
+    'pointings' -- get_pointings() finished (n_visits, n_groups, time)
+
+    'query' -- the catalog query for a field was started (field, latency)
+
+    'chunk' -- a chunk of database rows was processed (field, rows, wall_time
+    and the time spent in each stage: fetch, filter, and then either catalog
+    (the InstanceCatalog calculating everything at once) or some of catalog,
+    variability, photometry, and uncertainty, depending on the generator;
+    and, finally, accumulation)
+
+    'field' -- a field was finished (field, n_visits, rows, time, attempts,
+    succeeded, peak_rss_mb)
+
+    'checkpoint' -- write_light_curves() opened its output directory
+    (dirname, n_completed, n_fields)
+
+    'write' -- a field was written to disk by write_light_curves() (field, time)
+
+    'run' -- light_curves_from_pointings() or write_light_curves() finished
+    (method, n_fields, time, peak_rss_mb)
+
+    'field' is the index of the group of pointings.  If the generator uses
+    more than one process, each worker records its events through its own
+    (forked) copy of the hook, so only sinks which write to a shared
+    destination (like JsonLinesMetrics) see the events from every worker.
+    """
+
+    def record(self, event, **kwargs):
+        pass
+
+
+def _to_json(value):
+    """
+    Convert the numpy types json cannot handle
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError("%s is not JSON serializable" % str(type(value)))
+
+
+class JsonLinesMetrics(LightCurveMetrics):
+    """
+    A LightCurveMetrics hook which appends each event to a text file as one
+    line of JSON, e.g.
+
+    {"event": "chunk", "timestamp": 1496271045.2, "pid": 4242, "field": 3, "rows": 10000, ...}
+
+    'timestamp' is the unix time at which the event was recorded and 'pid' is
+    the ID of the process that recorded it.  Each event is written (and
+    flushed) as soon as it is recorded, so the file can be read while the
+    generator is running, and several processes can share the same file.
+
+    Input parameters:
+    -----------------
+    filename is the file to which the events will be appended
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def record(self, event, **kwargs):
+        row = {'event': event, 'timestamp': time.time(), 'pid': os.getpid()}
+        row.update(kwargs)
+        with open(self.filename, 'a') as output_file:
+            output_file.write(json.dumps(row, default=_to_json) + '\n')
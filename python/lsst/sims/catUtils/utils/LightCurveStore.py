@@ -0,0 +1,369 @@
+from builtins import zip
+from builtins import range
+from builtins import object
+import numpy as np
+import json
+import os
+
+from lsst.sims.catUtils.utils import LightCurveAccumulator
+
+__all__ = ["LightCurveWriter", "LightCurveReader"]
+
+# the dtype of the measurement files written by LightCurveWriter
+_measurement_dtype = np.dtype([('uniqueId', np.int64), ('band', np.int8),
+                               ('mjd', float), ('brightness', float), ('error', float)])
+
+# the dtype of the index files written by LightCurveWriter;
+# each row locates one (uniqueId, bandpass) light curve segment
+# in the corresponding measurement file
+_index_dtype = np.dtype([('uniqueId', np.int64), ('band', np.int8),
+                         ('start', np.int64), ('end', np.int64)])
+
+
+def _to_json(value):
+    """
+    Convert the numpy arrays and scalars that appear in truth information
+    into something json can serialize.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("Truth information of type %s cannot be written to json" % type(value))
+
+
+class LightCurveWriter(object):
+    """
+    This class writes light curves to a directory one batch (usually one
+    field of view) at a time, so that only one batch ever needs to be held
+    in memory.  Each batch is written as
+
+    batch_NNNNNN.npy -- a structured array of measurements sorted by
+    (uniqueId, bandpass, MJD)
+
+    batch_NNNNNN_index.npy -- a structured array giving the start and end
+    row of each (uniqueId, bandpass) light curve in the measurement file
+
+    batch_NNNNNN_truth.json -- the truth information for the objects in
+    the batch
+
+    batch_NNNNNN_truth_index.npy -- the sorted uniqueIds of the objects
+    whose truth information is in the batch
+
+    A file manifest.json records the batches written so far, the names
+    of the bandpasses, and the name of the brightness column.  It is
+    rewritten after every batch, so the directory can be read with a
+    LightCurveReader even if the process writing it dies.
+
+    Input parameters:
+    -----------------
+    dirname is the directory to which the light curves will be written.
+    It will be created if it does not exist.  If it already contains a
+    manifest, new batches are added to the existing ones.
+
+    brightness_name (optional; default 'mag') is the name of the brightness
+    column ('mag' or 'flux')
+
+    run_info (optional) is a json-serializable dict describing the run
+    producing the light curves.  It is stored in the manifest.  If dirname
+    already contains light curves written with a different run_info, a
+    RuntimeError is raised, so that batches from different runs are never
+    mixed in one directory.
+    """
+
+    def __init__(self, dirname, brightness_name='mag', run_info=None):
+        self._dirname = dirname
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+        manifest_name = os.path.join(dirname, 'manifest.json')
+        if os.path.exists(manifest_name):
+            with open(manifest_name, 'r') as input_file:
+                self._manifest = json.load(input_file)
+            if self._manifest['brightness_name'] != brightness_name:
+                raise RuntimeError("%s contains light curves in %s, not %s" %
+                                   (dirname, self._manifest['brightness_name'], brightness_name))
+            if run_info is not None and self._manifest.get('run_info') != run_info:
+                raise RuntimeError("%s contains light curves from a different run:\n%s\n"
+                                   "not\n%s" % (dirname, self._manifest.get('run_info'), run_info))
+        else:
+            self._manifest = {'brightness_name': brightness_name,
+                              'bandpasses': [],
+                              'batches': [],
+                              'run_info': run_info}
+
+    @property
+    def batches(self):
+        """
+        The list of the ids of the batches written so far.
+        """
+        return list(self._manifest['batches'])
+
+    def _write_manifest(self):
+        manifest_name = os.path.join(self._dirname, 'manifest.json')
+        # write to a temporary file and rename it, so that the manifest
+        # is never left half-written
+        tmp_name = manifest_name + '.tmp'
+        with open(tmp_name, 'w') as output_file:
+            json.dump(self._manifest, output_file)
+        os.rename(tmp_name, manifest_name)
+
+    def write_batch(self, accumulator, truth_dict, batch_id=None):
+        """
+        Write one batch of light curves.
+
+        Parameters
+        ----------
+        accumulator is the LightCurveAccumulator containing the light curves
+
+        truth_dict is a dict of truth information keyed on uniqueId
+
+        batch_id (optional) is the int identifying the batch.  Defaults to
+        the number of batches already written.
+        """
+        if batch_id is None:
+            batch_id = len(self._manifest['batches'])
+        batch_id = int(batch_id)
+        if batch_id in self._manifest['batches']:
+            raise RuntimeError("Batch %d has already been written to %s" % (batch_id, self._dirname))
+
+        columns = accumulator.columns
+        n_rows = len(columns['uniqueId'])
+
+        band_names = self._manifest['bandpasses']
+        for bp in np.unique(columns['bandpass']):
+            if str(bp) not in band_names:
+                band_names.append(str(bp))
+
+        measurements = np.zeros(n_rows, dtype=_measurement_dtype)
+        measurements['uniqueId'] = columns['uniqueId']
+        if n_rows > 0:
+            band_list, band_dexes = np.unique(columns['bandpass'], return_inverse=True)
+            code_list = np.array([band_names.index(str(bp)) for bp in band_list], dtype=np.int8)
+            measurements['band'] = code_list[band_dexes]
+        measurements['mjd'] = columns['mjd']
+        measurements['brightness'] = columns['brightness']
+        measurements['error'] = columns['error']
+
+        # the measurements are already sorted by (uniqueId, bandpass, MJD);
+        # find where each light curve begins and ends
+        boundaries = np.logical_or(measurements['uniqueId'][1:] != measurements['uniqueId'][:-1],
+                                   measurements['band'][1:] != measurements['band'][:-1])
+        starts = np.concatenate(([0], np.flatnonzero(boundaries) + 1)) if n_rows > 0 else np.array([], dtype=int)
+        ends = np.concatenate((starts[1:], [n_rows])) if n_rows > 0 else np.array([], dtype=int)
+
+        index = np.zeros(len(starts), dtype=_index_dtype)
+        index['uniqueId'] = measurements['uniqueId'][starts]
+        index['band'] = measurements['band'][starts]
+        index['start'] = starts
+        index['end'] = ends
+
+        root_name = os.path.join(self._dirname, 'batch_%06d' % batch_id)
+        np.save(root_name + '.npy', measurements)
+        np.save(root_name + '_index.npy', index)
+        with open(root_name + '_truth.json', 'w') as output_file:
+            json.dump(dict([(str(int(kk)), truth_dict[kk]) for kk in truth_dict]),
+                      output_file, default=_to_json)
+        np.save(root_name + '_truth_index.npy',
+                np.sort(np.array([int(kk) for kk in truth_dict], dtype=np.int64)))
+
+        self._manifest['batches'].append(batch_id)
+        self._write_manifest()
+
+
+class LightCurveReader(object):
+    """
+    This class reads the light curves written by a LightCurveWriter.
+    Only the (small) index files are read when the reader is created;
+    the measurements are memory-mapped and each light curve is read
+    when it is requested.
+
+    The light curves are returned in the format of the output_dict returned
+    by LightCurveGenerator.light_curves_from_pointings(), i.e.
+
+    reader.light_curve(111)['u']['mjd'] is a numpy array of the MJDs
+    of the observations of object 111 in the u band.
+
+    If an object appears in more than one batch (i.e. it was observed by
+    more than one field of view), its light curve is assembled from all
+    of them.
+
+    Input parameters:
+    -----------------
+    dirname is the directory written by the LightCurveWriter.
+    """
+
+    def __init__(self, dirname):
+        self._dirname = dirname
+        with open(os.path.join(dirname, 'manifest.json'), 'r') as input_file:
+            manifest = json.load(input_file)
+
+        self.brightness_name = manifest['brightness_name']
+        self._band_names = manifest['bandpasses']
+        self._batches = manifest['batches']
+        self._measurements = {}
+
+        # only the most recently read batch of truth information is kept
+        self._truth_batch_id = None
+        self._truth = None
+
+        index_list = []
+        batch_list = []
+        truth_id_list = []
+        truth_batch_list = []
+        for batch_id in self._batches:
+            index = np.load(self._file_name(batch_id, '_index.npy'))
+            index_list.append(index)
+            batch_list.append(np.zeros(len(index), dtype=int) + batch_id)
+            truth_ids = np.load(self._file_name(batch_id, '_truth_index.npy'))
+            truth_id_list.append(truth_ids)
+            truth_batch_list.append(np.zeros(len(truth_ids), dtype=int) + batch_id)
+
+        # the batch from which to read the truth information of each object
+        # (the first batch written that contains it)
+        if len(truth_id_list) > 0:
+            truth_ids = np.concatenate(truth_id_list)
+            truth_batches = np.concatenate(truth_batch_list)
+        else:
+            truth_ids = np.zeros(0, dtype=np.int64)
+            truth_batches = np.zeros(0, dtype=int)
+        self._truth_ids, first_dexes = np.unique(truth_ids, return_index=True)
+        self._truth_batches = truth_batches[first_dexes]
+
+        if len(index_list) > 0:
+            index = np.concatenate(index_list)
+            batch_dexes = np.concatenate(batch_list)
+        else:
+            index = np.zeros(0, dtype=_index_dtype)
+            batch_dexes = np.zeros(0, dtype=int)
+
+        # sort the segments by uniqueId; np.lexsort is stable, so
+        # the segments of each object stay in the order in which
+        # the batches were written
+        sorted_dexes = np.lexsort((index['band'], index['uniqueId']))
+        self._index = index[sorted_dexes]
+        self._index_batch = batch_dexes[sorted_dexes]
+
+        if len(self._index) > 0:
+            boundaries = np.flatnonzero(self._index['uniqueId'][1:] != self._index['uniqueId'][:-1]) + 1
+            self._obj_start = np.concatenate(([0], boundaries))
+            self._obj_end = np.concatenate((boundaries, [len(self._index)]))
+        else:
+            self._obj_start = np.zeros(0, dtype=int)
+            self._obj_end = np.zeros(0, dtype=int)
+
+        self._unique_ids = self._index['uniqueId'][self._obj_start]
+
+    def _file_name(self, batch_id, suffix):
+        return os.path.join(self._dirname, 'batch_%06d%s' % (batch_id, suffix))
+
+    def _get_measurements(self, batch_id):
+        if batch_id not in self._measurements:
+            self._measurements[batch_id] = np.load(self._file_name(batch_id, '.npy'), mmap_mode='r')
+        return self._measurements[batch_id]
+
+    def __len__(self):
+        return len(self._unique_ids)
+
+    @property
+    def unique_ids(self):
+        """
+        A sorted numpy array of the uniqueIds of all of the objects
+        with light curves.
+        """
+        return self._unique_ids
+
+    def _light_curve_from_segments(self, i_start, i_end):
+        """
+        Assemble a light curve from the segments self._index[i_start:i_end]
+        """
+        output = {}
+        for i_seg in range(i_start, i_end):
+            seg = self._index[i_seg]
+            data = self._get_measurements(self._index_batch[i_seg])[seg['start']:seg['end']]
+            bp = self._band_names[seg['band']]
+            if bp not in output:
+                output[bp] = []
+            output[bp].append(data)
+
+        for bp in output:
+            data = np.concatenate(output[bp])
+            if len(output[bp]) > 1:
+                data = data[np.argsort(data['mjd'], kind='mergesort')]
+            output[bp] = {'mjd': np.array(data['mjd']),
+                          self.brightness_name: np.array(data['brightness']),
+                          'error': np.array(data['error'])}
+        return output
+
+    def light_curve(self, unique_id):
+        """
+        Return the light curve of one object as a dict keyed on bandpass.
+        """
+        i_obj = np.searchsorted(self._unique_ids, unique_id)
+        if i_obj >= len(self._unique_ids) or self._unique_ids[i_obj] != unique_id:
+            raise KeyError(unique_id)
+        return self._light_curve_from_segments(self._obj_start[i_obj], self._obj_end[i_obj])
+
+    def __iter__(self):
+        """
+        Iterate over (uniqueId, light curve) pairs in order of uniqueId,
+        reading each light curve from disk only when it is reached.
+        """
+        for unique_id, i_start, i_end in zip(self._unique_ids, self._obj_start, self._obj_end):
+            yield int(unique_id), self._light_curve_from_segments(i_start, i_end)
+
+    @property
+    def batches(self):
+        """
+        The list of the ids of the batches in the directory, in the
+        order in which they were written.
+        """
+        return list(self._batches)
+
+    def read_batch(self, batch_id):
+        """
+        Read one batch back into memory.
+
+        Parameters
+        ----------
+        batch_id is the int identifying the batch
+
+        Returns
+        -------
+        A LightCurveAccumulator containing the batch's measurements
+
+        A dict of the batch's truth information keyed on uniqueId (note:
+        this has been round-tripped through json, so tuples will have
+        become lists and numpy scalars will have become python scalars)
+        """
+        if batch_id not in self._batches:
+            raise KeyError(batch_id)
+
+        measurements = np.load(self._file_name(batch_id, '.npy'))
+        accumulator = LightCurveAccumulator(initial_size=len(measurements))
+        if len(measurements) > 0:
+            band_names = np.array(self._band_names)
+            accumulator.append(measurements['uniqueId'], band_names[measurements['band']],
+                               measurements['mjd'], measurements['brightness'],
+                               measurements['error'])
+
+        truth_dict = dict([(int(kk), vv) for kk, vv in self._read_truth(batch_id).items()])
+
+        return accumulator, truth_dict
+
+    def _read_truth(self, batch_id):
+        with open(self._file_name(batch_id, '_truth.json'), 'r') as input_file:
+            return json.load(input_file)
+
+    def truth(self, unique_id):
+        """
+        Return the truth information for one object.
+        """
+        i_obj = np.searchsorted(self._truth_ids, unique_id)
+        if i_obj >= len(self._truth_ids) or self._truth_ids[i_obj] != unique_id:
+            raise KeyError(unique_id)
+        batch_id = self._truth_batches[i_obj]
+        if batch_id != self._truth_batch_id:
+            self._truth = self._read_truth(batch_id)
+            self._truth_batch_id = batch_id
+        return self._truth[str(int(unique_id))]
@@ -3,6 +3,9 @@ import numpy as np
 import os
 from lsst.sims.catalogs.db import DBObject
 from lsst.sims.utils import ObservationMetaData
+from lsst.sims.catUtils.utils import PointingTable, OpSimSummaryIndex
+from lsst.sims.catUtils.utils.OpSimSummaryIndex import _SkyCone, _SkyPolygon, _unit_vectors
+from lsst.sims.catUtils.utils.OpSimSummaryIndex import _pairs_within
 
 __all__ = ["ObservationMetaDataGenerator"]
 
@@ -21,11 +24,27 @@ class ObservationMetaDataGenerator(object):
     - getObservationMetaData : Obtain a list of ObservationMetaData instances
         corresponding to OpSim pointings matching the intersection of user
         specified ranges on each column in the OpSim output database.
+    - getPointingTable : Obtain the same pointings as a PointingTable, which
+        only constructs the ObservationMetaData of a pointing when it is
+        accessed.
+    - getOpSimRecordsInCone, getOpSimRecordsInPolygon : obtain the OpSim
+        records of the pointings whose fields of view overlap a cone or a
+        convex polygon on the sky (including regions containing RA=0).
+    - getVisitsCoveringPositions : obtain, for each of an array of
+        positions on the sky, the OpSim visits whose fields of view contain
+        it, as a sparse (CSR) index.
 
     The major method is ObservationMetaDataGenerator.getObservationMetaData()
     which accepts bounds on columns of the opsim summary table and returns
     a list of ObservationMetaData instantiations that fall within those
     bounds.
+
+    If constructed with inMemory=True, the Summary table is read once into
+    an OpSimSummaryIndex and all subsequent queries are answered from its
+    in-memory indexes instead of by the database.  writeSnapshot() saves
+    that table and its indexes as memory-mappable files, which
+    ObservationMetaDataGenerator(snapshot=dirname) reads instead of the
+    database.
     """
 
     def _set_seeing_column(self, input_summary_columns):
@@ -44,7 +63,8 @@ class ObservationMetaDataGenerator(object):
 
         self._user_interface_to_opsim['seeing'] = (self._seeing_column, None, float)
 
-    def __init__(self, database=None, driver='sqlite', host=None, port=None):
+    def __init__(self, database=None, driver='sqlite', host=None, port=None,
+                 inMemory=False, snapshot=None):
         """
         Constructor for the class
 
@@ -58,6 +78,16 @@ class ObservationMetaDataGenerator(object):
             hostName, None is good for a local database
         port : hostName, optional, defaults to None,
             port, None is good for a local database
+        inMemory : bool, optional, defaults to False
+            if True, read the whole Summary table into memory (as an
+            OpSimSummaryIndex) and answer queries from there, which is much
+            faster than querying the database when many queries are made
+            (e.g. one per light curve chunk)
+        snapshot : string, optional, defaults to None
+            the name of a snapshot directory written by writeSnapshot().  If
+            not None, the pointings are read (memory-mapped) from the snapshot
+            instead of from a database, and database, driver, host, port and
+            inMemory are ignored.
 
         Returns
         ------
@@ -71,6 +101,7 @@ class ObservationMetaDataGenerator(object):
         self.port = port
         self.database = database
         self._seeing_column = 'FWHMeff'
+        self.summaryIndex = None
 
         # a dict keyed on the user interface names of the OpSimdata columns
         # (i.e. the args to getObservationMetaData).  Returns a tuple that is the
@@ -130,20 +161,25 @@ class ObservationMetaDataGenerator(object):
                                          'ditheredRA': ('ditheredRA', None, float),
                                          'ditheredDec': ('ditheredDec', None, float)}
 
-        if self.database is None:
-            return
+        if snapshot is not None:
+            self.summaryIndex = OpSimSummaryIndex.from_snapshot(snapshot)
+            self._summary_columns = self.summaryIndex.metadata['summary_columns']
+        else:
+            if self.database is None:
+                return
+
+            if not os.path.exists(self.database):
+                raise RuntimeError('%s does not exist' % self.database)
 
-        if not os.path.exists(self.database):
-            raise RuntimeError('%s does not exist' % self.database)
+            self.opsimdb = DBObject(driver=self.driver, database=self.database,
+                                    host=self.host, port=self.port)
 
-        self.opsimdb = DBObject(driver=self.driver, database=self.database,
-                                host=self.host, port=self.port)
+            self._summary_columns = self.opsimdb.get_column_names('Summary')
 
         # 27 January 2016
         # Detect whether the OpSim db you are connecting to uses 'finSeeing'
         # as its seeing column (deprecated), or FWHMeff, which is the modern
         # standard
-        self._summary_columns = self.opsimdb.get_column_names('Summary')
         self._set_seeing_column(self._summary_columns)
 
         # Set up self.dtype containg the dtype of the recarray we expect back from the SQL query.
@@ -181,6 +217,51 @@ class ObservationMetaDataGenerator(object):
 
         self.dtype = np.dtype(dtypeList)
 
+        if snapshot is not None:
+            if self.summaryIndex.dtype != self.dtype:
+                raise RuntimeError("The records in the OpSim snapshot %s do not have the "
+                                   "columns the ObservationMetaDataGenerator expects; "
+                                   "please write it again with writeSnapshot()" % snapshot)
+        elif inMemory:
+            self.loadSummaryIndex()
+
+    def loadSummaryIndex(self):
+        """
+        Read the Summary table of the OpSim database into memory as an
+        OpSimSummaryIndex (stored in self.summaryIndex), so that
+        getOpSimRecords() (and everything that calls it) is answered from
+        its in-memory indexes rather than by querying the database.
+
+        The table is read with the same GROUP BY expMJD ORDER BY expMJD
+        clause that getOpSimRecords() applies to its queries.
+        """
+        records = self.opsimdb.execute_arbitrary(self.baseQuery + ' FROM SUMMARY'
+                                                 + ' GROUP BY expMJD ORDER BY expMJD',
+                                                 dtype=self.dtype)
+        self.summaryIndex = OpSimSummaryIndex(records)
+
+    def writeSnapshot(self, dirname):
+        """
+        Write the Summary table of the OpSim database, and the indexes built
+        on it by OpSimSummaryIndex, to a snapshot directory holding one .npy
+        file per column and index (see OpSimSummaryIndex.write_snapshot()).
+        This only needs to be done once per database.  Generators constructed
+        with ObservationMetaDataGenerator(snapshot=dirname) then memory-map
+        the files instead of querying the database, so any number of
+        processes on a node can share the pointings with almost no start up
+        cost.
+
+        Parameters
+        ----------
+        dirname : string
+            the name of the directory (it will be created if it does not exist)
+        """
+        if self.summaryIndex is None:
+            self.loadSummaryIndex()
+        metadata = {'database': self.database,
+                    'summary_columns': [str(column) for column in self._summary_columns]}
+        self.summaryIndex.write_snapshot(dirname, metadata=metadata)
+
     def getOpSimRecords(self, obsHistID=None, expDate=None, night=None, fieldRA=None,
                         fieldDec=None, moonRA=None, moonDec=None,
                         rotSkyPos=None, telescopeFilter=None, rawSeeing=None,
@@ -227,6 +308,27 @@ class ObservationMetaDataGenerator(object):
 
         .. notes:: The `limit` argument should only be used if a small example
         is required. The angle ranges in the argument should be specified in degrees.
+        If self.summaryIndex has been loaded (see loadSummaryIndex()), the records
+        are selected from it rather than from the database.
+        """
+
+        # the arguments of this method, keyed on their names
+        # (i.e. on the user interface names of the OpSim columns)
+        constraint_values = dict(locals())
+
+        return self._getOpSimRecords(constraint_values, limit)
+
+    def _getOpSimRecords(self, constraint_values, limit, region=None):
+        """
+        Select OpSim records (see getOpSimRecords()).
+
+        constraint_values is a dict of constraints keyed on the user interface
+        names of the OpSim columns (values that are None are ignored)
+
+        limit is the maximum number of records to return (or None)
+
+        region (optional) is a _SkyCone or _SkyPolygon (see OpSimSummaryIndex.py)
+        in which the pointing centers must lie
         """
 
         self._set_seeing_column(self._summary_columns)
@@ -235,16 +337,18 @@ class ObservationMetaDataGenerator(object):
 
         nConstraints = 0  # the number of constraints in this query
 
+        # the same constraints as (OpSim column, min, max) for self.summaryIndex;
+        # string columns are compared to the value itself, not to the
+        # quoted SQL literal
+        index_constraints = []
+
         for column in self._user_interface_to_opsim:
             transform = self._user_interface_to_opsim[column]
 
-            # this try/except block is because there will be columns in the OpSim Summary
-            # table (and thus in self._user_interface_to_opsim) which the
-            # ObservationMetaDataGenerator is not designed to query on
-            try:
-                value = eval(column)
-            except:
-                value = None
+            # there will be columns in the OpSim Summary table (and thus in
+            # self._user_interface_to_opsim) which the ObservationMetaDataGenerator
+            # is not designed to query on; those are not arguments of this method
+            value = constraint_values.get(column, None)
 
             if value is not None:
                 if column not in self.active_columns:
@@ -271,6 +375,11 @@ class ObservationMetaDataGenerator(object):
 
                     query += ' %s >= %s AND %s <= %s' % \
                              (transform[0], vmin, transform[0], vmax)
+
+                    if isinstance(transform[2], tuple):
+                        index_constraints.append((transform[0], value[0], value[1]))
+                    else:
+                        index_constraints.append((transform[0], vmin, vmax))
                 else:
                     # perform any necessary coordinate transformations
                     if transform[1] is not None:
@@ -279,20 +388,225 @@ class ObservationMetaDataGenerator(object):
                         vv = value
                     query += ' %s == %s' % (transform[0], vv)
 
+                    if isinstance(transform[2], tuple):
+                        index_constraints.append((transform[0], value, value))
+                    else:
+                        index_constraints.append((transform[0], vv, vv))
+
                 nConstraints += 1
 
+        if region is not None:
+            # the database can only select the range of Dec spanned by the region;
+            # the pointings in that range are tested against the region below
+            if nConstraints > 0:
+                query += ' AND'
+            else:
+                query += ' WHERE '
+            query += ' fieldDec >= %s AND fieldDec <= %s' % (region.dec_min, region.dec_max)
+            nConstraints += 1
+
         query += ' GROUP BY expMJD ORDER BY expMJD'
 
-        if limit is not None:
+        if limit is not None and region is None:
             query += ' LIMIT %d' % limit
 
         if nConstraints == 0 and limit is None:
             raise RuntimeError('You did not specify any contraints on your query;' +
                                ' you will just return ObservationMetaData for all poitnings')
 
+        if self.summaryIndex is not None:
+            rows = None
+            if region is not None:
+                rows = self.summaryIndex.rows_in(region)
+            rows = self.summaryIndex.select(index_constraints, limit=limit, rows=rows)
+            return self.summaryIndex.get_records(rows)
+
         results = self.opsimdb.execute_arbitrary(query, dtype=self.dtype)
+
+        if region is not None:
+            results = results[region.contains(_unit_vectors(results['fieldRA'],
+                                                            results['fieldDec']))]
+            if limit is not None:
+                results = results[:limit]
+
         return results
 
+    def _check_constraint_names(self, constraints):
+        """
+        Raise a RuntimeError if any of the keys of the dict constraints
+        is not the user interface name of an OpSim column
+        """
+        for column in constraints:
+            if column not in self._user_interface_to_opsim:
+                raise RuntimeError("ObservationMetaDataGenerator does not know the column %s; "
+                                   "columns that can be constrained are:\n%s"
+                                   % (column, str(sorted(self._user_interface_to_opsim.keys()))))
+
+    def getOpSimRecordsInCone(self, ra, dec, radius, boundLength=1.75, limit=None, **kwargs):
+        """
+        Return the OpSim records of the pointings whose fields of view overlap
+        a cone on the sky, i.e. those whose centers are within radius + boundLength
+        of (ra, dec).  Cones containing RA=0 or a pole need no special treatment.
+
+        Parameters
+        ----------
+        ra, dec : float
+            the center of the cone in degrees
+        radius : float
+            the radius of the cone in degrees (0 to find the pointings
+            whose fields of view contain the point (ra, dec))
+        boundLength : float, optional, defaults to 1.75
+            the radius in degrees of the field of view of a pointing
+            (regardless of the boundType of the ObservationMetaData the
+            records will be used for)
+        limit : integer, optional, defaults to None
+            if not None, the maximum number of records to return
+        kwargs :
+            constraints on any other columns, as passed to getOpSimRecords()
+            (e.g. telescopeFilter='r', expMJD=(59580.0, 59680.0))
+
+        Returns
+        -------
+        `numpy.recarray` with OpSim records, in order of expMJD.  Pass it
+        to ObservationMetaDataFromPointingArray() (or wrap it in a
+        PointingTable) to get ObservationMetaData.
+        """
+        self._check_constraint_names(kwargs)
+        region = _SkyCone(np.radians(ra), np.radians(dec), np.radians(radius + boundLength))
+        return self._getOpSimRecords(kwargs, limit, region=region)
+
+    def getOpSimRecordsInPolygon(self, ra, dec, boundLength=1.75, limit=None, **kwargs):
+        """
+        Return the OpSim records of the pointings whose fields of view overlap
+        a convex polygon on the sky, i.e. those whose centers are within
+        boundLength of it.  The edges of the polygon are great circle arcs.
+        Polygons containing RA=0 or a pole need no special treatment.
+
+        Parameters
+        ----------
+        ra, dec : array-like
+            the vertices of the polygon in degrees, in order around it
+            (in either direction)
+        boundLength : float, optional, defaults to 1.75
+            the radius in degrees of the field of view of a pointing
+        limit : integer, optional, defaults to None
+            if not None, the maximum number of records to return
+        kwargs :
+            constraints on any other columns, as passed to getOpSimRecords()
+
+        Returns
+        -------
+        `numpy.recarray` with OpSim records, in order of expMJD
+        """
+        self._check_constraint_names(kwargs)
+        region = _SkyPolygon(np.radians(ra), np.radians(dec), margin=np.radians(boundLength))
+        return self._getOpSimRecords(kwargs, limit, region=region)
+
+    def getVisitsCoveringPositions(self, ra, dec, expMJD=None, boundLength=1.75,
+                                   chunkSize=100000, **kwargs):
+        """
+        Find, for each of many positions on the sky, the OpSim visits whose
+        fields of view contain it, in a single pass over the pointings.
+
+        The distinct pointing centers of the selected visits are binned into
+        zones of Dec, so that each position is only compared with the centers
+        near it; the visits of every center within boundLength of a position
+        then cover that position.
+
+        Parameters
+        ----------
+        ra, dec : numpy arrays
+            the positions in degrees
+        expMJD : tuple, optional, defaults to None
+            (min, max) MJD of the visits to consider
+        boundLength : float, optional, defaults to 1.75
+            the radius in degrees of the field of view of a visit
+        chunkSize : int, optional, defaults to 100000
+            the number of positions matched at a time (this bounds the
+            memory used by the intermediate arrays)
+        kwargs :
+            constraints on any other columns, as passed to getOpSimRecords()
+            (e.g. telescopeFilter='r')
+
+        Returns
+        -------
+        records : `numpy.recarray`
+            the OpSim records of the visits covering at least one of the
+            positions, in order of expMJD
+        offsets : numpy array of ints of length len(ra)+1
+        visits : numpy array of ints
+            the visits covering the ii'th position are
+            records[visits[offsets[ii]:offsets[ii+1]]] (in order of expMJD)
+        """
+        self._check_constraint_names(kwargs)
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if len(ra) != len(dec):
+            raise RuntimeError("getVisitsCoveringPositions needs as many RAs as Decs; "
+                               "you gave %d RAs and %d Decs" % (len(ra), len(dec)))
+
+        offsets = np.zeros(len(ra)+1, dtype=int)
+        if len(ra) == 0:
+            return np.recarray((0,), dtype=self.dtype), offsets, np.zeros(0, dtype=int)
+
+        # only the visits in the band of Dec spanned by the positions can cover them
+        constraint_values = dict(kwargs)
+        constraint_values['expMJD'] = expMJD
+        if constraint_values.get('fieldDec', None) is None:
+            constraint_values['fieldDec'] = (max(dec.min() - boundLength, -90.0),
+                                             min(dec.max() + boundLength, 90.0))
+        records = self._getOpSimRecords(constraint_values, None)
+
+        # the distinct pointing centers, and the visits made at each
+        # (in order of expMJD)
+        center_dexes = np.lexsort((records['fieldDec'], records['fieldRA']))
+        is_new_center = np.ones(len(records), dtype=bool)
+        is_new_center[1:] = np.logical_or(np.diff(records['fieldRA'][center_dexes]) != 0.0,
+                                          np.diff(records['fieldDec'][center_dexes]) != 0.0)
+        visit_center = np.empty(len(records), dtype=int)
+        visit_center[center_dexes] = np.cumsum(is_new_center) - 1
+        center_ra = records['fieldRA'][center_dexes][is_new_center]
+        center_dec = records['fieldDec'][center_dexes][is_new_center]
+
+        visits_by_center = np.argsort(visit_center, kind='mergesort')
+        visit_counts = np.bincount(visit_center, minlength=len(center_ra))
+        first_visit = np.cumsum(visit_counts) - visit_counts
+
+        visit_list = []
+        for i_start in range(0, len(ra), chunkSize):
+            point_dex, center_dex = _pairs_within(np.radians(ra[i_start:i_start+chunkSize]),
+                                                  np.radians(dec[i_start:i_start+chunkSize]),
+                                                  center_ra, center_dec, np.radians(boundLength))
+
+            counts = visit_counts[center_dex]
+            point_dex = np.repeat(point_dex, counts)
+            visit_dex = visits_by_center[np.arange(counts.sum()) -
+                                         np.repeat(np.cumsum(counts) - counts, counts) +
+                                         np.repeat(first_visit[center_dex], counts)]
+
+            order = np.lexsort((visit_dex, point_dex))
+            visit_list.append(visit_dex[order])
+            offsets[i_start+1:i_start+chunkSize+1] = \
+                np.bincount(point_dex, minlength=min(chunkSize, len(ra)-i_start))
+
+        offsets = np.cumsum(offsets)
+        visits = np.concatenate(visit_list)
+
+        # keep only the records of the visits covering some position
+        used = np.unique(visits)
+        return records[used], offsets, np.searchsorted(used, visits)
+
+    def _check_required_columns(self, OpSimColumns):
+        """
+        Raise a RuntimeError if the OpSim pointings being supplied (whose
+        columns are OpSimColumns) do not contain the minimum required information
+        """
+        for required_column in ('fieldRA', 'fieldDec', 'expMJD', 'filter'):
+            if required_column not in OpSimColumns:
+                raise RuntimeError("ObservationMetaDataGenerator requires that the database of "
+                                   "pointings include the columns:\nfieldRA (in radians)"
+                                   "\nfieldDec (in radians)\nexpMJD\nfilter")
+
     def ObservationMetaDataFromPointing(self, OpSimPointingRecord, OpSimColumns=None,
                                         boundLength=1.75, boundType='circle'):
         """
@@ -327,14 +641,7 @@ class ObservationMetaDataGenerator(object):
             OpSimColumns = pointing_column_names
 
         self._set_seeing_column(OpSimColumns)
-
-        # check to make sure the OpSim pointings being supplied contain
-        # the minimum required information
-        for required_column in ('fieldRA', 'fieldDec', 'expMJD', 'filter'):
-            if required_column not in OpSimColumns:
-                raise RuntimeError("ObservationMetaDataGenerator requires that the database of "
-                                   "pointings include the coluns:\nfieldRA (in radians)"
-                                   "\nfieldDec (in radians)\nexpMJD\nfilter")
+        self._check_required_columns(OpSimColumns)
 
         # construct a raw dict of all of the OpSim columns associated with this pointing
         raw_dict = dict([(col, pointing[col]) for col in pointing_column_names])
@@ -381,16 +688,56 @@ class ObservationMetaDataGenerator(object):
             the bound length of the Pointing in units of degrees. For boundType
             'box', this is the length of the side of the square box. For boundType
             'circle' this is the radius.
+
+        The result is the same as calling ObservationMetaDataFromPointing()
+        on each record, but the columns are validated (and the seeing column
+        detected) once, and the unit conversions are done on whole columns.
         """
 
         if OpSimColumns is None:
             OpSimColumns = OpSimPointingRecords.dtype.names
 
-        out = list(self.ObservationMetaDataFromPointing(OpSimPointingRecord,
-                                                        OpSimColumns=OpSimColumns,
-                                                        boundLength=boundLength,
-                                                        boundType=boundType)
-                   for OpSimPointingRecord in OpSimPointingRecords)
+        self._set_seeing_column(OpSimColumns)
+        self._check_required_columns(OpSimColumns)
+
+        pointing_column_names = tuple(OpSimPointingRecords.dtype.names)
+
+        ra_list = np.degrees(OpSimPointingRecords['fieldRA'])
+        dec_list = np.degrees(OpSimPointingRecords['fieldDec'])
+        mjd_list = OpSimPointingRecords['expMJD']
+        filter_list = OpSimPointingRecords['filter']
+
+        # the (ObservationMetaData attribute, values) set if the column is present
+        optional_values = []
+        if 'fiveSigmaDepth' in pointing_column_names:
+            optional_values.append(('m5', OpSimPointingRecords['fiveSigmaDepth']))
+        if 'filtSkyBrightness' in pointing_column_names:
+            optional_values.append(('skyBrightness', OpSimPointingRecords['filtSkyBrightness']))
+        if self._seeing_column in pointing_column_names:
+            optional_values.append(('seeing', OpSimPointingRecords[self._seeing_column]))
+        if 'rotSkyPos' in pointing_column_names:
+            optional_values.append(('rotSkyPos', np.degrees(OpSimPointingRecords['rotSkyPos'])))
+
+        # the rows of the records as tuples of numpy scalars (the values
+        # indexing each record by column name would give), to be zipped
+        # with pointing_column_names into the raw dicts of the pointings
+        column_arrays = [OpSimPointingRecords[col] for col in pointing_column_names]
+        row_values = zip(*column_arrays)
+
+        out = []
+        for ix, values in enumerate(row_values):
+            obs = ObservationMetaData(pointingRA=ra_list[ix],
+                                      pointingDec=dec_list[ix],
+                                      mjd=mjd_list[ix],
+                                      bandpassName=filter_list[ix],
+                                      boundType=boundType,
+                                      boundLength=boundLength)
+
+            for attr, attr_values in optional_values:
+                setattr(obs, attr, attr_values[ix])
+
+            obs.OpsimMetaData = dict(zip(pointing_column_names, values))
+            out.append(obs)
 
         return out
 
@@ -483,3 +830,49 @@ class ObservationMetaDataGenerator(object):
                                                            boundType=boundType,
                                                            boundLength=boundLength)
         return output
+
+    def getPointingTable(self, obsHistID=None, expDate=None, night=None, fieldRA=None, fieldDec=None,
+                         moonRA=None, moonDec=None, rotSkyPos=None, telescopeFilter=None,
+                         rawSeeing=None, seeing=None, sunAlt=None, moonAlt=None, dist2Moon=None,
+                         moonPhase=None, expMJD=None, altitude=None, azimuth=None,
+                         visitExpTime=None, airmass=None, skyBrightness=None,
+                         m5=None, boundType='circle', boundLength=1.75, limit=None):
+        """
+        This method accepts the same arguments as getObservationMetaData()
+        and returns the same pointings, but as a PointingTable wrapping the
+        numpy recarray of OpSim records, rather than as a list of
+        ObservationMetaData.  The ObservationMetaData of each pointing
+        is only constructed when it is accessed, so this is much cheaper
+        than getObservationMetaData() for callers that need only some of
+        the pointings, or only some of the columns (e.g.
+        table['expMJD'], table['filter'], table['fiveSigmaDepth']), of
+        a large query.
+        """
+
+        OpSimPointingRecords = self.getOpSimRecords(obsHistID=obsHistID,
+                                                    expDate=expDate,
+                                                    night=night,
+                                                    fieldRA=fieldRA,
+                                                    fieldDec=fieldDec,
+                                                    moonRA=moonRA,
+                                                    moonDec=moonDec,
+                                                    rotSkyPos=rotSkyPos,
+                                                    telescopeFilter=telescopeFilter,
+                                                    rawSeeing=rawSeeing,
+                                                    seeing=seeing,
+                                                    sunAlt=sunAlt,
+                                                    moonAlt=moonAlt,
+                                                    dist2Moon=dist2Moon,
+                                                    moonPhase=moonPhase,
+                                                    expMJD=expMJD,
+                                                    altitude=altitude,
+                                                    azimuth=azimuth,
+                                                    visitExpTime=visitExpTime,
+                                                    airmass=airmass,
+                                                    skyBrightness=skyBrightness,
+                                                    m5=m5, boundType=boundType,
+                                                    boundLength=boundLength,
+                                                    limit=limit)
+
+        return PointingTable(OpSimPointingRecords, self,
+                             boundType=boundType, boundLength=boundLength)
@@ -0,0 +1,476 @@
+from builtins import object
+import numpy as np
+import json
+import os
+
+__all__ = ["OpSimSummaryIndex"]
+
+
+def _unit_vectors(ra, dec):
+    """
+    Return the (N, 3) array of the unit vectors pointing at ra, dec
+    (numpy arrays in radians)
+    """
+    cos_dec = np.cos(dec)
+    return np.array([np.cos(ra)*cos_dec, np.sin(ra)*cos_dec, np.sin(dec)]).transpose()
+
+
+def _angle_between(xyz, vv):
+    """
+    Return the angles in radians between the unit vectors xyz (an (N, 3)
+    array) and the unit vector vv (computed with arctan2, so that they
+    are accurate at small separations)
+    """
+    return np.arctan2(np.sqrt(np.power(np.cross(xyz, vv), 2).sum(axis=1)),
+                      np.dot(xyz, vv))
+
+
+def _expand_ranges(owner, start, stop):
+    """
+    Given, for each element of owner, a range [start, stop) of indexes,
+    return the arrays (owners, indexes) listing every index in every range
+    together with the owner of its range
+    """
+    counts = np.maximum(stop - start, 0)
+    total = counts.sum()
+    owners = np.repeat(owner, counts)
+    first = np.cumsum(counts) - counts
+    indexes = np.arange(total) - np.repeat(first, counts) + np.repeat(start, counts)
+    return owners, indexes
+
+
+def _pairs_within(ra, dec, center_ra, center_dec, radius):
+    """
+    Find all of the pairs of a point and a center no more than radius
+    apart.
+
+    The centers are binned into zones of Dec no higher than radius and
+    sorted on RA within each zone, so that each point is only compared
+    with the centers in the window of RA that its cone spans in each of
+    the (two or three) zones that the cone touches.
+
+    Parameters
+    ----------
+    ra, dec are numpy arrays of the positions of the points in radians
+
+    center_ra, center_dec are numpy arrays of the positions of the
+    centers in radians
+
+    radius is the maximum separation in radians
+
+    Returns
+    -------
+    point_dex, center_dex : numpy arrays of the indexes of the points and
+    the centers making up the pairs, sorted on point_dex
+    """
+    two_pi = 2.0*np.pi
+    n_zones = max(int(np.ceil(np.pi/max(radius, 1.0e-6))), 1)
+    zone_height = np.pi/n_zones
+
+    center_ra = center_ra % two_pi
+    center_zone = np.clip(((center_dec + 0.5*np.pi)/zone_height).astype(int), 0, n_zones-1)
+    # the centers sorted by zone and, within each zone, by RA
+    center_key = center_zone*2.0*two_pi + center_ra
+    center_order = np.argsort(center_key)
+    sorted_key = center_key[center_order]
+    center_xyz = _unit_vectors(center_ra, center_dec)
+
+    ra = ra % two_pi
+    point_xyz = _unit_vectors(ra, dec)
+
+    # the half-width in RA of each cone; cones reaching a pole span all RAs
+    alpha = np.zeros(len(ra)) + np.pi
+    bounded = np.abs(dec) + radius < 0.5*np.pi
+    alpha[bounded] = np.arctan(np.sin(radius) /
+                               np.sqrt(np.abs(np.cos(dec[bounded] - radius)*np.cos(dec[bounded] + radius))))
+    full_circle = alpha >= np.pi
+
+    zone_lo = np.clip(np.floor((dec - radius + 0.5*np.pi)/zone_height).astype(int), 0, n_zones-1)
+    zone_hi = np.clip(np.floor((dec + radius + 0.5*np.pi)/zone_height).astype(int), 0, n_zones-1)
+
+    # the ranges of RA to search in [0, 2 pi): the cone's window, clipped
+    # at 0 and 2 pi, and the part of the window that wraps around
+    ra_pieces = [(np.where(full_circle, 0.0, np.maximum(ra - alpha, 0.0)),
+                  np.where(full_circle, two_pi, np.minimum(ra + alpha, two_pi)),
+                  np.ones(len(ra), dtype=bool)),
+                 (ra - alpha + two_pi, np.zeros(len(ra)) + two_pi,
+                  np.logical_and(~full_circle, ra - alpha < 0.0)),
+                 (np.zeros(len(ra)), ra + alpha - two_pi,
+                  np.logical_and(~full_circle, ra + alpha > two_pi))]
+
+    point_list = []
+    center_list = []
+    all_points = np.arange(len(ra))
+    for dz in range((zone_hi - zone_lo).max() + 1 if len(ra) > 0 else 0):
+        zone = zone_lo + dz
+        in_zone = zone <= zone_hi
+        for ra_min, ra_max, valid in ra_pieces:
+            valid = np.logical_and(valid, in_zone)
+            start = np.searchsorted(sorted_key, zone[valid]*2.0*two_pi + ra_min[valid], side='left')
+            stop = np.searchsorted(sorted_key, zone[valid]*2.0*two_pi + ra_max[valid], side='right')
+            points, candidates = _expand_ranges(all_points[valid], start, stop)
+            candidates = center_order[candidates]
+            pp = point_xyz[points]
+            cc = center_xyz[candidates]
+            angle = np.arctan2(np.sqrt(np.power(np.cross(pp, cc), 2).sum(axis=1)),
+                               (pp*cc).sum(axis=1))
+            keep = angle <= radius
+            point_list.append(points[keep])
+            center_list.append(candidates[keep])
+
+    if len(point_list) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    point_dex = np.concatenate(point_list)
+    center_dex = np.concatenate(center_list)
+    order = np.lexsort((center_dex, point_dex))
+    return point_dex[order], center_dex[order]
+
+
+class _SkyCone(object):
+    """
+    The points on the sky within radius of (ra, dec) (all in radians)
+    """
+
+    def __init__(self, ra, dec, radius):
+        self._center = _unit_vectors(np.array([ra]), np.array([dec]))[0]
+        self._radius = radius
+        self.dec_min = max(dec - radius, -0.5*np.pi)
+        self.dec_max = min(dec + radius, 0.5*np.pi)
+
+    def contains(self, xyz):
+        """
+        Return a boolean mask of the unit vectors xyz in the cone
+        """
+        return _angle_between(xyz, self._center) <= self._radius
+
+
+class _SkyPolygon(object):
+    """
+    The points on the sky within margin of a convex spherical polygon
+    (whose edges are great circle arcs) with vertices ra, dec (all in
+    radians; the vertices may be listed in either direction)
+    """
+
+    def __init__(self, ra, dec, margin=0.0):
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if len(ra) != len(dec) or len(ra) < 3:
+            raise RuntimeError("A polygon needs the same number (at least 3) "
+                               "of RAs and Decs; you gave %d RAs and %d Decs" % (len(ra), len(dec)))
+
+        vertices = _unit_vectors(ra, dec)
+        normals = np.cross(vertices, np.roll(vertices, -1, axis=0))
+        if np.dot(normals, vertices.sum(axis=0)).sum() < 0.0:
+            vertices = vertices[::-1]
+            normals = np.cross(vertices, np.roll(vertices, -1, axis=0))
+        normals /= np.sqrt(np.power(normals, 2).sum(axis=1))[:, None]
+
+        # every vertex must be on the inner side of every edge
+        if (np.dot(vertices, normals.transpose()) < -1.0e-12).any():
+            raise RuntimeError("The polygon must be convex (and its vertices "
+                               "listed in order around it)")
+
+        self._vertices = vertices
+        self._normals = normals
+        self._margin = margin
+
+        # the cap centered on the mean vertex that contains all of the vertices
+        # contains the (convex) polygon
+        center = vertices.sum(axis=0)
+        center /= np.sqrt(np.power(center, 2).sum())
+        cap_radius = _angle_between(vertices, center).max() + margin
+        center_dec = np.arcsin(center[2])
+        self.dec_min = max(center_dec - cap_radius, -0.5*np.pi)
+        self.dec_max = min(center_dec + cap_radius, 0.5*np.pi)
+
+    def distance(self, xyz):
+        """
+        Return the angular distances in radians of the unit vectors xyz from
+        the polygon (zero for those inside it)
+        """
+        dist = np.zeros(len(xyz))
+        outside = (np.dot(xyz, self._normals.transpose()) < 0.0).any(axis=1)
+        if not outside.any():
+            return dist
+
+        pts = xyz[outside]
+        edge_dist = np.empty((len(pts), len(self._normals)))
+        for ix, (v1, v2, nn) in enumerate(zip(self._vertices,
+                                              np.roll(self._vertices, -1, axis=0),
+                                              self._normals)):
+            # the distance from the nearest point on the great circle of the
+            # edge, if that point lies on the edge; otherwise from the nearer
+            # of its ends
+            height = np.dot(pts, nn)
+            foot = pts - height[:, None]*nn
+            on_edge = np.logical_and(np.dot(np.cross(v1, foot), nn) >= 0.0,
+                                     np.dot(np.cross(foot, v2), nn) >= 0.0)
+            edge_dist[:, ix] = np.where(on_edge, np.arcsin(np.clip(np.abs(height), 0.0, 1.0)),
+                                        np.minimum(_angle_between(pts, v1),
+                                                   _angle_between(pts, v2)))
+        dist[outside] = edge_dist.min(axis=1)
+        return dist
+
+    def contains(self, xyz):
+        """
+        Return a boolean mask of the unit vectors xyz within margin of the polygon
+        """
+        return self.distance(xyz) <= self._margin
+
+
+class OpSimSummaryIndex(object):
+    """
+    An in-memory copy of the Summary table of an OpSim database, held as one
+    numpy array per column with the rows sorted by expMJD, with sorted
+    indexes on the columns that pointings are most often selected on, so
+    that repeated queries are answered with binary searches rather than by
+    the database.
+
+    Every column of the table can be constrained, but only the indexed
+    columns are looked up with binary searches; the others are compared
+    element by element among the pointings selected by the indexed
+    constraints (or, if there are none, among all of the pointings).
+
+    The spatial index sorts the pointings on fieldDec and keeps the unit
+    vectors of their centers, so that the pointings in a range of Dec are
+    found with a binary search before their RA (or their angular
+    separation from a point) is checked.
+
+    The columns and indexes can be written to a snapshot directory with
+    write_snapshot() and read back, memory-mapped, with from_snapshot(), so
+    that many processes can share them without reading the database or
+    building the indexes.
+
+    Input parameters:
+    -----------------
+    records is a numpy recarray of the Summary table (as returned by
+    ObservationMetaDataGenerator.getOpSimRecords(); it will be sorted by
+    expMJD if it is not already)
+
+    indexed_columns (optional) is a list of the OpSim names of the columns
+    to index.  Defaults to ('expMJD', 'filter', 'night', 'fieldID',
+    'fieldRA', 'fieldDec'); those not in records are ignored.
+    """
+
+    def __init__(self, records,
+                 indexed_columns=('expMJD', 'filter', 'night', 'fieldID', 'fieldRA', 'fieldDec')):
+
+        if len(records) > 1 and (np.diff(records['expMJD']) < 0.0).any():
+            records = records[np.argsort(records['expMJD'], kind='mergesort')]
+
+        self.dtype = records.dtype
+        self.metadata = {}
+        self._n_rows = len(records)
+        self._columns = dict((name, records[name]) for name in records.dtype.names)
+
+        # for each indexed column, the order in which to read the rows
+        # to get the column sorted, and the column in that order
+        self._order = {}
+        self._sorted = {}
+        for column in indexed_columns:
+            if column not in self._columns:
+                continue
+            if column == 'expMJD':
+                order = np.arange(self._n_rows)
+            else:
+                order = np.argsort(self._columns[column], kind='mergesort')
+            self._order[column] = order
+            self._sorted[column] = self._columns[column][order]
+
+        # unit vectors of the pointing centers
+        if 'fieldRA' in self._columns and 'fieldDec' in self._columns:
+            self._xyz = _unit_vectors(self._columns['fieldRA'], self._columns['fieldDec'])
+        else:
+            self._xyz = None
+
+    def __len__(self):
+        return self._n_rows
+
+    def write_snapshot(self, dirname, metadata=None):
+        """
+        Write the columns and indexes to a snapshot directory (which will be
+        created if it does not exist) as
+
+        column_<name>.npy -- one file per column
+
+        order_<name>.npy, sorted_<name>.npy -- the index on each indexed column
+
+        xyz.npy -- the unit vectors of the pointing centers
+
+        manifest.json -- the dtype of the records, the number of rows, the
+        indexed columns and metadata.  It is written last, so a directory
+        with a manifest always holds a complete snapshot.
+
+        Parameters
+        ----------
+        dirname is the name of the directory
+
+        metadata (optional) is a json-serializable dict stored in the
+        manifest (e.g. the name of the database the records came from)
+        """
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+        manifest_name = os.path.join(dirname, 'manifest.json')
+        if os.path.exists(manifest_name):
+            os.unlink(manifest_name)
+
+        for name in self.dtype.names:
+            np.save(os.path.join(dirname, 'column_%s.npy' % name), self._columns[name])
+        for name in self._order:
+            np.save(os.path.join(dirname, 'order_%s.npy' % name), self._order[name])
+            np.save(os.path.join(dirname, 'sorted_%s.npy' % name), self._sorted[name])
+        if self._xyz is not None:
+            np.save(os.path.join(dirname, 'xyz.npy'), self._xyz)
+
+        manifest = {'n_rows': self._n_rows,
+                    'dtype': [[name, self.dtype[name].str] for name in self.dtype.names],
+                    'indexed_columns': list(self._order.keys()),
+                    'metadata': metadata if metadata is not None else self.metadata}
+
+        # write to a temporary file and rename it, so that the manifest
+        # is never left half-written
+        tmp_name = manifest_name + '.tmp'
+        with open(tmp_name, 'w') as output_file:
+            json.dump(manifest, output_file)
+        os.rename(tmp_name, manifest_name)
+
+    @classmethod
+    def from_snapshot(cls, dirname, mmap=True):
+        """
+        Read an OpSimSummaryIndex from a snapshot directory written by
+        write_snapshot().
+
+        Parameters
+        ----------
+        dirname is the name of the directory
+
+        mmap (optional; default True) -- if True, the arrays are
+        memory-mapped (read-only) rather than read, so opening the snapshot
+        costs almost nothing and processes on the same node share the
+        pages of the files.
+
+        Returns
+        -------
+        An OpSimSummaryIndex whose metadata attribute is the metadata
+        stored in the snapshot
+        """
+        manifest_name = os.path.join(dirname, 'manifest.json')
+        if not os.path.exists(manifest_name):
+            raise RuntimeError("%s is not an OpSim snapshot (it has no manifest.json)" % dirname)
+        with open(manifest_name, 'r') as input_file:
+            manifest = json.load(input_file)
+
+        mmap_mode = 'r' if mmap else None
+
+        def load(name):
+            return np.load(os.path.join(dirname, name), mmap_mode=mmap_mode)
+
+        index = cls.__new__(cls)
+        index.dtype = np.dtype([(str(name), str(dt)) for name, dt in manifest['dtype']])
+        index.metadata = manifest['metadata']
+        index._n_rows = manifest['n_rows']
+        index._columns = dict((name, load('column_%s.npy' % name)) for name in index.dtype.names)
+        index._order = {}
+        index._sorted = {}
+        for name in manifest['indexed_columns']:
+            index._order[name] = load('order_%s.npy' % name)
+            index._sorted[name] = load('sorted_%s.npy' % name)
+        if os.path.exists(os.path.join(dirname, 'xyz.npy')):
+            index._xyz = load('xyz.npy')
+        else:
+            index._xyz = None
+        return index
+
+    def get_records(self, rows):
+        """
+        Return the records of the rows (an array of row indexes) as a
+        numpy recarray
+        """
+        records = np.recarray(len(rows), dtype=self.dtype)
+        for name in self.dtype.names:
+            records[name] = self._columns[name][rows]
+        return records
+
+    @property
+    def indexed_columns(self):
+        """
+        The names of the indexed columns
+        """
+        return list(self._order.keys())
+
+    def _lookup(self, column, vmin, vmax):
+        """
+        Return the (unsorted) row indexes of the pointings with
+        vmin <= column <= vmax from the index on column
+        """
+        lo = np.searchsorted(self._sorted[column], vmin, side='left')
+        hi = np.searchsorted(self._sorted[column], vmax, side='right')
+        return self._order[column][lo:hi]
+
+    def _lookup_size(self, column, vmin, vmax):
+        return np.searchsorted(self._sorted[column], vmax, side='right') - \
+            np.searchsorted(self._sorted[column], vmin, side='left')
+
+    def select(self, constraints, limit=None, rows=None):
+        """
+        Select pointings.
+
+        Parameters
+        ----------
+        constraints is a list of tuples (column, vmin, vmax) selecting the
+        pointings with vmin <= column <= vmax.  column is the name of the
+        column in the OpSim database and vmin, vmax are in its units (i.e.
+        radians for angles).  For an exact match, pass vmin == vmax.
+
+        limit (optional) is the maximum number of pointings to return
+
+        rows (optional) is an array of row indexes to which the selection
+        is restricted (e.g. the result of a spatial lookup)
+
+        Returns
+        -------
+        The row indexes of the selected pointings, in order of expMJD
+        """
+        if rows is None:
+            indexed = [cc for cc in constraints if cc[0] in self._order]
+            if len(indexed) > 0:
+                # look the most selective indexed constraint up in its index
+                sizes = [self._lookup_size(*cc) for cc in indexed]
+                best = indexed[int(np.argmin(sizes))]
+                rows = self._lookup(*best)
+                constraints = [cc for cc in constraints if cc is not best]
+            else:
+                rows = np.arange(self._n_rows)
+
+        for column, vmin, vmax in constraints:
+            values = self._columns[column][rows]
+            if vmin == vmax:
+                keep = values == vmin
+            else:
+                keep = np.logical_and(values >= vmin, values <= vmax)
+            rows = rows[keep]
+
+        rows = np.sort(rows)
+        if limit is not None:
+            rows = rows[:limit]
+        return rows
+
+    def dec_zone(self, dec_min, dec_max):
+        """
+        Return the row indexes of the pointings with
+        dec_min <= fieldDec <= dec_max (in radians) from the spatial index
+        """
+        return self._lookup('fieldDec', dec_min, dec_max)
+
+    def rows_in(self, region):
+        """
+        Return the row indexes (in order of expMJD) of the pointings whose
+        centers are in region (a _SkyCone or _SkyPolygon): the pointings in
+        the range of Dec spanned by the region are found in the spatial
+        index and their unit vectors are then tested against the region.
+        """
+        rows = self.dec_zone(region.dec_min, region.dec_max)
+        rows = rows[region.contains(self._xyz[rows])]
+        return np.sort(rows)
@@ -0,0 +1,127 @@
+from builtins import range
+from builtins import object
+import numpy as np
+
+__all__ = ["PointingTable"]
+
+
+class PointingTable(object):
+    """
+    A table of OpSim pointings, as returned by
+    ObservationMetaDataGenerator.getPointingTable().  The OpSim records are
+    kept in their numpy recarray; the ObservationMetaData corresponding to a
+    pointing is only constructed (by
+    ObservationMetaDataGenerator.ObservationMetaDataFromPointing()) the first
+    time it is accessed, so callers who only need a few columns of many
+    pointings never pay for building all of the ObservationMetaData.
+
+    table[ii] is the ObservationMetaData of the ii'th pointing
+
+    table[mask], table[index_array] and table[slice] are PointingTables
+    containing the selected pointings (ObservationMetaData that have already
+    been constructed are shared with them)
+
+    table['expMJD'] is the expMJD column of the records (in the units of
+    the OpSim database, i.e. angles are in radians)
+
+    Iterating over the table yields its ObservationMetaData in order.
+
+    Input parameters:
+    -----------------
+    records is a numpy recarray of OpSim Summary records
+
+    generator is the ObservationMetaDataGenerator used to construct the
+    ObservationMetaData
+
+    boundType and boundLength are passed to the ObservationMetaData
+    (see ObservationMetaDataGenerator.ObservationMetaDataFromPointing())
+    """
+
+    def __init__(self, records, generator, boundType='circle', boundLength=1.75,
+                 _obs_cache=None):
+        self.records = records
+        self.columns = records.dtype.names
+        self.boundType = boundType
+        self.boundLength = boundLength
+        self._generator = generator
+
+        generator._check_required_columns(self.columns)
+
+        # the ObservationMetaData constructed so far (None where they have not been)
+        if _obs_cache is None:
+            _obs_cache = np.empty(len(records), dtype=object)
+        self._obs_cache = _obs_cache
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for ix in range(len(self)):
+            yield self._get_obs(ix)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.records[key]
+
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if key < 0 or key >= len(self):
+                raise IndexError("PointingTable index %d out of range; "
+                                 "the table has %d pointings" % (key, len(self)))
+            return self._get_obs(key)
+
+        return PointingTable(self.records[key], self._generator,
+                             boundType=self.boundType, boundLength=self.boundLength,
+                             _obs_cache=self._obs_cache[key])
+
+    def _get_obs(self, ix):
+        """
+        Return the ObservationMetaData of the ix'th pointing, constructing
+        it if necessary
+        """
+        obs = self._obs_cache[ix]
+        if obs is None:
+            obs = self._generator.ObservationMetaDataFromPointing(self.records[ix],
+                                                                  OpSimColumns=self.columns,
+                                                                  boundLength=self.boundLength,
+                                                                  boundType=self.boundType)
+            self._obs_cache[ix] = obs
+        return obs
+
+    def to_list(self):
+        """
+        Return a list of all of the ObservationMetaData in the table
+        (i.e. what ObservationMetaDataGenerator.getObservationMetaData()
+        returns)
+        """
+        # construct all of the missing ObservationMetaData at once
+        missing = np.array([obs is None for obs in self._obs_cache], dtype=bool)
+        if missing.any():
+            obs_list = self._generator.ObservationMetaDataFromPointingArray(self.records[missing],
+                                                                            OpSimColumns=self.columns,
+                                                                            boundLength=self.boundLength,
+                                                                            boundType=self.boundType)
+            for ix, obs in zip(np.where(missing)[0], obs_list):
+                self._obs_cache[ix] = obs
+        return list(self._obs_cache)
+
+    def group_by(self, column):
+        """
+        Group the pointings on the value of a column.
+
+        Parameters
+        ----------
+        column is the name of the column (e.g. 'filter' or 'fieldID')
+
+        Returns
+        -------
+        A dict keyed on the distinct values of the column (in increasing
+        order) whose values are PointingTables of the pointings having
+        that value, in the order in which they appear in this table.
+        """
+        values, inverse = np.unique(self.records[column], return_inverse=True)
+        sorted_dexes = np.argsort(inverse, kind='mergesort')
+        bounds = np.cumsum(np.bincount(inverse, minlength=len(values)))[:-1]
+        return dict((vv, self[dexes])
+                    for vv, dexes in zip(values.tolist(), np.split(sorted_dexes, bounds)))
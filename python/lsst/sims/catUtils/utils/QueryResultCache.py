@@ -0,0 +1,253 @@
+from builtins import object
+import os
+import shutil
+import tempfile
+import hashlib
+import numpy as np
+
+__all__ = ["QueryResultCache"]
+
+
+class QueryResultCache(object):
+    """
+    This class keeps the results of CatalogDBObject.query_columns() in a
+    directory on local disk, so that running the same query again (e.g.
+    to regenerate light curves for a field with different bandpasses or
+    MJD windows) does not go back to the database.
+
+    Each result is stored as one binary .npy file per chunk of rows, exactly
+    as the chunks came out of the database.  The first time a query is run,
+    the chunks are written to disk as they are passed on to the caller; the
+    entry is only kept if the caller reads every chunk (a query that is
+    abandoned part way through, e.g. because lc_per_field was reached, is
+    not cached).  Subsequent identical queries are replayed from disk in
+    chunks of the requested chunk_size.
+
+    Queries are identified by the CatalogDBObject class, the database
+    and table it reads, the list of columns, the bounds of the
+    ObservationMetaData, the constraint, and the limit.  Nothing checks
+    whether the contents of the database have changed; clear() the cache
+    if they have.
+
+    When the cache grows past max_bytes, the least recently used entries
+    are deleted.  Several processes may share a cache: a replay is not
+    affected by its entry being deleted part way through.
+
+    Input parameters:
+    -----------------
+    cache_dir is the directory in which to keep the results (it is created
+    if it does not exist)
+
+    max_bytes (optional; default 10 GB) is the largest amount of disk space
+    the cache is allowed to occupy
+    """
+
+    def __init__(self, cache_dir, max_bytes=10*1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # the number of queries answered from disk and from the database
+        self.hits = 0
+        self.misses = 0
+
+    def query_key(self, db_obj, colnames=None, obs_metadata=None, constraint=None, limit=None):
+        """
+        Return the string which identifies a query in the cache.
+
+        Input parameters are as in query_columns()
+        """
+        db_info = tuple(str(getattr(db_obj, attr, None))
+                        for attr in ('driver', 'host', 'port', 'database', 'tableid'))
+
+        if colnames is not None:
+            colnames = tuple(str(name) for name in colnames)
+
+        if obs_metadata is not None and obs_metadata.boundType is not None:
+            bounds = (obs_metadata.boundType,
+                      repr(obs_metadata._pointingRA),
+                      repr(obs_metadata._pointingDec),
+                      tuple(repr(ll) for ll in np.atleast_1d(obs_metadata.boundLength)))
+        else:
+            bounds = None
+
+        key = (db_obj.__class__.__module__, db_obj.__class__.__name__, db_info,
+               colnames, bounds, constraint, limit)
+
+        return hashlib.md5(repr(key).encode('utf-8')).hexdigest()
+
+    def query_columns(self, db_obj, colnames=None, obs_metadata=None, constraint=None,
+                      limit=None, chunk_size=None):
+        """
+        Return an iterator over chunks of the rows returned by
+        db_obj.query_columns(), reading them from the cache if this query
+        has been run before.
+
+        Input parameters:
+        -----------------
+        db_obj is the CatalogDBObject to query
+
+        colnames, obs_metadata, constraint, limit, and chunk_size are passed
+        to db_obj.query_columns()
+        """
+        entry_dir = os.path.join(self.cache_dir,
+                                 self.query_key(db_obj, colnames=colnames, obs_metadata=obs_metadata,
+                                                constraint=constraint, limit=limit))
+
+        def requery():
+            return db_obj.query_columns(colnames=colnames, obs_metadata=obs_metadata,
+                                        constraint=constraint, limit=limit,
+                                        chunk_size=chunk_size)
+
+        if os.path.exists(entry_dir):
+            try:
+                # mark the entry as recently used
+                os.utime(entry_dir, None)
+            except OSError:
+                # evicted by another process since we looked
+                pass
+            else:
+                self.hits += 1
+                return self._replay(entry_dir, chunk_size, requery)
+
+        self.misses += 1
+        return self._record(requery(), entry_dir)
+
+    def _chunk_names(self, entry_dir):
+        return sorted(name for name in os.listdir(entry_dir) if name.endswith('.npy'))
+
+    def _replay(self, entry_dir, chunk_size, requery):
+        """
+        Yield the rows stored in entry_dir in chunks of chunk_size rows
+        (all in one chunk if chunk_size is None).
+
+        Every chunk is memory-mapped before the first row is yielded, so an
+        entry that is evicted (by this or another process) while it is being
+        read stays readable through the mappings.  If the entry is gone
+        before that, the whole query is run against the database instead;
+        requery() returns the iterator that db_obj.query_columns() would.
+        """
+        try:
+            chunk_list = [np.load(os.path.join(entry_dir, name), mmap_mode='r')
+                          for name in self._chunk_names(entry_dir)]
+        except (IOError, OSError):
+            chunk_list = requery()
+
+        for chunk in self._rechunk(chunk_list, chunk_size):
+            yield chunk
+
+    def _rechunk(self, chunk_iter, chunk_size):
+        """
+        Yield the rows of chunk_iter in chunks of chunk_size rows
+        (all in one chunk if chunk_size is None).
+        """
+        pending = []
+        n_pending = 0
+        for chunk in chunk_iter:
+            while len(chunk) > 0:
+                if chunk_size is None:
+                    n_take = len(chunk)
+                else:
+                    n_take = min(len(chunk), chunk_size - n_pending)
+                pending.append(chunk[:n_take])
+                n_pending += n_take
+                chunk = chunk[n_take:]
+                if chunk_size is not None and n_pending == chunk_size:
+                    yield np.concatenate(pending).view(np.recarray)
+                    pending = []
+                    n_pending = 0
+
+        if n_pending > 0:
+            yield np.concatenate(pending).view(np.recarray)
+
+    def _record(self, query_result, entry_dir):
+        """
+        Yield the chunks of query_result, writing them to disk as they go by.
+        The entry is only added to the cache once query_result is exhausted.
+        """
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='tmp_')
+        cacheable = True
+        complete = False
+        try:
+            for i_chunk, chunk in enumerate(query_result):
+                # chunks containing python objects cannot be stored compactly
+                if chunk.dtype.hasobject:
+                    cacheable = False
+                if cacheable:
+                    np.save(os.path.join(tmp_dir, 'chunk_%06d.npy' % i_chunk), np.asarray(chunk))
+                yield chunk
+            complete = True
+        finally:
+            if complete and cacheable and not os.path.exists(entry_dir):
+                try:
+                    os.rename(tmp_dir, entry_dir)
+                except OSError:
+                    # another process cached the same query first
+                    pass
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+        if complete and cacheable:
+            self.evict()
+
+    def _entries(self):
+        """
+        Return a list of (last used time, size in bytes, path) for every
+        entry in the cache.
+        """
+        entry_list = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith('tmp_') or not os.path.isdir(path):
+                continue
+            try:
+                n_bytes = sum(os.path.getsize(os.path.join(path, chunk_name))
+                              for chunk_name in self._chunk_names(path))
+                entry_list.append((os.path.getmtime(path), n_bytes, path))
+            except OSError:
+                # removed by another process
+                pass
+        return entry_list
+
+    @property
+    def n_bytes(self):
+        """
+        The total size of the cached results in bytes
+        """
+        return sum(entry[1] for entry in self._entries())
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache occupies
+        no more than max_bytes.
+        """
+        entry_list = sorted(self._entries())
+        total = sum(entry[1] for entry in entry_list)
+        for last_used, n_bytes, path in entry_list:
+            if total <= self.max_bytes:
+                break
+            self._discard(path)
+            total -= n_bytes
+
+    def clear(self):
+        """
+        Delete everything in the cache.
+        """
+        for _, _, path in self._entries():
+            self._discard(path)
+
+    def _discard(self, path):
+        """
+        Delete the entry at path.  The entry is first renamed into a tmp_
+        directory, so that a query never sees it with only some of its
+        chunks; a replay that has already started falls back to the
+        database (see _replay()).
+        """
+        trash_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='tmp_')
+        try:
+            os.rename(path, os.path.join(trash_dir, 'entry'))
+        except OSError:
+            # removed by another process
+            pass
+        shutil.rmtree(trash_dir, ignore_errors=True)
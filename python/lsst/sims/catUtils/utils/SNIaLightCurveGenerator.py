@@ -1,18 +1,18 @@
 from __future__ import print_function
 from builtins import zip
 import numpy as np
+import hashlib
 import warnings
 
 from lsst.sims.catUtils.mixins import SNIaCatalog, PhotometryBase
 from lsst.sims.catUtils.utils import _baseLightCurveCatalog
 from lsst.sims.catUtils.utils import LightCurveGenerator
+from lsst.sims.catUtils.utils import StageTimer
 
 from lsst.sims.catUtils.supernovae import SNObject, SNUniverse
 from lsst.sims.photUtils import PhotometricParameters, calcGamma
 from lsst.sims.photUtils import Sed, calcSNR_m5, BandpassDict
 
-import time
-
 __all__ = ["SNIaLightCurveGenerator"]
 
 
@@ -42,15 +42,39 @@ class SNIaLightCurveGenerator(LightCurveGenerator):
 
     opsimdriver (optional; default 'sqlite') indicates the database driver to
     be used when connecting to opsimdb.
+
+    prefetch_depth (optional; default 0) is the number of chunks of catalog
+    rows to read ahead in a background thread while the current chunk is
+    being processed (see ChunkPrefetcher).  0 means no prefetching.  This
+    requires a database driver that can be read from more than one thread
+    (i.e. not sqlite).
+
+    query_cache (optional) is a QueryResultCache in which to keep the results
+    of the catalog queries, so that regenerating light curves for the same
+    fields does not have to query catalogdb again.  None means no caching.
+
+    metrics (optional) is a LightCurveMetrics hook which records the time
+    spent on each field, chunk, and stage of the light curve generation.
+    If a string is passed, the metrics are appended to the file of that name
+    as JSON lines (see JsonLinesMetrics).  None means no metrics are recorded.
+
+    flux_engine (optional) is a SALT2BandFluxEngine with which to calculate
+    the fluxes of all of the supernovae in a chunk of the catalog at all of
+    the pointings in a bandpass at once, from tables of the bandpass-integrated
+    SALT2 model, rather than integrating the spectrum of each supernova at
+    each pointing.  The fluxes are then interpolated, rather than exact.
+    Supernovae with redshifts outside of the engine's zGrid (e.g. because
+    z_cutoff was raised above it) are still integrated exactly.  Note: the
+    engine applies the CCM MW extinction used by the SN catalogs, whereas the
+    exact integration applies sncosmo's OD94 MW dust.  None means
+    every spectrum is integrated.
     """
 
     def __init__(self, *args, **kwargs):
+        self.flux_engine = kwargs.pop('flux_engine', None)
         self.lsstBandpassDict = BandpassDict.loadTotalBandpassesFromFiles()
         self._lightCurveCatalogClass = _sniaLightCurveCatalog
         self._filter_cat = None
-        self._ax_cache = None
-        self._bx_cache = None
-        self._ax_bx_wavelen = None
         self.phot_params = PhotometricParameters()
         self.sn_universe = SNUniverse()
         self.sn_universe.suppressDimSN = False
@@ -58,8 +82,27 @@ class SNIaLightCurveGenerator(LightCurveGenerator):
         self._brightness_name = 'flux'
         super(SNIaLightCurveGenerator, self).__init__(*args, **kwargs)
 
+    def _run_settings(self):
+        """
+        The settings which change the light curves: the redshift cutoff, and
+        which (if any) SALT2BandFluxEngine calculated the fluxes
+        """
+        if self.flux_engine is None:
+            engine_info = None
+        else:
+            grid_hash = hashlib.md5()
+            grid_hash.update(np.ascontiguousarray(self.flux_engine.zGrid).tobytes())
+            grid_hash.update(np.ascontiguousarray(self.flux_engine.phaseGrid).tobytes())
+            engine_info = {'class': self.flux_engine.__class__.__name__,
+                           'source': str(self.flux_engine.source.name),
+                           'grid': grid_hash.hexdigest()}
+
+        return {'z_cutoff': self.z_cutoff,
+                'flux_engine': engine_info}
+
     def light_curves_from_pointings(self, pointings, chunk_size=100000, lc_per_field=None,
-                                    constraint=None):
+                                    constraint=None, n_workers=1, max_retries=0,
+                                    checkpoint_dir=None):
         if lc_per_field is not None:
             warnings.warn("You have set lc_per_field in the SNIaLightCurveGenerator. "
                           "This will limit the number of candidate galaxies queried from the "
@@ -72,7 +115,10 @@ class SNIaLightCurveGenerator(LightCurveGenerator):
         return LightCurveGenerator.light_curves_from_pointings(self, pointings,
                                                                chunk_size=chunk_size,
                                                                lc_per_field=lc_per_field,
-                                                               constraint=constraint)
+                                                               constraint=constraint,
+                                                               n_workers=n_workers,
+                                                               max_retries=max_retries,
+                                                               checkpoint_dir=checkpoint_dir)
 
     def _get_query_from_group(self, grp, chunk_size, lc_per_field=None, constraint=None):
         """
@@ -92,6 +138,7 @@ class SNIaLightCurveGenerator(LightCurveGenerator):
         t_dict = {}
         gamma_dict = {}
         m5_dict = {}
+        visit_dex_dict = {}
         t_min = None
         t_max = None
         for bp_name in cat_dict:
@@ -107,6 +154,10 @@ class SNIaLightCurveGenerator(LightCurveGenerator):
 
             if len(raw_array) > 0:
 
+                # the indices in grp of the visits in this bandpass
+                visit_dex_dict[bp_name] = np.array([ix for ix, obs in enumerate(grp)
+                                                    if obs.bandpass == bp_name], dtype=int)
+
                 t_dict[bp_name] = raw_array[0]
 
                 m5_dict[bp_name] = raw_array[1]
@@ -129,43 +180,112 @@ class SNIaLightCurveGenerator(LightCurveGenerator):
 
         n_actual_sn = 0  # how many SN have we actually delivered?
 
+        timer = StageTimer()
         for chunk in query_result:
+            timer.lap('fetch')
 
             if lc_per_field is not None and n_actual_sn >= lc_per_field:
                 break
 
-            t_start_chunk = time.time()
-            for sn in cat.iter_catalog(query_cache=[chunk]):
-                sn_rng = self.sn_universe.getSN_rng(sn[1])
-                sn_t0 = self.sn_universe.drawFromT0Dist(sn_rng)
-                if sn[5] <= self.z_cutoff and np.isfinite(sn_t0) and \
-                    sn_t0 < t_max + cat.maxTimeSNVisible and \
-                    sn_t0 > t_min - cat.maxTimeSNVisible:
-
-                    sn_c = self.sn_universe.drawFromcDist(sn_rng)
-                    sn_x1 = self.sn_universe.drawFromx1Dist(sn_rng)
-                    sn_x0 = self.sn_universe.drawFromX0Dist(sn_rng, sn_x1, sn_c, sn[4])
-
-                    snobj.set(t0=sn_t0, c=sn_c, x1=sn_x1, x0=sn_x0, z=sn[5])
-
+            chunk, coverage = self._restrict_to_tile(cat, chunk, grp)
+
+            # Draw t0 for every host in the chunk at once and discard the hosts
+            # whose supernovae do not go off during the pointings in grp (almost
+            # all of them) before doing anything else with them.  Hosts beyond
+            # z_cutoff are discarded, too.
+            if chunk is not None and len(chunk) > 0:
+                cat._set_current_chunk(chunk)
+                host_id = cat.column_by_name('uniqueId')
+                host_t0 = self.sn_universe.SNt0DistFromHost(cat.column_by_name('snid'))
+                host_z = cat.column_by_name('redshift')
+                keep = np.isfinite(host_t0)
+                keep &= host_t0 < t_max + cat.maxTimeSNVisible
+                keep &= host_t0 > t_min - cat.maxTimeSNVisible
+                keep &= host_z <= self.z_cutoff
+                chunk = chunk[keep]
+                host_id = host_id[keep]
+                if coverage is not None:
+                    coverage = coverage[:, keep]
+            timer.lap('filter')
+
+            if chunk is None or len(chunk) == 0:
+                self._record_chunk(chunk, timer)
+                continue
+
+            # draw the rest of the parameters of the supernovae which might be
+            # going off during the pointings in grp
+            sn_rows = list(cat.iter_catalog(query_cache=[chunk]))
+            timer.lap('catalog')
+
+            # the column of coverage belonging to each host (the catalog need
+            # not return a row for every row of chunk, so match on uniqueId)
+            if coverage is not None:
+                coverage_dex = dict((uid, ix) for ix, uid in enumerate(host_id))
+
+            sn_params = self.sn_universe.SNparamDistFromHost(None,
+                                                             np.array([sn[1] for sn in sn_rows]),
+                                                             np.array([sn[4] for sn in sn_rows]))
+            sn_list = [(i_sn, sn, sn_params[i_sn, 3], sn_params[i_sn, 0],
+                        sn_params[i_sn, 1], sn_params[i_sn, 2])
+                       for i_sn, sn in enumerate(sn_rows)]
+            timer.lap('variability')
+
+            # with a flux_engine, calculate the fluxes of all of these supernovae
+            # at all of the pointings in each bandpass at once
+            # (supernovae outside of the redshift range tabulated by the engine
+            # are integrated exactly below)
+            engine_flux_dict = {}
+            in_engine = np.zeros(len(sn_list), dtype=bool)
+            if self.flux_engine is not None and len(sn_list) > 0:
+                sn_params = np.array([[sn_t0, sn_x0, sn_x1, sn_c, sn[5], sn[6]]
+                                      for i_sn, sn, sn_t0, sn_c, sn_x1, sn_x0 in sn_list]).transpose()
+                in_engine = np.logical_and(sn_params[4] >= self.flux_engine.zGrid[0],
+                                           sn_params[4] <= self.flux_engine.zGrid[-1])
+                if in_engine.any():
                     for bp_name in t_dict:
-                        t_list = t_dict[bp_name]
-                        m5_list = m5_dict[bp_name]
-                        gamma_list = gamma_dict[bp_name]
-                        bandpass = self.lsstBandpassDict[bp_name]
-                        if len(t_list) == 0:
-                            continue
-
-                        if snobj.maxtime() >= t_list[0] and snobj.mintime() <= t_list[-1]:
-                            active_dexes = np.where(np.logical_and(t_list >= snobj.mintime(),
-                                                                   t_list <= snobj.maxtime()))
-
-                            t_active = t_list[active_dexes]
-                            m5_active = m5_list[active_dexes]
-                            gamma_active = gamma_list[active_dexes]
-
-                            if len(t_active) > 0:
-
+                        engine_flux_dict[bp_name] = np.zeros((len(sn_list), len(t_dict[bp_name])))
+                        engine_flux_dict[bp_name][in_engine] = \
+                            self.flux_engine.bandFlux(bp_name, t_dict[bp_name][None, :],
+                                                      *[pp[in_engine, None] for pp in sn_params])*3631.0
+                timer.lap('photometry')
+
+            for i_engine, (i_sn, sn, sn_t0, sn_c, sn_x1, sn_x0) in enumerate(sn_list):
+
+                snobj.set(t0=sn_t0, c=sn_c, x1=sn_x1, x0=sn_x0, z=sn[5])
+
+                for bp_name in t_dict:
+                    use_engine = bp_name in engine_flux_dict and in_engine[i_engine]
+                    t_list = t_dict[bp_name]
+                    m5_list = m5_dict[bp_name]
+                    gamma_list = gamma_dict[bp_name]
+                    if use_engine:
+                        engine_flux_list = engine_flux_dict[bp_name][i_engine]
+                    if coverage is not None:
+                        # only keep the visits whose footprints contain this SN
+                        covered = coverage[grp.visit_pointing[visit_dex_dict[bp_name]],
+                                           coverage_dex[sn[0]]]
+                        t_list = t_list[covered]
+                        m5_list = m5_list[covered]
+                        gamma_list = gamma_list[covered]
+                        if use_engine:
+                            engine_flux_list = engine_flux_list[covered]
+                    bandpass = self.lsstBandpassDict[bp_name]
+                    if len(t_list) == 0:
+                        continue
+
+                    if snobj.maxtime() >= t_list[0] and snobj.mintime() <= t_list[-1]:
+                        active_dexes = np.where(np.logical_and(t_list >= snobj.mintime(),
+                                                               t_list <= snobj.maxtime()))
+
+                        t_active = t_list[active_dexes]
+                        m5_active = m5_list[active_dexes]
+                        gamma_active = gamma_list[active_dexes]
+
+                        if len(t_active) > 0:
+
+                            if use_engine:
+                                flux_list = engine_flux_list[active_dexes]
+                            else:
                                 wave_ang = bandpass.wavelen*10.0
                                 mask = np.logical_and(wave_ang > snobj.minwave(),
                                                       wave_ang < snobj.maxwave())
@@ -184,45 +304,37 @@ class SNIaLightCurveGenerator(LightCurveGenerator):
                                 flux_list = \
                                 (fnu_grid*bandpass.phi).sum(axis=1)*(bandpass.wavelen[1]-bandpass.wavelen[0])
 
-                                acceptable = np.where(flux_list>0.0)
-
-                                flux_error_list = flux_list[acceptable]/ \
-                                                  calcSNR_m5(dummy_sed.magFromFlux(flux_list[acceptable]),
-                                                             bandpass,
-                                                             m5_active[acceptable], self.phot_params,
-                                                             gamma=gamma_active[acceptable])
-
-                                if len(acceptable) > 0:
-
-                                    n_actual_sn += 1
-                                    if lc_per_field is not None and n_actual_sn > lc_per_field:
-                                        break
-
-                                    if sn[0] not in self.truth_dict:
-                                        self.truth_dict[sn[0]] = {}
-                                        self.truth_dict[sn[0]]['t0'] = sn_t0
-                                        self.truth_dict[sn[0]]['x1'] = sn_x1
-                                        self.truth_dict[sn[0]]['x0'] = sn_x0
-                                        self.truth_dict[sn[0]]['c'] = sn_c
-                                        self.truth_dict[sn[0]]['z'] = sn[5]
-                                        self.truth_dict[sn[0]]['E(B-V)'] = sn[6]
-
-                                    if sn[0] not in self.mjd_dict:
-                                        self.mjd_dict[sn[0]] = {}
-                                        self.bright_dict[sn[0]] = {}
-                                        self.sig_dict[sn[0]] = {}
-
-                                    if bp_name not in self.mjd_dict[sn[0]]:
-                                        self.mjd_dict[sn[0]][bp_name] = []
-                                        self.bright_dict[sn[0]][bp_name] = []
-                                        self.sig_dict[sn[0]][bp_name] = []
-
-                                for tt, ff, ee in zip(t_active[acceptable], flux_list[acceptable],
-                                                      flux_error_list[0]):
-
-                                    self.mjd_dict[sn[0]][bp_name].append(tt)
-                                    self.bright_dict[sn[0]][bp_name].append(ff/3631.0)
-                                    self.sig_dict[sn[0]][bp_name].append(ee/3631.0)
-
-            print("chunk of ", len(chunk), " took ", time.time()-t_start_chunk)
+                            acceptable = np.where(flux_list>0.0)
+                            timer.lap('photometry')
+
+                            flux_error_list = flux_list[acceptable]/ \
+                                              calcSNR_m5(dummy_sed.magFromFlux(flux_list[acceptable]),
+                                                         bandpass,
+                                                         m5_active[acceptable], self.phot_params,
+                                                         gamma=gamma_active[acceptable])
+                            timer.lap('uncertainty')
+
+                            if len(acceptable) > 0:
+
+                                n_actual_sn += 1
+                                if lc_per_field is not None and n_actual_sn > lc_per_field:
+                                    break
+
+                                if sn[0] not in self.truth_dict:
+                                    self.truth_dict[sn[0]] = {}
+                                    self.truth_dict[sn[0]]['t0'] = sn_t0
+                                    self.truth_dict[sn[0]]['x1'] = sn_x1
+                                    self.truth_dict[sn[0]]['x0'] = sn_x0
+                                    self.truth_dict[sn[0]]['c'] = sn_c
+                                    self.truth_dict[sn[0]]['z'] = sn[5]
+                                    self.truth_dict[sn[0]]['E(B-V)'] = sn[6]
+
+                            self._accumulator.append(np.repeat(sn[0], len(t_active[acceptable])),
+                                                     bp_name,
+                                                     t_active[acceptable],
+                                                     flux_list[acceptable]/3631.0,
+                                                     flux_error_list[0]/3631.0)
+                            timer.lap('accumulation')
+
+            self._record_chunk(chunk, timer)
 
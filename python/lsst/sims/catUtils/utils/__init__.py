@@ -1,7 +1,15 @@
 from .CatalogSetupFunctions import *
+from .PointingTable import *
+from .OpSimSummaryIndex import *
 from .ObservationMetaDataGenerator import *
 from .testUtils import *
 from .DBobjectTestUtils import *
 from .CatalogTestUtils import *
+from .LightCurveAccumulator import *
+from .LightCurveStore import *
+from .ChunkPrefetcher import *
+from .LightCurveMetrics import *
+from .QueryResultCache import *
 from .LightCurveGenerator import *
 from .SNIaLightCurveGenerator import *
+from .LightCurveBenchmark import *
@@ -0,0 +1,63 @@
+"""
+Benchmark the throughput of the LightCurveGenerators on synthetic sqlite
+databases of stars, galaxies, and OpSim visits (see
+lsst.sims.catUtils.utils.runLightCurveBenchmark).  Nothing is read over the
+network, so this can be run as part of nightly performance tracking, e.g.
+
+python benchmark_light_curves.py --n_objects 1000 10000 --n_visits 100 1000 \
+    --output lc_benchmark.txt
+"""
+
+from __future__ import print_function
+import argparse
+import tempfile
+import shutil
+
+from lsst.sims.catUtils.utils import runLightCurveBenchmark
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the LightCurveGenerators")
+    parser.add_argument('--n_objects', type=int, nargs='+', default=[1000, 10000],
+                        help='numbers of objects in the catalog database')
+    parser.add_argument('--n_visits', type=int, nargs='+', default=[100, 1000],
+                        help='numbers of visits in the OpSim database')
+    parser.add_argument('--n_fields', type=int, default=4,
+                        help='number of distinct fields among which the visits are divided')
+    parser.add_argument('--generators', type=str, nargs='+',
+                        default=['StellarLightCurveGenerator', 'FastStellarLightCurveGenerator',
+                                 'AgnLightCurveGenerator', 'FastAgnLightCurveGenerator'],
+                        help='the LightCurveGenerator classes to benchmark')
+    parser.add_argument('--chunk_size', type=int, default=10000,
+                        help='number of database rows to process at once')
+    parser.add_argument('--output', type=str, default=None,
+                        help='file to which the results are appended as JSON lines')
+    parser.add_argument('--scratch_dir', type=str, default=None,
+                        help='directory in which to write the databases '
+                             '(defaults to a temporary directory)')
+    args = parser.parse_args()
+
+    if args.scratch_dir is None:
+        scratch_dir = tempfile.mkdtemp(prefix='lc_benchmark_')
+    else:
+        scratch_dir = args.scratch_dir
+
+    try:
+        results = runLightCurveBenchmark(scratch_dir, n_objects_list=args.n_objects,
+                                         n_visits_list=args.n_visits,
+                                         generator_names=args.generators,
+                                         n_fields=args.n_fields, chunk_size=args.chunk_size,
+                                         output=args.output)
+    finally:
+        if args.scratch_dir is None:
+            shutil.rmtree(scratch_dir)
+
+    print('%32s %10s %10s %14s %10s %16s %12s' % ('generator', 'n_objects', 'n_visits',
+                                                  'n_measurements', 'time (s)',
+                                                  'obj*visits/s', 'peak RSS (MB)'))
+    for result in results:
+        print('%32s %10d %10d %14d %10.2f %16.1f %12.1f' %
+              (result['generator'], result['n_objects'], result['n_visits'],
+               result['n_measurements'], result['time'],
+               result['object_visits_per_second'] or 0.0, result['peak_rss_mb'] or 0.0))
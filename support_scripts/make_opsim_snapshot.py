@@ -0,0 +1,36 @@
+"""
+Convert the Summary table of an OpSim database into a snapshot directory of
+memory-mappable .npy files (one per column, plus the indexes used to query
+them; see ObservationMetaDataGenerator.writeSnapshot()).  Run this once per
+database, e.g.
+
+python make_opsim_snapshot.py --database minion_1016_sqlite.db \
+    --snapshot minion_1016_snapshot
+
+and construct ObservationMetaDataGenerator(snapshot='minion_1016_snapshot')
+in the processes that need the pointings.
+"""
+
+from __future__ import print_function
+import argparse
+import time
+
+from lsst.sims.catUtils.utils import ObservationMetaDataGenerator
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Write a snapshot of an OpSim database")
+    parser.add_argument('--database', type=str, required=True,
+                        help='the OpSim database')
+    parser.add_argument('--snapshot', type=str, required=True,
+                        help='the directory to which to write the snapshot')
+    parser.add_argument('--driver', type=str, default='sqlite',
+                        help='the driver of the OpSim database')
+    args = parser.parse_args()
+
+    t_start = time.time()
+    gen = ObservationMetaDataGenerator(database=args.database, driver=args.driver)
+    gen.writeSnapshot(args.snapshot)
+    print('wrote %d pointings to %s in %.1f seconds' %
+          (len(gen.summaryIndex), args.snapshot, time.time()-t_start))
@@ -0,0 +1,83 @@
+from builtins import range
+import unittest
+import time
+import numpy as np
+
+import lsst.utils.tests
+from lsst.sims.catUtils.utils import ChunkPrefetcher
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class ChunkPrefetcherTest(unittest.TestCase):
+
+    def test_chunks(self):
+        """
+        Test that the ChunkPrefetcher returns the same chunks, in the same order,
+        as the iterator it wraps, and never reads more than depth chunks ahead
+        """
+        fetched = []
+
+        def chunk_generator():
+            for ix in range(20):
+                fetched.append(ix)
+                yield np.arange(ix, ix+5)
+
+        prefetcher = ChunkPrefetcher(chunk_generator(), depth=3)
+        time.sleep(0.2)
+        # depth chunks on the queue plus one waiting to be put there
+        self.assertLessEqual(len(fetched), 4)
+
+        for ix, chunk in enumerate(prefetcher):
+            np.testing.assert_array_equal(chunk, np.arange(ix, ix+5))
+        self.assertEqual(ix, 19)
+        self.assertFalse(prefetcher._thread.is_alive())
+        self.assertEqual(list(prefetcher), [])
+
+    def test_early_close(self):
+        """
+        Test that the background thread exits if the consumer stops early
+        """
+        def chunk_generator():
+            ix = 0
+            while True:
+                ix += 1
+                yield ix
+
+        with ChunkPrefetcher(chunk_generator(), depth=2) as prefetcher:
+            for chunk in prefetcher:
+                if chunk == 5:
+                    break
+
+        self.assertFalse(prefetcher._thread.is_alive())
+
+    def test_exception(self):
+        """
+        Test that an exception raised while fetching is raised by the consumer
+        """
+        def chunk_generator():
+            yield 1
+            yield 2
+            raise ValueError("database went away")
+
+        prefetcher = ChunkPrefetcher(chunk_generator())
+        chunk_list = []
+        with self.assertRaises(ValueError):
+            for chunk in prefetcher:
+                chunk_list.append(chunk)
+        self.assertEqual(chunk_list, [1, 2])
+        self.assertFalse(prefetcher._thread.is_alive())
+
+        with self.assertRaises(RuntimeError):
+            ChunkPrefetcher(chunk_generator(), depth=0)
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -166,6 +166,51 @@ class FastStellar_stellar_lc_gen_case(unittest.TestCase):
         for obj_id in fast_truth:
             self.assertEqual(fast_truth[obj_id], slow_truth[obj_id])
 
+        # generating the fast light curves on sky tiles should not change them
+        tiled_lc, tiled_truth = lc_fast.light_curves_from_pointings(lc_fast.tile_pointings(ptngs),
+                                                                    chunk_size=10)
+        self.assertEqual(tiled_truth, fast_truth)
+        self.assertEqual(len(tiled_lc), len(fast_lc))
+        for obj_id in fast_lc:
+            self.assertEqual(len(tiled_lc[obj_id]), len(fast_lc[obj_id]))
+            for bp in fast_lc[obj_id]:
+                for data_key in fast_lc[obj_id][bp]:
+                    np.testing.assert_array_almost_equal(tiled_lc[obj_id][bp][data_key],
+                                                         fast_lc[obj_id][bp][data_key], 10)
+
+    def test_fast_stellar_lc_gen_tile_pairs(self):
+        """
+        Test that, on sky tiles, only the (object, visit) pairs in which the
+        visit's footprint covers the object are evaluated
+        """
+
+        class CountingStellarLightCurveGenerator(FastStellarLightCurveGenerator):
+
+            n_pairs = 0
+
+            def _uncertainty_grid(self, cat, bp, mag_grid, m5_arr, gamma_arr):
+                self.n_pairs += mag_grid.size
+                return FastStellarLightCurveGenerator._uncertainty_grid(self, cat, bp, mag_grid,
+                                                                        m5_arr, gamma_arr)
+
+        lc_gen = CountingStellarLightCurveGenerator(self.stellar_db, self.opsimDb)
+        lc_gen._lightCurveCatalogClass._mlt_lc_file = self.mlt_lc_file_name
+        ptngs = lc_gen.get_pointings((68.0, 95.0), (-69.0, -55.0), bandpass=('r', 'g'))
+        tiles = lc_gen.tile_pointings(ptngs)
+        self.assertGreater(len(tiles), len(ptngs))
+
+        tiled_lc, tiled_truth = lc_gen.light_curves_from_pointings(tiles, chunk_size=10)
+        self.assertEqual(len(tiled_truth), self.n_stars)
+
+        # every star has a finite magnitude, so each evaluated pair
+        # yields exactly one point on a light curve
+        n_points = 0
+        for obj_id in tiled_lc:
+            for bp in tiled_lc[obj_id]:
+                n_points += len(tiled_lc[obj_id][bp]['mjd'])
+        self.assertGreater(n_points, 0)
+        self.assertEqual(lc_gen.n_pairs, n_points)
+
 
 class Fast_agn_lc_gen_test_case(unittest.TestCase):
 
@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+
+import lsst.utils.tests
+from lsst.sims.catUtils.utils import LightCurveAccumulator
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class LightCurveAccumulatorTest(unittest.TestCase):
+
+    def test_light_curves(self):
+        """
+        Append measurements in a random order (and across several buffer
+        reallocations) and verify that the light curves come back sorted
+        by MJD and grouped by object and bandpass.
+        """
+        rng = np.random.RandomState(81)
+        n_obj = 50
+        n_visit = 40
+
+        control = {}
+        accumulator = LightCurveAccumulator(initial_size=7)
+
+        mjd_list = rng.random_sample(n_visit)*1000.0 + 59580.0
+        band_list = rng.choice(['u', 'g', 'r'], size=n_visit)
+        for mjd, bp in zip(mjd_list, band_list):
+            id_list = rng.choice(np.arange(n_obj), size=20, replace=False)
+            mag_list = rng.random_sample(20)*5.0 + 18.0
+            sig_list = rng.random_sample(20)*0.1
+            accumulator.append(id_list, bp, mjd, mag_list, sig_list)
+            for ii, mm, ss in zip(id_list, mag_list, sig_list):
+                if ii not in control:
+                    control[ii] = {}
+                if bp not in control[ii]:
+                    control[ii][bp] = []
+                control[ii][bp].append((mjd, mm, ss))
+
+        self.assertEqual(len(accumulator), 20*n_visit)
+
+        output = accumulator.to_dict(brightness_name='mag')
+        self.assertEqual(len(output), len(control))
+        for obj_id in control:
+            self.assertEqual(len(output[obj_id]), len(control[obj_id]))
+            for bp in control[obj_id]:
+                data = np.array(sorted(control[obj_id][bp]))
+                np.testing.assert_array_equal(output[obj_id][bp]['mjd'], data[:, 0])
+                np.testing.assert_array_equal(output[obj_id][bp]['mag'], data[:, 1])
+                np.testing.assert_array_equal(output[obj_id][bp]['error'], data[:, 2])
+
+        np.testing.assert_array_equal(accumulator.unique_ids, np.sort(list(control.keys())))
+
+    def test_views(self):
+        """
+        Test that the light curves are views into the sorted columns
+        rather than copies
+        """
+        accumulator = LightCurveAccumulator()
+        accumulator.append(np.array([3, 1, 3]), np.array(['g', 'r', 'g']),
+                           np.array([5.0, 4.0, 2.0]), np.array([20.0, 21.0, 22.0]),
+                           np.array([0.1, 0.2, 0.3]))
+
+        lc = accumulator.light_curve(3, brightness_name='flux')
+        np.testing.assert_array_equal(lc['g']['mjd'], [2.0, 5.0])
+        np.testing.assert_array_equal(lc['g']['flux'], [22.0, 20.0])
+        self.assertIsNotNone(lc['g']['mjd'].base)
+
+        columns = accumulator.columns
+        np.testing.assert_array_equal(columns['uniqueId'], [1, 3, 3])
+        np.testing.assert_array_equal(columns['bandpass'], ['r', 'g', 'g'])
+
+    def test_empty(self):
+        accumulator = LightCurveAccumulator()
+        accumulator.append(np.array([], dtype=int), 'u', 5.0, np.array([]), np.array([]))
+        self.assertEqual(len(accumulator), 0)
+        self.assertEqual(accumulator.to_dict(), {})
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+import lsst.utils.tests
+from lsst.utils import getPackageDir
+from lsst.sims.utils.CodeUtilities import sims_clean_up
+from lsst.sims.catUtils.utils import ObservationMetaDataGenerator
+from lsst.sims.catUtils.utils import makeOpSimSummaryDatabase, runLightCurveBenchmark
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class LightCurveBenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        scratch_space = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace')
+        self.scratch_dir = tempfile.mkdtemp(dir=scratch_space, prefix='lc_benchmark_')
+
+    def tearDown(self):
+        sims_clean_up()
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def test_opsim_summary(self):
+        """
+        Test that the synthetic OpSim database can be read by the
+        ObservationMetaDataGenerator
+        """
+        db_name = os.path.join(self.scratch_dir, 'opsim.db')
+        makeOpSimSummaryDatabase(filename=db_name, n_visits=30, n_fields=3)
+        gen = ObservationMetaDataGenerator(database=db_name)
+        obs_list = gen.getObservationMetaData(fieldRA=(0.0, 360.0), fieldDec=(-90.0, 90.0))
+        self.assertEqual(len(obs_list), 30)
+        self.assertEqual(len(set((obs.pointingRA, obs.pointingDec) for obs in obs_list)), 3)
+        for obs in obs_list:
+            self.assertIn(obs.bandpass, ('u', 'g', 'r', 'i', 'z', 'y'))
+            self.assertGreater(obs.m5[obs.bandpass], 20.0)
+        del gen
+
+    def test_benchmark(self):
+        """
+        Test that the benchmark runs and that the slow and fast generators
+        photometer the same object-visit pairs
+        """
+        output_name = os.path.join(self.scratch_dir, 'benchmark.txt')
+        results = runLightCurveBenchmark(self.scratch_dir, n_objects_list=(20,),
+                                         n_visits_list=(6, 12),
+                                         generator_names=('StellarLightCurveGenerator',
+                                                          'FastStellarLightCurveGenerator'),
+                                         n_fields=2, output=output_name)
+
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertEqual(result['n_objects'], 20)
+            self.assertEqual(result['n_fields'], 2)
+            self.assertGreater(result['n_measurements'], 0)
+            self.assertLessEqual(result['n_measurements'], result['n_objects']*result['n_visits'])
+            self.assertGreater(result['object_visits_per_second'], 0.0)
+            self.assertGreater(result['peak_rss_mb'], 0.0)
+
+        for ix in (0, 2):
+            self.assertEqual(results[ix]['generator'], 'StellarLightCurveGenerator')
+            self.assertEqual(results[ix+1]['generator'], 'FastStellarLightCurveGenerator')
+            self.assertEqual(results[ix]['n_measurements'], results[ix+1]['n_measurements'])
+            self.assertEqual(results[ix]['n_light_curves'], results[ix+1]['n_light_curves'])
+
+        with open(output_name, 'r') as input_file:
+            lines = [json.loads(line) for line in input_file]
+        self.assertEqual([line['event'] for line in lines], ['benchmark']*4)
+        np.testing.assert_array_equal([line['n_measurements'] for line in lines],
+                                      [result['n_measurements'] for result in results])
+
+        # the databases are cleaned up
+        self.assertEqual(os.listdir(self.scratch_dir), ['benchmark.txt'])
+
+        with self.assertRaises(RuntimeError):
+            runLightCurveBenchmark(self.scratch_dir, generator_names=('NotAGenerator',))
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -3,6 +3,7 @@ from builtins import zip
 from builtins import range
 import unittest
 import os
+import shutil
 import json
 import sqlite3
 import numpy as np
@@ -153,6 +154,17 @@ class StellarLightCurveTest(unittest.TestCase):
                 if ix > 0:
                     self.assertGreater(obs.mjd.TAI, group[ix-1].mjd.TAI)
 
+        # make sure that no two groups point to the same patch of sky
+        # and that every pointing was assigned to a group
+        centers = set([(group[0].pointingRA, group[0].pointingDec) for group in pointings])
+        self.assertEqual(len(centers), len(pointings))
+
+        obs_list = lc_gen._generator.getObservationMetaData(fieldRA=raRange,
+                                                            fieldDec=decRange,
+                                                            telescopeFilter=bandpass,
+                                                            boundLength=1.75)
+        self.assertEqual(sum([len(group) for group in pointings]), len(obs_list))
+
     def test_get_pointings_multiband(self):
         """
         Test that the get_pointings method does, in fact, return ObservationMetaData
@@ -288,6 +300,265 @@ class StellarLightCurveTest(unittest.TestCase):
         self.assertGreater(len(control_light_curves), len(test_light_curves))
         self.assertEqual(len(test_light_curves), lc_limit)
 
+    def test_parallel_stellar_light_curves(self):
+        """
+        Test that distributing the pointing groups over several processes
+        gives the same light curves as generating them serially
+        """
+
+        raRange = (78.0, 89.0)
+        decRange = (-74.0, -60.0)
+        bandpass = 'g'
+
+        lc_gen = StellarLightCurveGenerator(self.stellar_db, self.opsimDb)
+        pointings = lc_gen.get_pointings(raRange, decRange, bandpass=bandpass)
+        self.assertGreater(len(pointings), 1)
+
+        control_light_curves, control_truth = lc_gen.light_curves_from_pointings(pointings)
+        test_light_curves, test_truth = lc_gen.light_curves_from_pointings(pointings, n_workers=2)
+
+        self.assertEqual(len(lc_gen.field_times), len(pointings))
+        np.testing.assert_array_equal(lc_gen.field_attempts, np.ones(len(pointings), dtype=int))
+        self.assertEqual(control_truth, test_truth)
+        self.assertEqual(set(control_light_curves.keys()), set(test_light_curves.keys()))
+        for obj_id in control_light_curves:
+            self.assertEqual(set(control_light_curves[obj_id].keys()),
+                             set(test_light_curves[obj_id].keys()))
+            for bp in control_light_curves[obj_id]:
+                for col in ('mjd', 'mag', 'error'):
+                    np.testing.assert_array_equal(control_light_curves[obj_id][bp][col],
+                                                  test_light_curves[obj_id][bp][col])
+
+    def test_field_retries(self):
+        """
+        Test that a field which fails once is retried when max_retries > 0,
+        both serially and in worker processes, and that the failure is
+        reported when max_retries is 0
+        """
+
+        class FlakyLightCurveGenerator(StellarLightCurveGenerator):
+            """
+            Fails the first attempt at the field labeled flaky_field
+            """
+            flaky_field = 1
+
+            def _light_curves_from_group(self, *args, **kwargs):
+                if self._field_id == self.flaky_field and not getattr(self, '_has_failed', False):
+                    self._has_failed = True
+                    raise RuntimeError("simulated failure of field %d" % self._field_id)
+                return super(FlakyLightCurveGenerator, self)._light_curves_from_group(*args,
+                                                                                      **kwargs)
+
+        raRange = (78.0, 89.0)
+        decRange = (-74.0, -60.0)
+        bandpass = 'g'
+
+        lc_gen = StellarLightCurveGenerator(self.stellar_db, self.opsimDb)
+        pointings = lc_gen.get_pointings(raRange, decRange, bandpass=bandpass)
+        self.assertGreater(len(pointings), 2)
+        control_light_curves, control_truth = lc_gen.light_curves_from_pointings(pointings)
+
+        expected_attempts = np.ones(len(pointings), dtype=int)
+        expected_attempts[FlakyLightCurveGenerator.flaky_field] = 2
+
+        for n_workers in (1, 2):
+            flaky_gen = FlakyLightCurveGenerator(self.stellar_db, self.opsimDb)
+            test_light_curves, test_truth = flaky_gen.light_curves_from_pointings(pointings,
+                                                                                  n_workers=n_workers,
+                                                                                  max_retries=1)
+            np.testing.assert_array_equal(flaky_gen.field_attempts, expected_attempts)
+            self.assertEqual(control_truth, test_truth)
+            self.assertEqual(set(control_light_curves.keys()), set(test_light_curves.keys()))
+            for obj_id in control_light_curves:
+                for bp in control_light_curves[obj_id]:
+                    for col in ('mjd', 'mag', 'error'):
+                        np.testing.assert_array_equal(control_light_curves[obj_id][bp][col],
+                                                      test_light_curves[obj_id][bp][col])
+
+            flaky_gen = FlakyLightCurveGenerator(self.stellar_db, self.opsimDb)
+            with self.assertRaises(RuntimeError) as context:
+                flaky_gen.light_curves_from_pointings(pointings, n_workers=n_workers,
+                                                      max_retries=0)
+            self.assertIn("simulated failure of field 1", context.exception.args[0])
+
+    def test_tiled_stellar_light_curves(self):
+        """
+        Test that generating light curves on sky tiles, rather than on
+        (overlapping) fields, gives the same light curves
+        """
+
+        raRange = (78.0, 89.0)
+        decRange = (-74.0, -60.0)
+        bandpass = ('g', 'r')
+
+        lc_gen = StellarLightCurveGenerator(self.stellar_db, self.opsimDb)
+        pointings = lc_gen.get_pointings(raRange, decRange, bandpass=bandpass)
+        control_light_curves, control_truth = lc_gen.light_curves_from_pointings(pointings)
+        self.assertGreater(len(control_light_curves), 10)
+
+        tiles = lc_gen.tile_pointings(pointings, tile_size=1.0)
+        self.assertGreater(len(tiles), len(pointings))
+        self.assertEqual(sum([len(grp) for grp in pointings]),
+                         len(set([id(obs) for grp in tiles for obs in grp])))
+
+        test_light_curves, test_truth = lc_gen.light_curves_from_pointings(tiles)
+
+        self.assertEqual(control_truth, test_truth)
+        self.assertEqual(set(control_light_curves.keys()), set(test_light_curves.keys()))
+        for obj_id in control_light_curves:
+            self.assertEqual(set(control_light_curves[obj_id].keys()),
+                             set(test_light_curves[obj_id].keys()))
+            for bp in control_light_curves[obj_id]:
+                for col in ('mjd', 'mag', 'error'):
+                    np.testing.assert_array_almost_equal(control_light_curves[obj_id][bp][col],
+                                                         test_light_curves[obj_id][bp][col], 10)
+
+        # lc_per_field would be applied per tile, not per field of view
+        with self.assertRaises(RuntimeError) as context:
+            lc_gen.light_curves_from_pointings(tiles, lc_per_field=2)
+        self.assertIn("tile_pointings", context.exception.args[0])
+
+        dirname = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace',
+                               'tiled_lc_per_field_test')
+        with self.assertRaises(RuntimeError):
+            lc_gen.write_light_curves(tiles, dirname, lc_per_field=2)
+        self.assertFalse(os.path.exists(dirname))
+
+    def test_write_stellar_light_curves(self):
+        """
+        Test that the light curves written to disk one field at a time are
+        the same as those returned by light_curves_from_pointings
+        """
+
+        raRange = (78.0, 89.0)
+        decRange = (-74.0, -60.0)
+        bandpass = ('g', 'r')
+
+        lc_gen = StellarLightCurveGenerator(self.stellar_db, self.opsimDb)
+        pointings = lc_gen.get_pointings(raRange, decRange, bandpass=bandpass)
+
+        control_light_curves, control_truth = lc_gen.light_curves_from_pointings(pointings)
+
+        scratch_dir = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace',
+                                   'lc_gen_write_test')
+        if os.path.exists(scratch_dir):
+            shutil.rmtree(scratch_dir)
+
+        reader = lc_gen.write_light_curves(pointings, scratch_dir)
+        self.assertEqual(len(reader), len(control_light_curves))
+        for obj_id, lc in reader:
+            self.assertEqual(set(lc.keys()), set(control_light_curves[obj_id].keys()))
+            for bp in lc:
+                for col in ('mjd', 'mag', 'error'):
+                    np.testing.assert_array_equal(lc[bp][col], control_light_curves[obj_id][bp][col])
+            self.assertEqual(reader.truth(obj_id), control_truth[obj_id])
+
+        shutil.rmtree(scratch_dir)
+
+    def test_checkpoint_resume(self):
+        """
+        Test that light_curves_from_pointings resumes from a checkpoint
+        directory, only regenerating the groups that were not recorded
+        """
+
+        raRange = (78.0, 89.0)
+        decRange = (-74.0, -60.0)
+        bandpass = 'g'
+
+        lc_gen = StellarLightCurveGenerator(self.stellar_db, self.opsimDb)
+        pointings = lc_gen.get_pointings(raRange, decRange, bandpass=bandpass)
+        self.assertGreater(len(pointings), 1)
+
+        control_light_curves, control_truth = lc_gen.light_curves_from_pointings(pointings)
+
+        scratch_dir = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace',
+                                   'lc_gen_checkpoint_test')
+        if os.path.exists(scratch_dir):
+            shutil.rmtree(scratch_dir)
+
+        lc_gen.light_curves_from_pointings(pointings, checkpoint_dir=scratch_dir)
+
+        # simulate a run that was interrupted before the last group was recorded
+        manifest_name = os.path.join(scratch_dir, 'manifest.json')
+        with open(manifest_name, 'r') as input_file:
+            manifest = json.load(input_file)
+        manifest['batches'] = manifest['batches'][:-1]
+        with open(manifest_name, 'w') as output_file:
+            json.dump(manifest, output_file)
+
+        test_light_curves, test_truth = lc_gen.light_curves_from_pointings(pointings,
+                                                                           checkpoint_dir=scratch_dir)
+
+        np.testing.assert_array_equal(lc_gen.field_attempts[:-1], np.zeros(len(pointings)-1, dtype=int))
+        self.assertEqual(lc_gen.field_attempts[-1], 1)
+        self.assertGreater(lc_gen.checkpoint_times[-1], 0.0)
+
+        self.assertEqual(control_truth, test_truth)
+        self.assertEqual(set(control_light_curves.keys()), set(test_light_curves.keys()))
+        for obj_id in control_light_curves:
+            for bp in control_light_curves[obj_id]:
+                for col in ('mjd', 'mag', 'error'):
+                    np.testing.assert_array_equal(control_light_curves[obj_id][bp][col],
+                                                  test_light_curves[obj_id][bp][col])
+
+        # a different run should not be able to use the same directory
+        with self.assertRaises(RuntimeError):
+            lc_gen.light_curves_from_pointings(pointings, checkpoint_dir=scratch_dir, lc_per_field=2)
+
+        # nor should a run whose pointings have different m5
+        pointings[0][0].m5 = pointings[0][0].m5[bandpass] + 0.1
+        with self.assertRaises(RuntimeError):
+            lc_gen.light_curves_from_pointings(pointings, checkpoint_dir=scratch_dir)
+
+        shutil.rmtree(scratch_dir)
+
+    def test_metrics(self):
+        """
+        Test that the LightCurveGenerator reports its progress as JSON lines
+        """
+
+        raRange = (78.0, 89.0)
+        decRange = (-74.0, -60.0)
+        bandpass = ('g', 'r')
+
+        metrics_name = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace',
+                                    'lc_gen_metrics_test.txt')
+        if os.path.exists(metrics_name):
+            os.unlink(metrics_name)
+
+        lc_gen = StellarLightCurveGenerator(self.stellar_db, self.opsimDb, metrics=metrics_name)
+        pointings = lc_gen.get_pointings(raRange, decRange, bandpass=bandpass)
+        light_curves, truth = lc_gen.light_curves_from_pointings(pointings, chunk_size=5)
+
+        with open(metrics_name, 'r') as input_file:
+            event_list = [json.loads(line) for line in input_file]
+
+        event_dict = {}
+        for event in event_list:
+            event_dict.setdefault(event['event'], []).append(event)
+
+        self.assertEqual(len(event_dict['pointings']), 1)
+        self.assertEqual(event_dict['pointings'][0]['n_groups'], len(pointings))
+        self.assertEqual(len(event_dict['query']), len(pointings))
+        self.assertEqual([event['field'] for event in event_dict['field']],
+                         list(range(len(pointings))))
+        self.assertEqual(len(event_dict['run']), 1)
+        self.assertGreater(event_dict['run'][0]['peak_rss_mb'], 0.0)
+
+        for field in event_dict['field']:
+            self.assertTrue(field['succeeded'])
+            self.assertEqual(field['n_visits'], len(pointings[field['field']]))
+            chunk_list = [event for event in event_dict['chunk'] if event['field'] == field['field']]
+            self.assertGreater(len(chunk_list), 0)
+            self.assertEqual(field['rows'], sum(chunk['rows'] for chunk in chunk_list))
+            for chunk in chunk_list:
+                self.assertLessEqual(chunk['rows'], 5)
+                for stage in ('fetch', 'filter', 'catalog', 'accumulation'):
+                    self.assertGreaterEqual(chunk[stage], 0.0)
+                    self.assertLessEqual(chunk[stage], chunk['wall_time'])
+
+        os.unlink(metrics_name)
+
     def test_date_range(self):
         """
         Run test_stellar_light_curves, this time specifying a range in MJD.
@@ -0,0 +1,95 @@
+import unittest
+import os
+import json
+import time
+import numpy as np
+
+import lsst.utils.tests
+from lsst.utils import getPackageDir
+from lsst.sims.catUtils.utils import JsonLinesMetrics, StageTimer, peak_rss_mb
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class LightCurveMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.file_name = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace',
+                                      'lc_metrics_test.txt')
+        if os.path.exists(self.file_name):
+            os.unlink(self.file_name)
+
+    def tearDown(self):
+        if os.path.exists(self.file_name):
+            os.unlink(self.file_name)
+
+    def test_json_lines(self):
+        """
+        Test that JsonLinesMetrics writes one line of JSON per event,
+        including numpy values
+        """
+        metrics = JsonLinesMetrics(self.file_name)
+        metrics.record('chunk', field=np.int64(3), rows=10, fetch=np.float64(0.5))
+        metrics.record('field', field=3, succeeded=True, peak_rss_mb=None,
+                       n_visits=np.array([1, 2]))
+
+        with open(self.file_name, 'r') as input_file:
+            lines = input_file.readlines()
+        self.assertEqual(len(lines), 2)
+
+        event = json.loads(lines[0])
+        self.assertEqual(event['event'], 'chunk')
+        self.assertEqual(event['field'], 3)
+        self.assertEqual(event['rows'], 10)
+        self.assertAlmostEqual(event['fetch'], 0.5, 10)
+        self.assertEqual(event['pid'], os.getpid())
+        self.assertLessEqual(event['timestamp'], time.time())
+
+        event = json.loads(lines[1])
+        self.assertEqual(event['event'], 'field')
+        self.assertTrue(event['succeeded'])
+        self.assertIsNone(event['peak_rss_mb'])
+        self.assertEqual(event['n_visits'], [1, 2])
+
+    def test_stage_timer(self):
+        """
+        Test that StageTimer accumulates the time spent in each stage
+        """
+        timer = StageTimer()
+        for ix in range(2):
+            time.sleep(0.01)
+            timer.lap('a')
+            time.sleep(0.02)
+            timer.lap('b')
+        times = timer.split()
+        self.assertGreaterEqual(times['a'], 0.02)
+        self.assertGreaterEqual(times['b'], 0.04)
+        self.assertGreater(times['b'], times['a'])
+        self.assertGreaterEqual(times['wall_time'], times['a'] + times['b'])
+
+        timer.lap('c')
+        times = timer.split()
+        self.assertEqual(set(times.keys()), set(['c', 'wall_time']))
+        self.assertLess(times['c'], 0.01)
+
+    def test_peak_rss(self):
+        """
+        Test that peak_rss_mb does not decrease and notices a large array
+        """
+        rss_before = peak_rss_mb()
+        self.assertGreater(rss_before, 0.0)
+        big_array = np.ones(50*1024**2//8)
+        rss_after = peak_rss_mb()
+        self.assertGreaterEqual(rss_after, rss_before)
+        self.assertGreater(rss_after, big_array.nbytes/1024.0**2)
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
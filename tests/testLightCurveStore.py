@@ -0,0 +1,157 @@
+from builtins import range
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+import lsst.utils.tests
+from lsst.utils import getPackageDir
+from lsst.sims.catUtils.utils import LightCurveAccumulator
+from lsst.sims.catUtils.utils import LightCurveWriter, LightCurveReader
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class LightCurveStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        scratch_space = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace')
+        self.scratch_dir = tempfile.mkdtemp(dir=scratch_space, prefix='lc_store_')
+        self.dirname = os.path.join(self.scratch_dir, 'light_curves')
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def test_round_trip(self):
+        """
+        Write several batches of light curves with overlapping objects and
+        verify that the reader returns the same light curves as a single
+        LightCurveAccumulator containing all of the measurements.
+        """
+        rng = np.random.RandomState(44)
+        control = LightCurveAccumulator()
+        control_truth = {}
+
+        writer = LightCurveWriter(self.dirname, brightness_name='flux')
+        for i_batch in range(4):
+            batch = LightCurveAccumulator()
+            truth = {}
+            for i_visit in range(10):
+                id_list = rng.choice(np.arange(30), size=12, replace=False)
+                bp = rng.choice(['u', 'g', 'y'])
+                mjd = rng.random_sample()*100.0 + 59580.0
+                flux = rng.random_sample(12)
+                sigma = rng.random_sample(12)*0.01
+                batch.append(id_list, bp, mjd, flux, sigma)
+                control.append(id_list, bp, mjd, flux, sigma)
+                for ii in id_list:
+                    if ii not in truth:
+                        truth[ii] = {'batch': i_batch, 'id': int(ii)}
+            writer.write_batch(batch, truth)
+            for ii in truth:
+                if ii not in control_truth:
+                    control_truth[ii] = truth[ii]
+
+        self.assertEqual(writer.batches, [0, 1, 2, 3])
+
+        reader = LightCurveReader(self.dirname)
+        control_dict = control.to_dict(brightness_name='flux')
+        self.assertEqual(len(reader), len(control_dict))
+        np.testing.assert_array_equal(reader.unique_ids, control.unique_ids)
+
+        ct = 0
+        for unique_id, lc in reader:
+            ct += 1
+            self.assertEqual(set(lc.keys()), set(control_dict[unique_id].keys()))
+            for bp in lc:
+                for col in ('mjd', 'flux', 'error'):
+                    np.testing.assert_array_equal(lc[bp][col], control_dict[unique_id][bp][col])
+            self.assertEqual(reader.truth(unique_id), control_truth[unique_id])
+        self.assertEqual(ct, len(control_dict))
+
+        unique_id = reader.unique_ids[3]
+        lc = reader.light_curve(unique_id)
+        for bp in control_dict[unique_id]:
+            np.testing.assert_array_equal(lc[bp]['flux'], control_dict[unique_id][bp]['flux'])
+
+        with self.assertRaises(KeyError):
+            reader.light_curve(1000)
+        with self.assertRaises(KeyError):
+            reader.truth(1000)
+
+    def test_append_and_empty(self):
+        """
+        Test that a directory can be reopened and added to, that empty batches
+        are handled, and that batches cannot be written twice.
+        """
+        writer = LightCurveWriter(self.dirname)
+        writer.write_batch(LightCurveAccumulator(), {}, batch_id=5)
+        reader = LightCurveReader(self.dirname)
+        self.assertEqual(len(reader), 0)
+        self.assertEqual(list(reader), [])
+
+        batch = LightCurveAccumulator()
+        batch.append(np.array([2, 1]), 'r', 60000.0, np.array([21.0, 22.0]), np.array([0.1, 0.2]))
+        writer = LightCurveWriter(self.dirname)
+        writer.write_batch(batch, {1: 'a', 2: 'b', 9: 'c'}, batch_id=2)
+        self.assertEqual(writer.batches, [5, 2])
+
+        with self.assertRaises(RuntimeError):
+            writer.write_batch(batch, {}, batch_id=2)
+
+        with self.assertRaises(RuntimeError):
+            LightCurveWriter(self.dirname, brightness_name='flux')
+
+        reader = LightCurveReader(self.dirname)
+        np.testing.assert_array_equal(reader.unique_ids, [1, 2])
+        np.testing.assert_array_equal(reader.light_curve(1)['r']['mag'], [22.0])
+        self.assertEqual(reader.truth(2), 'b')
+        # truth information is found for objects without light curves, too
+        self.assertEqual(reader.truth(9), 'c')
+        with self.assertRaises(KeyError):
+            reader.truth(3)
+
+    def test_read_batch(self):
+        """
+        Test that a batch can be read back into a LightCurveAccumulator and
+        that a directory cannot be shared by two different runs.
+        """
+        batch = LightCurveAccumulator()
+        batch.append(np.array([7, 3, 7]), np.array(['z', 'i', 'i']), np.array([3.0, 2.0, 1.0]),
+                     np.array([19.0, 20.0, 21.0]), np.array([0.01, 0.02, 0.03]))
+        writer = LightCurveWriter(self.dirname, run_info={'run': 1})
+        writer.write_batch(batch, {7: {'t0': np.float64(2.5), 'bounds': np.array([1, 2])},
+                                   3: {'t0': 1.0, 'bounds': [3, 4]}}, batch_id=0)
+
+        # objects json cannot represent are rejected
+        with self.assertRaises(TypeError):
+            writer.write_batch(batch, {7: {'t0': set([2.5])}}, batch_id=1)
+
+        reader = LightCurveReader(self.dirname)
+        self.assertEqual(reader.batches, [0])
+        test_batch, test_truth = reader.read_batch(0)
+        self.assertEqual(test_truth, {7: {'t0': 2.5, 'bounds': [1, 2]},
+                                      3: {'t0': 1.0, 'bounds': [3, 4]}})
+        for col in ('uniqueId', 'bandpass', 'mjd', 'brightness', 'error'):
+            np.testing.assert_array_equal(test_batch.columns[col], batch.columns[col])
+
+        with self.assertRaises(KeyError):
+            reader.read_batch(1)
+
+        # the same run can add to the directory; a different one cannot
+        LightCurveWriter(self.dirname, run_info={'run': 1})
+        with self.assertRaises(RuntimeError):
+            LightCurveWriter(self.dirname, run_info={'run': 2})
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
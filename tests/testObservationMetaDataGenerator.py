@@ -3,11 +3,12 @@ from builtins import range
 import os
 import unittest
 import sqlite3
+import shutil
 import numpy as np
 import lsst.utils.tests
 from lsst.sims.utils.CodeUtilities import sims_clean_up
 from lsst.sims.catUtils.utils import ObservationMetaDataGenerator
-from lsst.sims.utils import CircleBounds, BoxBounds, altAzPaFromRaDec
+from lsst.sims.utils import CircleBounds, BoxBounds, altAzPaFromRaDec, angularSeparation
 from lsst.sims.utils import ObservationMetaData
 from lsst.sims.catUtils.exampleCatalogDefinitions import PhoSimCatalogSersic2D
 from lsst.sims.catUtils.utils import testGalaxyBulgeDBObj
@@ -430,6 +431,77 @@ class ObservationMetaDataGeneratorTest(unittest.TestCase):
             self.assertGreaterEqual(obs.mjd.TAI, night0+14.9)
             self.assertLessEqual(obs.mjd.TAI, night0+15.9)
 
+    def testInMemoryQueries(self):
+        """
+        Test that a generator with the Summary table in memory returns
+        the same records as one querying the database
+        """
+        dbPath = os.path.join(getPackageDir('sims_data'),
+                              'OpSimData/opsimblitz1_1133_sqlite.db')
+        mem_gen = ObservationMetaDataGenerator(database=dbPath, driver='sqlite',
+                                               inMemory=True)
+        self.assertIsNotNone(mem_gen.summaryIndex)
+
+        query_list = [{'fieldRA': (np.degrees(1.370916), np.degrees(1.5348635)),
+                       'fieldDec': (np.degrees(-0.5564), np.degrees(-0.4)),
+                       'msg': 'spatial box'},
+                      {'night': (11, 13), 'telescopeFilter': 'i', 'msg': 'night and filter'},
+                      {'night': 15, 'msg': 'exact night'},
+                      {'fieldRA': np.degrees(1.370916), 'telescopeFilter': 'i',
+                       'msg': 'exact RA'},
+                      {'expMJD': (49355.0, 49356.0), 'airmass': (1.1, 1.3),
+                       'msg': 'MJD and airmass'},
+                      {'telescopeFilter': ('g', 'i'), 'limit': 30, 'msg': 'filter range and limit'},
+                      {'limit': 20, 'msg': 'limit only'},
+                      {'night': (13, 11), 'msg': 'empty range'}]
+
+        for kwargs in query_list:
+            msg = kwargs.pop('msg')
+            control = self.gen.getOpSimRecords(**kwargs)
+            test = mem_gen.getOpSimRecords(**kwargs)
+            self.assertEqual(len(test), len(control), msg=msg)
+            self.assertEqual(test.dtype, control.dtype, msg=msg)
+            for name in control.dtype.names:
+                if name == 'propID':
+                    # propID may differ between the records of a visit
+                    # made for several proposals
+                    continue
+                np.testing.assert_array_equal(test[name], control[name], err_msg=msg)
+
+        self.assertRaises(RuntimeError, mem_gen.getOpSimRecords)
+        self.assertRaises(RuntimeError, mem_gen.getOpSimRecords, fieldRA=(1.0, 2.0, 3.0))
+
+    def testObsMetaDataFromPointingArray(self):
+        """
+        Test that ObservationMetaDataFromPointingArray gives the same
+        ObservationMetaData as calling ObservationMetaDataFromPointing on
+        each record
+        """
+        records = self.gen.getOpSimRecords(night=(11, 12))
+        self.assertGreater(len(records), 100)
+        test_list = self.gen.ObservationMetaDataFromPointingArray(records, boundType='box',
+                                                                  boundLength=0.8)
+        self.assertEqual(len(test_list), len(records))
+        for rec, test in zip(records, test_list):
+            control = self.gen.ObservationMetaDataFromPointing(rec, boundType='box',
+                                                               boundLength=0.8)
+            self.assertEqual(test.pointingRA, control.pointingRA)
+            self.assertEqual(test.pointingDec, control.pointingDec)
+            self.assertEqual(test.mjd.TAI, control.mjd.TAI)
+            self.assertEqual(test.bandpass, control.bandpass)
+            self.assertEqual(test.m5, control.m5)
+            self.assertEqual(test.skyBrightness, control.skyBrightness)
+            self.assertEqual(test.seeing, control.seeing)
+            self.assertEqual(test.rotSkyPos, control.rotSkyPos)
+            self.assertEqual(test.boundType, control.boundType)
+            self.assertEqual(test.boundLength, control.boundLength)
+            self.assertEqual(test.OpsimMetaData, control.OpsimMetaData)
+
+        with self.assertRaises(RuntimeError) as context:
+            self.gen.ObservationMetaDataFromPointingArray(records[['fieldRA', 'expMJD', 'filter']])
+        self.assertIn("ObservationMetaDataGenerator requires that the database",
+                      context.exception.args[0])
+
     def testCreationOfPhoSimCatalog(self):
         """
         Make sure that we can create PhoSim input catalogs using the returned
@@ -593,6 +665,198 @@ class ObsMetaDataGenMockOpsimTest(unittest.TestCase):
             os.unlink(opsim_db_name)
 
 
+class ObsMetaDataGenRegionTest(unittest.TestCase):
+    """
+    This class will test the cone and polygon queries of the
+    ObservationMetaDataGenerator on a mock OpSim database with
+    pointings all over the sky
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        scratch_dir = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace')
+        cls.opsim_db_name = os.path.join(scratch_dir, 'region_mock_opsim_sqlite.db')
+
+        if os.path.exists(cls.opsim_db_name):
+            os.unlink(cls.opsim_db_name)
+
+        conn = sqlite3.connect(cls.opsim_db_name)
+        c = conn.cursor()
+        c.execute('''CREATE TABLE Summary (obsHistID int, expMJD real, '''
+                  '''fieldRA real, fieldDec real, filter text)''')
+        conn.commit()
+        rng = np.random.RandomState(81)
+        n_pointings = 5000
+        ra_data = rng.random_sample(n_pointings)*2.0*np.pi
+        dec_data = np.arcsin(rng.random_sample(n_pointings)*2.0-1.0)
+        mjd_data = rng.random_sample(n_pointings)*1000.0 + 59580.0
+        bands = ('u', 'g', 'r', 'i', 'z', 'y')
+        filter_dexes = rng.randint(0, 6, n_pointings)
+
+        for ii in range(n_pointings):
+            cmd = '''INSERT INTO Summary VALUES(%i, %.12f, %.12f, %.12f, '%s')''' % \
+                  (ii, mjd_data[ii], ra_data[ii], dec_data[ii], bands[filter_dexes[ii]])
+            c.execute(cmd)
+        conn.commit()
+        conn.close()
+
+        cls.sql_gen = ObservationMetaDataGenerator(database=cls.opsim_db_name)
+        cls.mem_gen = ObservationMetaDataGenerator(database=cls.opsim_db_name, inMemory=True)
+        cls.all_records = cls.sql_gen.getOpSimRecords(expMJD=(59000.0, 61000.0))
+
+    @classmethod
+    def tearDownClass(cls):
+        sims_clean_up()
+        del cls.sql_gen
+        del cls.mem_gen
+
+        if os.path.exists(cls.opsim_db_name):
+            os.unlink(cls.opsim_db_name)
+
+    def testConeQuery(self):
+        """
+        Test that cone queries return exactly the pointings whose fields
+        of view overlap the cone, including cones containing RA=0 and the poles
+        """
+        ra_all = np.degrees(self.all_records['fieldRA'])
+        dec_all = np.degrees(self.all_records['fieldDec'])
+
+        for ra, dec, radius in ((0.5, -20.0, 5.0), (359.0, 30.0, 3.0),
+                                (120.0, 88.0, 4.0), (200.0, -40.0, 0.0)):
+            for boundLength in (1.75, 0.5):
+                msg = 'cone %e %e %e %e' % (ra, dec, radius, boundLength)
+                dist = angularSeparation(ra, dec, ra_all, dec_all)
+                control = self.all_records[np.where(dist <= radius + boundLength)]
+                for gen in (self.sql_gen, self.mem_gen):
+                    test = gen.getOpSimRecordsInCone(ra, dec, radius, boundLength=boundLength)
+                    np.testing.assert_array_equal(test['obsHistID'], control['obsHistID'],
+                                                  err_msg=msg)
+                if radius > 0.0:
+                    self.assertGreater(len(control), 0, msg=msg)
+
+        # combine a cone with other constraints
+        for gen in (self.sql_gen, self.mem_gen):
+            results = gen.getOpSimRecordsInCone(0.5, -20.0, 10.0, telescopeFilter='r',
+                                                limit=3)
+            self.assertEqual(len(results), 3)
+            np.testing.assert_array_equal(results['filter'], ['r']*3)
+            dist = angularSeparation(0.5, -20.0, np.degrees(results['fieldRA']),
+                                     np.degrees(results['fieldDec']))
+            self.assertLessEqual(dist.max(), 11.75)
+
+        with self.assertRaises(RuntimeError) as context:
+            self.sql_gen.getOpSimRecordsInCone(0.0, 0.0, 1.0, notAColumn=(1.0, 2.0))
+        self.assertIn("does not know the column notAColumn", context.exception.args[0])
+
+    def testPolygonQuery(self):
+        """
+        Test polygon queries on a polygon containing RA=0
+        """
+        ra_all = np.degrees(self.all_records['fieldRA'])
+        dec_all = np.degrees(self.all_records['fieldDec'])
+        dist = angularSeparation(0.0, 0.0, ra_all, dec_all)
+
+        # the edges of this polygon are 20 degrees from (0, 0) at their
+        # nearest and its vertices are 28.0 degrees from (0, 0)
+        ra_vertices = [340.0, 20.0, 20.0, 340.0]
+        dec_vertices = [-20.0, -20.0, 20.0, 20.0]
+        boundLength = 1.75
+
+        control = None
+        for gen in (self.sql_gen, self.mem_gen):
+            for direction in (1, -1):
+                results = gen.getOpSimRecordsInPolygon(ra_vertices[::direction],
+                                                       dec_vertices[::direction],
+                                                       boundLength=boundLength)
+                if control is None:
+                    control = results
+                np.testing.assert_array_equal(results['obsHistID'], control['obsHistID'])
+
+        selected = np.in1d(self.all_records['obsHistID'], control['obsHistID'])
+        self.assertGreater(selected.sum(), 0)
+        self.assertLessEqual(dist[selected].max(), 28.1 + boundLength)
+        self.assertTrue(selected[np.where(dist <= 20.0 + boundLength)].all())
+
+        with self.assertRaises(RuntimeError) as context:
+            self.sql_gen.getOpSimRecordsInPolygon([0.0, 10.0, 0.0, 10.0],
+                                                  [0.0, 0.0, 10.0, 10.0])
+        self.assertIn("must be convex", context.exception.args[0])
+
+    def testVisitsCoveringPositions(self):
+        """
+        Test that getVisitsCoveringPositions finds the same visits for each
+        position as a cone query of zero radius about it
+        """
+        rng = np.random.RandomState(14)
+        n_pos = 200
+        ra = rng.random_sample(n_pos)*360.0
+        dec = np.degrees(np.arcsin(rng.random_sample(n_pos)*2.0-1.0))
+        # positions near RA=0 and near the poles
+        ra[:20] = (rng.random_sample(20)*2.0 - 1.0) % 360.0
+        dec[20:30] = 89.0 + rng.random_sample(10)
+        dec[30:40] = -89.0 - rng.random_sample(10)
+
+        for gen in (self.sql_gen, self.mem_gen):
+            for kwargs in ({}, {'expMJD': (59800.0, 60200.0), 'telescopeFilter': 'g'},
+                           {'boundLength': 3.0, 'chunkSize': 17}):
+                msg = str(kwargs)
+                records, offsets, visits = gen.getVisitsCoveringPositions(ra, dec, **kwargs)
+                self.assertEqual(len(offsets), n_pos+1, msg=msg)
+                self.assertEqual(offsets[-1], len(visits), msg=msg)
+
+                cone_kwargs = dict(kwargs)
+                cone_kwargs.pop('chunkSize', None)
+                n_covered = 0
+                for ii in range(n_pos):
+                    control = gen.getOpSimRecordsInCone(ra[ii], dec[ii], 0.0, **cone_kwargs)
+                    test = records[visits[offsets[ii]:offsets[ii+1]]]
+                    np.testing.assert_array_equal(test['obsHistID'], control['obsHistID'],
+                                                  err_msg=msg)
+                    if len(control) > 0:
+                        n_covered += 1
+                self.assertGreater(n_covered, 0, msg=msg)
+
+    def testSnapshot(self):
+        """
+        Test that a generator reading a snapshot of the OpSim database
+        returns the same records as one querying the database
+        """
+        scratch_dir = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace')
+        snapshot_dir = os.path.join(scratch_dir, 'region_mock_opsim_snapshot')
+        if os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+
+        self.sql_gen.writeSnapshot(snapshot_dir)
+        self.assertTrue(os.path.exists(os.path.join(snapshot_dir, 'manifest.json')))
+        snap_gen = ObservationMetaDataGenerator(snapshot=snapshot_dir)
+
+        for kwargs in ({'telescopeFilter': 'r', 'expMJD': (59700.0, 60000.0)},
+                       {'fieldRA': (10.0, 50.0), 'fieldDec': (-30.0, 0.0)},
+                       {'obsHistID': 17},
+                       {'limit': 15}):
+            control = self.sql_gen.getOpSimRecords(**kwargs)
+            test = snap_gen.getOpSimRecords(**kwargs)
+            self.assertGreater(len(control), 0, msg=str(kwargs))
+            self.assertEqual(test.dtype, control.dtype)
+            for name in control.dtype.names:
+                np.testing.assert_array_equal(test[name], control[name], err_msg=str(kwargs))
+
+        control = self.sql_gen.getOpSimRecordsInCone(359.0, 30.0, 3.0)
+        test = snap_gen.getOpSimRecordsInCone(359.0, 30.0, 3.0)
+        np.testing.assert_array_equal(test['obsHistID'], control['obsHistID'])
+
+        obs_list = snap_gen.getObservationMetaData(obsHistID=17)
+        self.assertEqual(len(obs_list), 1)
+        self.assertEqual(obs_list[0].OpsimMetaData['obsHistID'], 17)
+
+        del snap_gen
+        shutil.rmtree(snapshot_dir)
+
+        with self.assertRaises(RuntimeError) as context:
+            ObservationMetaDataGenerator(snapshot=scratch_dir)
+        self.assertIn("is not an OpSim snapshot", context.exception.args[0])
+
+
 class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
     pass
 
@@ -529,6 +529,45 @@ class photometryUnitTest(unittest.TestCase):
         if os.path.exists(catName):
             os.unlink(catName)
 
+    def testMultipleBandpassSystems(self):
+        """
+        Test that a catalog which calculates stellar magnitudes in two bandpass
+        systems (and therefore shares each chunk's SedList between the getters)
+        gets the same magnitudes as catalogs which calculate each system alone.
+        """
+
+        obs_metadata_pointed = ObservationMetaData(mjd=2013.23,
+                                                   boundType='circle',
+                                                   pointingRA=200.0, pointingDec=-30.0,
+                                                   boundLength=1.0)
+
+        cartoon_cols = ['cartoon_u', 'cartoon_g', 'cartoon_r', 'cartoon_i', 'cartoon_z']
+        lsst_cols = ['quiescent_lsst_%s' % bp for bp in ('u', 'g', 'r', 'i', 'z', 'y')]
+
+        class lsstOnlyStars(cartoonStars):
+            catalog_type = __file__ + 'lsstOnlyStars'
+            column_outputs = ['id'] + lsst_cols
+
+        class lsstAndCartoonStars(cartoonStars):
+            catalog_type = __file__ + 'lsstAndCartoonStars'
+            column_outputs = ['id'] + cartoon_cols + lsst_cols
+
+        control_cartoon = np.array([line[4:] for line in
+                                    cartoonStars(self.star, obs_metadata=obs_metadata_pointed)
+                                    .iter_catalog(chunk_size=100)])
+
+        control_lsst = np.array([line[1:] for line in
+                                 lsstOnlyStars(self.star, obs_metadata=obs_metadata_pointed)
+                                 .iter_catalog(chunk_size=100)])
+
+        test_mags = np.array([line[1:] for line in
+                              lsstAndCartoonStars(self.star, obs_metadata=obs_metadata_pointed)
+                              .iter_catalog(chunk_size=100)])
+
+        self.assertGreater(len(test_mags), 0)
+        np.testing.assert_array_almost_equal(test_mags[:, :len(cartoon_cols)], control_cartoon, 10)
+        np.testing.assert_array_almost_equal(test_mags[:, len(cartoon_cols):], control_lsst, 10)
+
     def testStellarPhotometryIndices(self):
         """
         A test to make sure that stellar photometry still calculates the right values
@@ -0,0 +1,111 @@
+import os
+import unittest
+import numpy as np
+
+import lsst.utils.tests
+from lsst.utils import getPackageDir
+from lsst.sims.utils.CodeUtilities import sims_clean_up
+from lsst.sims.catUtils.utils import ObservationMetaDataGenerator, PointingTable
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class PointingTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        db_name = os.path.join(getPackageDir('sims_data'),
+                               'OpSimData', 'opsimblitz1_1133_sqlite.db')
+        cls.gen = ObservationMetaDataGenerator(database=db_name, driver='sqlite')
+
+    @classmethod
+    def tearDownClass(cls):
+        sims_clean_up()
+        del cls.gen
+
+    def test_same_as_list(self):
+        """
+        Test that a PointingTable yields the same ObservationMetaData
+        as getObservationMetaData
+        """
+        kwargs = {'fieldRA': (0.0, 50.0), 'fieldDec': (-60.0, -10.0),
+                  'boundType': 'box', 'boundLength': 0.5}
+        obs_list = self.gen.getObservationMetaData(**kwargs)
+        table = self.gen.getPointingTable(**kwargs)
+        self.assertIsInstance(table, PointingTable)
+        self.assertGreater(len(obs_list), 10)
+        self.assertEqual(len(table), len(obs_list))
+
+        np.testing.assert_array_equal(table['expMJD'], [obs.mjd.TAI for obs in obs_list])
+        np.testing.assert_array_equal(np.degrees(table['fieldRA']),
+                                      [obs.pointingRA for obs in obs_list])
+
+        for control, test in zip(obs_list, table.to_list()):
+            self.assertEqual(test.pointingRA, control.pointingRA)
+            self.assertEqual(test.pointingDec, control.pointingDec)
+            self.assertEqual(test.mjd.TAI, control.mjd.TAI)
+            self.assertEqual(test.bandpass, control.bandpass)
+            self.assertEqual(test.m5, control.m5)
+            self.assertEqual(test.seeing, control.seeing)
+            self.assertEqual(test.boundType, control.boundType)
+            self.assertEqual(test.boundLength, control.boundLength)
+            self.assertEqual(test.OpsimMetaData, control.OpsimMetaData)
+
+        self.assertEqual(table[-1].mjd.TAI, obs_list[-1].mjd.TAI)
+        with self.assertRaises(IndexError):
+            table[len(table)]
+
+    def test_lazy_construction(self):
+        """
+        Test that ObservationMetaData are only constructed on access,
+        and only once
+        """
+        table = self.gen.getPointingTable(fieldRA=(0.0, 50.0), fieldDec=(-60.0, -10.0))
+        self.assertEqual(sum(obs is not None for obs in table._obs_cache), 0)
+        obs = table[3]
+        self.assertEqual(sum(obs is not None for obs in table._obs_cache), 1)
+        self.assertIs(table[3], obs)
+
+        # sub-tables share the ObservationMetaData already constructed
+        sub_table = table[2:5]
+        self.assertIs(sub_table[1], obs)
+
+    def test_filtering_and_grouping(self):
+        """
+        Test selecting pointings with masks and grouping them on a column
+        """
+        table = self.gen.getPointingTable(fieldRA=(0.0, 50.0), fieldDec=(-60.0, -10.0))
+        obs_list = table.to_list()
+
+        mask = table['filter'] == 'r'
+        self.assertGreater(mask.sum(), 0)
+        r_table = table[mask]
+        self.assertEqual(len(r_table), mask.sum())
+        for obs in r_table:
+            self.assertEqual(obs.bandpass, 'r')
+
+        index = np.array([5, 1, 3])
+        sub_table = table[index]
+        for ix, obs in zip(index, sub_table):
+            self.assertIs(obs, obs_list[ix])
+
+        groups = table.group_by('filter')
+        self.assertEqual(sum(len(grp) for grp in groups.values()), len(table))
+        for band in groups:
+            self.assertGreater(len(groups[band]), 0)
+            for obs in groups[band]:
+                self.assertEqual(obs.bandpass, band)
+            # within a group, the pointings are still sorted by MJD
+            mjd = groups[band]['expMJD']
+            np.testing.assert_array_equal(mjd, np.sort(mjd))
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,188 @@
+from builtins import range
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+import lsst.utils.tests
+from lsst.utils import getPackageDir
+from lsst.sims.utils import ObservationMetaData
+from lsst.sims.catUtils.utils import QueryResultCache
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class CountingDBObject(object):
+    """
+    Stands in for a CatalogDBObject.  query_columns() returns chunks of a
+    fixed structured array and counts how many times it has been called.
+    """
+    tableid = 'test_table'
+    database = 'test_db'
+
+    def __init__(self, n_rows=95):
+        rng = np.random.RandomState(88)
+        self.data = np.rec.fromarrays([np.arange(n_rows),
+                                       rng.random_sample(n_rows),
+                                       np.array(['obj%d' % ii for ii in range(n_rows)])],
+                                      names=['id', 'mag', 'name'])
+        self.n_queries = 0
+
+    def query_columns(self, colnames=None, obs_metadata=None, constraint=None,
+                      limit=None, chunk_size=None):
+        self.n_queries += 1
+        data = self.data[:limit]
+        if chunk_size is None:
+            chunk_size = len(data)
+        for i_start in range(0, len(data), chunk_size):
+            yield data[i_start:i_start+chunk_size]
+
+
+class QueryResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        scratch_space = os.path.join(getPackageDir('sims_catUtils'), 'tests', 'scratchSpace')
+        self.scratch_dir = tempfile.mkdtemp(dir=scratch_space, prefix='query_cache_')
+        self.cache_dir = os.path.join(self.scratch_dir, 'cache')
+        self.obs = ObservationMetaData(pointingRA=20.0, pointingDec=-10.0,
+                                       boundType='circle', boundLength=1.5)
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def test_replay(self):
+        """
+        Test that a cached query is replayed with the same rows, in chunks of
+        the requested size, without querying the database again
+        """
+        db_obj = CountingDBObject()
+        cache = QueryResultCache(self.cache_dir)
+
+        control = list(cache.query_columns(db_obj, colnames=['id', 'mag', 'name'],
+                                           obs_metadata=self.obs, chunk_size=20))
+        self.assertEqual(db_obj.n_queries, 1)
+        self.assertEqual([len(chunk) for chunk in control], [20, 20, 20, 20, 15])
+
+        for chunk_size in (20, 7, 1000, None):
+            test = list(cache.query_columns(db_obj, colnames=['id', 'mag', 'name'],
+                                            obs_metadata=self.obs, chunk_size=chunk_size))
+            self.assertEqual(db_obj.n_queries, 1)
+            if chunk_size is not None:
+                for chunk in test[:-1]:
+                    self.assertEqual(len(chunk), chunk_size)
+            test = np.concatenate(test)
+            self.assertEqual(len(test), len(db_obj.data))
+            for name in ('id', 'mag', 'name'):
+                np.testing.assert_array_equal(test[name], db_obj.data[name])
+
+        self.assertEqual(cache.hits, 4)
+        self.assertEqual(cache.misses, 1)
+
+        # a different query goes back to the database
+        other_obs = ObservationMetaData(pointingRA=20.0, pointingDec=-10.0,
+                                        boundType='circle', boundLength=1.6)
+        for kwargs in ({'obs_metadata': other_obs},
+                       {'constraint': 'mag < 0.5'},
+                       {'limit': 10},
+                       {'colnames': ['id', 'mag']}):
+            query_kwargs = {'colnames': ['id', 'mag', 'name'], 'obs_metadata': self.obs}
+            query_kwargs.update(kwargs)
+            list(cache.query_columns(db_obj, chunk_size=20, **query_kwargs))
+        self.assertEqual(db_obj.n_queries, 5)
+
+    def test_abandoned_query(self):
+        """
+        Test that a query which is not read to the end is not cached
+        """
+        db_obj = CountingDBObject()
+        cache = QueryResultCache(self.cache_dir)
+
+        query_result = cache.query_columns(db_obj, obs_metadata=self.obs, chunk_size=10)
+        next(query_result)
+        query_result.close()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+        list(cache.query_columns(db_obj, obs_metadata=self.obs, chunk_size=10))
+        self.assertEqual(db_obj.n_queries, 2)
+
+    def test_eviction(self):
+        """
+        Test that the least recently used entries are deleted when the cache
+        grows too large
+        """
+        db_obj = CountingDBObject()
+        cache = QueryResultCache(self.cache_dir)
+        list(cache.query_columns(db_obj, obs_metadata=self.obs))
+        entry_size = cache.n_bytes
+        self.assertGreater(entry_size, 0)
+        entry_dir = os.path.join(self.cache_dir, cache.query_key(db_obj, obs_metadata=self.obs))
+        os.utime(entry_dir, (500.0, 500.0))
+
+        cache.max_bytes = 2*entry_size
+        query_list = [{'constraint': 'id > %d' % ii} for ii in range(3)]
+        for i_query, kwargs in enumerate(query_list):
+            list(cache.query_columns(db_obj, obs_metadata=self.obs, **kwargs))
+            # make sure the entries can be told apart by their modification times
+            entry_dir = os.path.join(self.cache_dir,
+                                     cache.query_key(db_obj, obs_metadata=self.obs, **kwargs))
+            os.utime(entry_dir, (1000.0*(i_query+1), 1000.0*(i_query+1)))
+
+        self.assertLessEqual(cache.n_bytes, 2*entry_size)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        # the two most recent queries are still cached
+        n_queries = db_obj.n_queries
+        for kwargs in query_list[1:]:
+            list(cache.query_columns(db_obj, obs_metadata=self.obs, **kwargs))
+        self.assertEqual(db_obj.n_queries, n_queries)
+
+        cache.clear()
+        self.assertEqual(cache.n_bytes, 0)
+
+    def test_eviction_during_replay(self):
+        """
+        Test that a replay whose entry is evicted part way through still
+        returns every row exactly once, and that a replay whose entry is
+        evicted before it starts reads the rows from the database
+        """
+        db_obj = CountingDBObject()
+        cache = QueryResultCache(self.cache_dir)
+        list(cache.query_columns(db_obj, obs_metadata=self.obs, chunk_size=20))
+        self.assertEqual(db_obj.n_queries, 1)
+
+        query_result = cache.query_columns(db_obj, obs_metadata=self.obs, chunk_size=15)
+        test = [next(query_result), next(query_result)]
+
+        cache.max_bytes = 0
+        cache.evict()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+        test += list(query_result)
+        self.assertEqual(db_obj.n_queries, 1)
+        self.assertEqual([len(chunk) for chunk in test], [15]*6 + [5])
+        test = np.concatenate(test)
+        for name in ('id', 'mag', 'name'):
+            np.testing.assert_array_equal(test[name], db_obj.data[name])
+
+        cache.max_bytes = 10*1024**3
+        list(cache.query_columns(db_obj, obs_metadata=self.obs, chunk_size=20))
+        self.assertEqual(db_obj.n_queries, 2)
+        query_result = cache.query_columns(db_obj, obs_metadata=self.obs, chunk_size=15)
+        cache.clear()
+        test = np.concatenate(list(query_result))
+        self.assertEqual(db_obj.n_queries, 3)
+        for name in ('id', 'mag', 'name'):
+            np.testing.assert_array_equal(test[name], db_obj.data[name])
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -18,6 +18,7 @@ from builtins import map
 from builtins import str
 from builtins import range
 import os
+import glob
 import sqlite3
 import numpy as np
 import unittest
@@ -34,14 +35,15 @@ import lsst.utils.tests
 from lsst.sims.utils.CodeUtilities import sims_clean_up
 from lsst.utils import getPackageDir
 from lsst.sims.photUtils.PhotometricParameters import PhotometricParameters
-from lsst.sims.photUtils import BandpassDict
+from lsst.sims.photUtils import BandpassDict, Sed
 from lsst.sims.utils import ObservationMetaData
 from lsst.sims.utils import spatiallySample_obsmetadata as sample_obsmetadata
 from lsst.sims.catUtils.utils import ObservationMetaDataGenerator
 from lsst.sims.catalogs.db import CatalogDBObject, fileDBObject
 
 # Routines Being Tested
-from lsst.sims.catUtils.supernovae import SNObject
+from lsst.sims.catUtils.supernovae import SNObject, SALT2BandFluxEngine, SNUniverse
+from lsst.sims.catUtils.supernovae import SNSedBundle
 from lsst.sims.catUtils.mixins import SNIaCatalog
 from lsst.sims.catUtils.utils import SNIaLightCurveGenerator
 
@@ -194,6 +196,38 @@ class SNObject_tests(unittest.TestCase):
         sedflux = sed.calcFlux(bandpass=self.lsstBandPass['r'])
         np.testing.assert_allclose(snobject_r, sedflux / 3631.0)
 
+    def test_multiEpoch(self):
+        """
+        Check that SNObjectSEDArray and catsimBandFluxes give the same SEDs
+        and band fluxes as SNObjectSED and catsimBandFlux at each time,
+        including times outside of the range of the model
+        """
+        bandpass = self.lsstBandPass['r']
+        times = np.append(np.linspace(self.SN_extincted.mintime() - 10.,
+                                      self.SN_extincted.maxtime() + 10., 30),
+                          self.mjdobs)
+
+        wavelen, flambda = self.SN_extincted.SNObjectSEDArray(times=times,
+                                                              bandpass=bandpass)
+        self.assertEqual(flambda.shape, (len(times), len(bandpass.wavelen)))
+        fluxes = self.SN_extincted.catsimBandFluxes(times=times,
+                                                    bandpassobject=bandpass)
+        mags = self.SN_extincted.catsimBandMags(times=times,
+                                                bandpassobject=bandpass,
+                                                noNan=True)
+        for ix, time in enumerate(times):
+            sed = self.SN_extincted.SNObjectSED(time=time, bandpass=bandpass)
+            np.testing.assert_array_equal(wavelen, sed.wavelen)
+            np.testing.assert_allclose(flambda[ix], sed.flambda, rtol=1.0e-10)
+            flux = self.SN_extincted.catsimBandFlux(time=time, bandpassobject=bandpass)
+            np.testing.assert_allclose(fluxes[ix], flux, rtol=1.0e-10)
+            mag = self.SN_extincted.catsimBandMag(time=time, bandpassobject=bandpass,
+                                                  noNan=True)
+            np.testing.assert_allclose(mags[ix], mag, rtol=1.0e-10)
+
+        self.assertEqual(fluxes[0], 0.0)
+        self.assertGreater(fluxes[-1], 0.0)
+
     def test_CompareBandFluxes2SNCosmo(self):
         """
         Compare the r band flux at a particular time computed in SNObject and
@@ -313,6 +347,157 @@ class SNObject_tests(unittest.TestCase):
 
 
 
+@unittest.skipIf(_skip_sn_tests, "cannot properly load astropy config dir")
+class SALT2BandFluxEngine_tests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.lsstBandPass = BandpassDict.loadTotalBandpassesFromFiles()
+        cls.engine = SALT2BandFluxEngine(bandpassDict=cls.lsstBandPass)
+
+    @classmethod
+    def tearDownClass(cls):
+        sims_clean_up()
+        del cls.engine
+
+    def test_compareBandFluxes2SNObject(self):
+        """
+        Compare the band fluxes interpolated by SALT2BandFluxEngine with
+        those calculated by SNObject.catsimBandFlux for a range of SN
+        parameters, times, and bandpasses
+        """
+        rng = np.random.RandomState(88)
+        snobj = SNObject()
+        for ix in range(20):
+            z = rng.random_sample() * 1.1 + 0.05
+            t0 = 60000.0
+            params = dict(z=z, t0=t0, x1=rng.normal(0.0, 1.0),
+                          c=rng.normal(0.0, 0.1), x0=1.0e-5)
+            ebv = rng.random_sample() * 0.2
+            snobj.set(**params)
+            snobj.set_MWebv(ebv)
+            times = t0 + np.linspace(-15.0, 40.0, 12) * (1.0 + z)
+            for bandName in ('u', 'g', 'r', 'i', 'z', 'y'):
+                control = np.array([snobj.catsimBandFlux(time=tt,
+                                                         bandpassobject=self.lsstBandPass[bandName])
+                                    for tt in times])
+                test = self.engine.bandFlux(bandName, times, t0=t0, x0=params['x0'],
+                                            x1=params['x1'], c=params['c'], z=z, ebv=ebv)
+                self.assertEqual(test.shape, times.shape)
+                # compare to the peak of the light curve, since interpolation
+                # errors are relatively large when the flux is small
+                tolerance = 0.01 * np.abs(control).max()
+                np.testing.assert_allclose(test, control, rtol=0.0, atol=tolerance)
+
+    def test_outsideModelRange(self):
+        """
+        Test that fluxes are zero outside the time range of the model, that many
+        SNe can be evaluated at once, and that redshifts outside the grid
+        are rejected
+        """
+        snobj = SNObject()
+        snobj.set(z=0.5, t0=60000.0, x1=0.0, c=0.0, x0=1.0e-5)
+        times = np.array([snobj.mintime() - 1.0, 60000.0, snobj.maxtime() + 1.0])
+        zz = np.array([0.2, 0.5, 0.8, 1.0])
+        fluxes = self.engine.bandFlux('r', times[None, :], t0=60000.0, x0=1.0e-5,
+                                      x1=0.0, c=0.0, z=zz[:, None], ebv=0.0)
+        self.assertEqual(fluxes.shape, (4, 3))
+        np.testing.assert_array_equal(fluxes[:, 0], np.zeros(4))
+        np.testing.assert_array_equal(fluxes[:, 2], np.zeros(4))
+        self.assertTrue((fluxes[:, 1] > 0.0).all())
+        # more distant SNe are fainter
+        self.assertTrue((np.diff(fluxes[:, 1]) < 0.0).all())
+
+        with self.assertRaises(RuntimeError):
+            self.engine.bandFlux('r', 60000.0, t0=60000.0, x0=1.0e-5, x1=0.0, c=0.0,
+                                 z=self.engine.zGrid[-1] + 0.1, ebv=0.0)
+
+
+@unittest.skipIf(_skip_sn_tests, "cannot properly load astropy config dir")
+class SNUniverse_tests(unittest.TestCase):
+
+    class _Universe(SNUniverse):
+        badvalues = np.nan
+        maxTimeSNVisible = 100.
+        mjdobs = 61000.
+
+    def test_x0FromBessellBMag(self):
+        """
+        Test that the interpolated x0 gives SNe the requested BessellB peak
+        magnitude, both inside and outside of the tabulated (x1, c) range
+        """
+        universe = self._Universe()
+        rng = np.random.RandomState(43)
+        x1_list = np.append(rng.normal(0.0, 1.0, 10), [-6.0, 6.5])
+        c_list = np.append(rng.normal(0.0, 0.1, 10), [0.05, 0.7])
+        mag_list = rng.random_sample(12) * 10.0 + 15.0
+        x0_list = universe.x0FromBessellBMag(mag_list, x1_list, c_list)
+        self.assertEqual(x0_list.shape, (12,))
+        for x1, c, mag, x0 in zip(x1_list, c_list, mag_list, x0_list):
+            sn = SNObject()
+            sn.set(x1=x1, c=c)
+            sn.source.set_peakmag(mag, band='bessellb', magsys='ab')
+            self.assertAlmostEqual(x0 / sn.get('x0'), 1.0, 3)
+
+    def test_vectorizedDraws(self):
+        """
+        Test that SNparamDistFromHost draws the same parameters for an array
+        of hosts as drawSNParams does for each of them
+        """
+        rng = np.random.RandomState(71)
+        n_hosts = 500
+        hostid = rng.randint(0, 2**40, n_hosts)
+        hostmu = rng.random_sample(n_hosts) * 10.0 + 35.0
+        for suppressDimSN in (True, False):
+            universe = self._Universe()
+            universe.numobjs = n_hosts
+            universe.suppressDimSN = suppressDimSN
+            universe.snFrequency = 1.0 / 3000.0
+            test = universe.SNparamDistFromHost(None, hostid, hostmu)
+            control = np.array([universe.drawSNParams(hh, mu)
+                                for hh, mu in zip(hostid, hostmu)])
+            np.testing.assert_array_equal(np.isnan(test), np.isnan(control))
+            self.assertGreater(np.isfinite(control[:, 3]).sum(), 0)
+            np.testing.assert_allclose(test, control, rtol=1.0e-12)
+
+            # the random state of each host is that of RandomState(hostid)
+            for ix in np.where(np.isfinite(test[:, 3]))[0][:10]:
+                sn_rng = np.random.RandomState(hostid[ix] % 4294967295)
+                self.assertEqual(sn_rng.uniform(-1500.0 + universe.midSurveyTime,
+                                                1500.0 + universe.midSurveyTime), test[ix, 3])
+                self.assertAlmostEqual(sn_rng.normal(0.0, 0.1), test[ix, 0], 14)
+
+        # a sub-class with its own distribution is respected
+        class _x1Universe(self._Universe):
+            def drawFromx1Dist(self, rng, **hostParams):
+                return 0.5
+
+        universe = _x1Universe()
+        universe.numobjs = n_hosts
+        universe.suppressDimSN = False
+        vals = universe.SNparamDistFromHost(None, hostid, hostmu)
+        np.testing.assert_array_equal(vals[:, 1], 0.5*np.ones(n_hosts))
+
+    def test_t0DistFromHost(self):
+        """
+        Test that SNt0DistFromHost draws the same t0 for an array of hosts as
+        drawFromT0Dist does for each of them
+        """
+        rng = np.random.RandomState(88)
+        hostid = rng.randint(0, 2**40, 300)
+        for suppressDimSN in (True, False):
+            universe = self._Universe()
+            universe.suppressDimSN = suppressDimSN
+            universe.snFrequency = 1.0 / 3000.0
+            test = universe.SNt0DistFromHost(hostid)
+            control = np.array([universe.drawFromT0Dist(universe.getSN_rng(hh))
+                                for hh in hostid])
+            np.testing.assert_array_equal(test, control)
+            self.assertGreater(np.isfinite(test).sum(), 0)
+            if suppressDimSN:
+                self.assertGreater(np.isnan(test).sum(), 0)
+
+
 @unittest.skipIf(_skip_sn_tests, "cannot properly load astropy config dir")
 class SNIaCatalog_tests(unittest.TestCase):
 
@@ -495,6 +680,136 @@ class SNIaCatalog_tests(unittest.TestCase):
             if os.path.exists(fname):
                 os.unlink(fname)
 
+    def test_fluxEngineCatalog(self):
+        """
+        Test that SNIaCatalogs using a SALT2BandFluxEngine report the same
+        brightnesses as those using SNObject
+        """
+        engine = SALT2BandFluxEngine()
+        cols = ['snid', 't0', 'flux', 'mag', 'flux_err', 'mag_err', 'adu']
+        n_compared = 0
+        for obsMetaData in self.obsMetaDataResults[:5]:
+            controlCatalog = SNIaCatalog(db_obj=self.galDB, obs_metadata=obsMetaData,
+                                         column_outputs=cols)
+            controlCatalog.midSurveyTime = 49350
+            controlCatalog.suppressDimSN = False
+            control = [row for row in controlCatalog.iter_catalog()]
+
+            testCatalog = SNIaCatalog(db_obj=self.galDB, obs_metadata=obsMetaData,
+                                      column_outputs=cols)
+            testCatalog.midSurveyTime = 49350
+            testCatalog.suppressDimSN = False
+            testCatalog.sn_flux_engine = engine
+            test = [row for row in testCatalog.iter_catalog()]
+
+            self.assertEqual(len(control), len(test))
+            for control_row, test_row in zip(control, test):
+                self.assertEqual(control_row[0], test_row[0])
+                if control_row[2] == 0.0:
+                    # outside of the time range of the model
+                    self.assertEqual(test_row[2], 0.0)
+                    continue
+                if control_row[3] > 28.0:
+                    # the interpolation is relatively coarse where the
+                    # SN is barely visible
+                    continue
+                np.testing.assert_allclose(test_row[2], control_row[2], rtol=0.05)
+                np.testing.assert_allclose(test_row[3], control_row[3], atol=0.05)
+                np.testing.assert_allclose(test_row[4], control_row[4], rtol=0.05)
+                np.testing.assert_allclose(test_row[6], control_row[6], rtol=0.05)
+                n_compared += 1
+        self.assertGreater(n_compared, 0)
+
+    def test_fluxEngineManyBands(self):
+        """
+        Test that get_snfluxes reports the same fluxes in all bands with and
+        without a SALT2BandFluxEngine, and that mwebv is the EBV column
+        """
+        engine = SALT2BandFluxEngine()
+        bands = 'ugrizy'
+        cols = ['snid', 'EBV', 'mwebv'] + ['flux_%s' % bb for bb in bands]
+        obsMetaData = self.obsMetaDataResults[6]
+        catalogs = []
+        for flux_engine in (None, engine):
+            cat = SNIaCatalog(db_obj=self.galDB, obs_metadata=obsMetaData,
+                              column_outputs=cols)
+            cat.suppressDimSN = True
+            cat.midSurveyTime = cat.mjdobs - 20.
+            cat.snFrequency = 1.0
+            cat.sn_flux_engine = flux_engine
+            catalogs.append([row for row in cat.iter_catalog()])
+
+        control, test = catalogs
+        self.assertGreater(len(control), 0)
+        self.assertEqual(len(control), len(test))
+        for control_row, test_row in zip(control, test):
+            self.assertEqual(control_row[0], test_row[0])
+            self.assertEqual(control_row[1], control_row[2])
+            self.assertEqual(test_row[1], test_row[2])
+            control_flux = np.array(control_row[3:])
+            test_flux = np.array(test_row[3:])
+            np.testing.assert_allclose(test_flux, control_flux,
+                                       atol=0.01*np.abs(control_flux).max())
+
+    def test_phosimVarsSedBundle(self):
+        """
+        Test that get_phosimVars writes the same SEDs to a bundle as it
+        does to individual files, and reports the same magNorms either way
+        """
+        cols = ['snid', 'TsedFilepath', 'magNorm']
+        obsMetaData = self.obsMetaDataResults[6]
+        results = {}
+        for mode in ('ascii', 'bundle'):
+            cat = SNIaCatalog(db_obj=self.galDB, obs_metadata=obsMetaData,
+                              column_outputs=cols)
+            cat.suppressDimSN = True
+            cat.midSurveyTime = cat.mjdobs - 20.
+            cat.snFrequency = 1.0
+            cat.writeSedFile = True
+            cat.writeSedBundle = mode == 'bundle'
+            cat.sn_sedfile_prefix = os.path.join(self.scratchDir, 'sed_%s_' % mode)
+            results[mode] = [row for row in cat.iter_catalog()]
+
+        ascii_files = glob.glob(os.path.join(self.scratchDir, 'sed_ascii_*.dat'))
+        bundle_files = glob.glob(os.path.join(self.scratchDir, 'sed_bundle_sedBundle_*.npz'))
+        try:
+            self.assertGreater(len(ascii_files), 0)
+            self.assertGreater(len(bundle_files), 0)
+            self.assertEqual(len(glob.glob(os.path.join(self.scratchDir, 'sed_bundle_*.dat'))), 0)
+            self.assertEqual(len(results['ascii']), len(results['bundle']))
+
+            bundles = [SNSedBundle(fname) for fname in bundle_files]
+            self.assertEqual(sum(len(bundle) for bundle in bundles), len(ascii_files))
+            bundled = {}
+            for bundle in bundles:
+                for name in bundle.names:
+                    bundled[name] = bundle
+
+            for control_row, test_row in zip(results['ascii'], results['bundle']):
+                self.assertEqual(control_row[0], test_row[0])
+                np.testing.assert_equal(control_row[2], test_row[2])
+                if control_row[1] == 'None':
+                    self.assertEqual(test_row[1], 'None')
+                    continue
+                self.assertEqual(test_row[1], control_row[1].replace('sed_ascii_', 'sed_bundle_'))
+                control_sed = Sed()
+                control_sed.readSED_flambda(control_row[1])
+                test_sed = bundled[test_row[1]].getSed(test_row[1])
+                np.testing.assert_allclose(test_sed.wavelen, control_sed.wavelen, rtol=1.0e-6)
+                np.testing.assert_allclose(test_sed.flambda, control_sed.flambda, rtol=1.0e-6,
+                                           atol=1.0e-6*control_sed.flambda.max())
+
+            # unpacking the bundles gives back the individual files
+            unpacked = bundles[0].unpack(outDir=self.scratchDir)
+            self.assertEqual(len(unpacked), len(bundles[0]))
+            for fname in unpacked:
+                self.assertTrue(os.path.exists(fname))
+                ascii_files.append(fname)
+        finally:
+            for fname in ascii_files + bundle_files:
+                if os.path.exists(fname):
+                    os.unlink(fname)
+
     def test_obsMetaDataGeneration(self):
 
         numObs = len(self.obsMetaDataResults)
@@ -784,6 +1099,50 @@ class SNIaLightCurveTest(unittest.TestCase):
 
         self.assertGreater(ct_z, 0)
 
+    def test_sne_light_curves_flux_engine(self):
+        """
+        Test that the light curves generated with a SALT2BandFluxEngine agree
+        with those generated by integrating the spectrum of each supernova
+        """
+        raRange = (78.0, 85.0)
+        decRange = (-69.0, -65.0)
+
+        control_gen = SNIaLightCurveGenerator(self.db, self.opsimDb)
+        control_gen.sn_universe._midSurveyTime = 49000.0
+        control_gen.sn_universe._snFrequency = 0.001
+        pointings = control_gen.get_pointings(raRange, decRange, bandpass=('r', 'z'))
+        control_lc, control_truth = control_gen.light_curves_from_pointings(pointings)
+        self.assertGreater(len(control_lc), 0)
+
+        engine = SALT2BandFluxEngine(bandpassDict=control_gen.lsstBandpassDict)
+        test_gen = SNIaLightCurveGenerator(self.db, self.opsimDb, flux_engine=engine)
+        test_gen.sn_universe._midSurveyTime = 49000.0
+        test_gen.sn_universe._snFrequency = 0.001
+        test_lc, test_truth = test_gen.light_curves_from_pointings(pointings)
+
+        self.assertEqual(set(control_truth.keys()), set(test_truth.keys()))
+        n_compared = 0
+        for sn_id in control_lc:
+            for bp in control_lc[sn_id]:
+                control = control_lc[sn_id][bp]
+                if sn_id not in test_lc or bp not in test_lc[sn_id]:
+                    # the engine does not rectify the spectrum, so it can
+                    # find a negative flux where the SN is barely visible
+                    self.assertLess(control['flux'].max(), 1.0e-3*max([control_lc[sn_id][bb]['flux'].max()
+                                                                      for bb in control_lc[sn_id]]))
+                    continue
+                test = test_lc[sn_id][bp]
+                tolerance = 0.01 * control['flux'].max()
+                common, control_dex, test_dex = np.intersect1d(control['mjd'], test['mjd'],
+                                                               return_indices=True)
+                self.assertGreater(len(common), 0)
+                np.testing.assert_allclose(test['flux'][test_dex], control['flux'][control_dex],
+                                           rtol=0.0, atol=tolerance)
+                np.testing.assert_allclose(test['error'][test_dex], control['error'][control_dex],
+                                           rtol=0.05)
+                n_compared += len(common)
+        self.assertGreater(n_compared, 0)
+
     def test_limit_sne_light_curves(self):
         """
         Test that we can limit the number of light curves returned per field of view